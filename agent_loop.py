@@ -0,0 +1,214 @@
+"""
+Autonomous critique -> improve loop.
+
+polish_posts() runs every variant through critique and rewrite rounds until
+it reaches the target score. A variant stops early when its score plateaus;
+the whole run stops at max_rounds or when the token or time budget is spent.
+Each round critiques all still-active variants in one batched call and
+rewrites them concurrently, so polishing a set of options costs a bounded
+number of round trips instead of one click per option per fix.
+"""
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import llm_client
+import telemetry
+from critic import critique_posts, improve_post, caption_of
+
+TARGET_SCORE = 8
+MAX_ROUNDS = 3
+# A rewrite must gain at least this much score to count as progress
+MIN_GAIN = 0.5
+DEFAULT_CONCURRENCY = 4
+
+
+class Budget:
+    """
+    Tracks LLM tokens and wall-clock time against optional limits. usage is
+    a dict filled by llm_client.track_usage(), so tokens are what the
+    backend reported; cached answers and the mock backend cost none.
+    """
+
+    def __init__(self, max_tokens=None, max_seconds=None, usage=None):
+        self.max_tokens = max_tokens
+        self.deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        self.usage = usage if usage is not None else {}
+
+    @property
+    def tokens(self):
+        return self.usage.get("input_tokens", 0) + self.usage.get("output_tokens", 0)
+
+    def remaining_seconds(self):
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def exhausted(self):
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            return "token_budget"
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time_budget"
+        return None
+
+
+def _submit(pool, fn, *args, **kwargs):
+    # Workers get the caller's context: trace parent and usage tracking
+    ctx = contextvars.copy_context()
+    return pool.submit(ctx.run, fn, *args, **kwargs)
+
+
+def _critique(pool, captions, brand_profile, budget, bypass_cache, progress=None):
+    """
+    Critiques captions in one batch. Returns None if the time budget runs
+    out first; the call is then abandoned.
+    """
+    future = _submit(pool, critique_posts, captions, brand_profile, bypass_cache=bypass_cache, progress=progress)
+    done, _ = wait([future], timeout=budget.remaining_seconds())
+    if not done:
+        return None
+    return future.result()
+
+
+def _improve_all(pool, items, budget, bypass_cache, progress=None):
+    """
+    Rewrites (index, caption, feedback) items concurrently. Returns
+    {index: new caption} for rewrites that finished within the time budget.
+    progress(done, total) is called as each rewrite finishes.
+    """
+    futures = {}
+    for index, caption, feedback in items:
+        futures[_submit(pool, improve_post, caption, feedback, bypass_cache)] = index
+    results = {}
+    pending, finished = set(futures), 0
+    while pending:
+        done, pending = wait(pending, timeout=budget.remaining_seconds(), return_when=FIRST_COMPLETED)
+        if not done:
+            # Out of time; the rest are abandoned
+            break
+        for future in done:
+            finished += 1
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f"Improve failed for option {index + 1}: {e}")
+        if progress:
+            progress(finished, len(futures))
+    return results
+
+
+@telemetry.traced("agent.polish")
+def polish_posts(posts, brand_profile, target_score=TARGET_SCORE, max_rounds=MAX_ROUNDS,
+                 min_gain=MIN_GAIN, max_tokens=None, max_seconds=None,
+                 concurrency=DEFAULT_CONCURRENCY, bypass_cache=False, progress=None):
+    """
+    Critiques and rewrites every post until it reaches target_score.
+    posts is a list of caption strings (or post dicts with a "caption").
+
+    Returns one dict per post, in order:
+        {"caption", "score", "feedback", "stopped", "rounds": [...]}
+    where caption is the best-scoring version, stopped is why it stopped
+    ("target", "plateau", "max_rounds", "token_budget" or "time_budget")
+    and rounds holds every version tried with its critique.
+
+    Budgets are checked between steps, and critiques and rewrites still
+    running when max_seconds runs out are abandoned. A post whose first
+    critique did not finish has score None; rewrites that finished but
+    could not be critiqued in time are listed in rounds with score None and
+    do not replace the caption. Tokens are counted from the usage the LLM
+    backend reports. progress(done, total), if given, is called after every
+    critique and rewrite, with done counted in rounds out of max_rounds + 1;
+    it may raise to stop the run (e.g. a queue job's cancel check).
+    """
+    captions = [caption_of(p) for p in posts]
+    if not captions:
+        return []
+    with llm_client.track_usage() as usage:
+        budget = Budget(max_tokens, max_seconds, usage)
+        # Not a with-block: leaving one would wait for calls that outlived the time budget
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            results = _polish(pool, captions, brand_profile, target_score, max_rounds, min_gain, budget,
+                              bypass_cache, progress)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    telemetry.incr("agent_tokens", budget.tokens)
+    return results
+
+
+def _polish(pool, captions, brand_profile, target_score, max_rounds, min_gain, budget, bypass_cache, progress):
+    def step(round_no, share=1.0):
+        """
+        Returns a progress callback covering `share` of a round, starting
+        at round_no.
+        """
+        def report(done, total):
+            if progress:
+                progress(round_no + share * done / max(total, 1), max_rounds + 1)
+        return report
+
+    critiques = _critique(pool, captions, brand_profile, budget, bypass_cache, step(0))
+    if critiques is None:
+        # Out of time before anything was scored
+        return [{"caption": c, "score": None, "feedback": "", "stopped": "time_budget",
+                 "rounds": [{"round": 0, "caption": c, "score": None, "feedback": ""}]} for c in captions]
+    results = []
+    for caption, critique in zip(captions, critiques):
+        results.append({
+            "caption": caption,
+            "score": critique["score"],
+            "feedback": critique["feedback"],
+            "stopped": None,
+            "rounds": [{"round": 0, "caption": caption, **critique}],
+        })
+    for result in results:
+        if result["score"] >= target_score:
+            result["stopped"] = "target"
+
+    for round_no in range(1, max_rounds + 1):
+        active = [i for i, r in enumerate(results) if r["stopped"] is None]
+        if not active or budget.exhausted():
+            break
+
+        with telemetry.span("agent.round", round=round_no, active=len(active)):
+            rewrites = _improve_all(
+                pool, [(i, results[i]["caption"], results[i]["feedback"]) for i in active],
+                budget, bypass_cache, step(round_no, 0.5))
+            changed = [i for i in active if i in rewrites and rewrites[i].strip() != results[i]["caption"].strip()]
+            for i in active:
+                if i not in rewrites:
+                    # Timed out or failed: nothing more to try this run
+                    results[i]["stopped"] = budget.exhausted() or "plateau"
+                elif i not in changed:
+                    results[i]["stopped"] = "plateau"
+            if not changed:
+                continue
+
+            new_critiques = None
+            if budget.exhausted() != "time_budget":
+                new_critiques = _critique(pool, [rewrites[i] for i in changed], brand_profile, budget,
+                                          bypass_cache, step(round_no + 0.5, 0.5))
+            if new_critiques is None:
+                # Keep the finished rewrites in the history, unscored
+                for i in changed:
+                    results[i]["rounds"].append({"round": round_no, "caption": rewrites[i], "score": None, "feedback": ""})
+                    results[i]["stopped"] = "time_budget"
+                continue
+
+        for i, critique in zip(changed, new_critiques):
+            result = results[i]
+            result["rounds"].append({"round": round_no, "caption": rewrites[i], **critique})
+            gain = critique["score"] - result["score"]
+            if gain > 0:
+                result.update(caption=rewrites[i], score=critique["score"], feedback=critique["feedback"])
+            if result["score"] >= target_score:
+                result["stopped"] = "target"
+            elif gain < min_gain:
+                result["stopped"] = "plateau"
+
+    final = budget.exhausted() or "max_rounds"
+    for result in results:
+        if result["stopped"] is None:
+            result["stopped"] = final
+    return results
@@ -0,0 +1,500 @@
+"""
+HTTP API for schedulers, CMSs and other programmatic clients.
+
+A plain ASGI app (no web framework) exposing the pipeline as JSON and image
+endpoints:
+
+    GET  /health
+    POST /v1/brand-voice  {"samples": [...], "brand_id": "acme-labs"?}
+    POST /v1/captions     {<brand>, "intent", "template_id", "platform", "n", "stream"?}
+    POST /v1/fanout       {<brand>, "intent", "template_id", "platforms": [...], "n", "stream"?}
+    POST /v1/render       {<brand> or "visual_style", "overlay", "template_id", "preset"}
+    POST /v1/critique     {<brand>, "caption"} or {<brand>, "posts": [...]}
+    POST /v1/improve      {"caption", "feedback"}
+
+<brand> is one of "brand_profile" (a profile dict), "brand_id" (a brand in
+brand_store) or "samples" (analyzed on the fly). "n" is 1 to MAX_OPTIONS.
+Generation, brand analysis and other blocking calls run on a thread pool
+and rendering on a process pool, so the event loop only routes requests.
+A request keeps its in-flight slot until that work has really finished,
+even after its client got a 504. With "stream": true, /v1/captions answers
+with NDJSON, one option per line as soon as it is ready. /v1/fanout returns
+{platform: captions} for several platforms from one LLM call (streamed
+options carry a "captions" object per platform). Each request has a
+deadline (API_TIMEOUT, 504 past it), and past API_MAX_INFLIGHT concurrent
+requests new ones get 503 with Retry-After instead of queueing.
+
+Run with uvicorn:
+    python api_server.py --port 8000
+    python api_server.py --fake-llm 0.05     # deterministic fake LLM backend
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+import export
+import llm_client
+from brand_store import get_store
+from brand_voice import extract_brand_voice
+from critic import critique_post, critique_posts, improve_post
+from generator import agenerate_captions, agenerate_fanout, stream_captions, stream_fanout
+from template_registry import get_registry
+
+DEFAULT_TEMPLATES = "templates.json"
+DEFAULT_IMAGE = "assets/product_shot.png"
+REQUEST_TIMEOUT = float(os.environ.get("API_TIMEOUT", "30"))
+MAX_INFLIGHT = int(os.environ.get("API_MAX_INFLIGHT", "64"))
+RENDER_WORKERS = int(os.environ.get("API_RENDER_WORKERS", "0")) or None
+MAX_BODY = 1 << 20
+# Most options one request may ask for
+MAX_OPTIONS = 10
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def render_bytes(base_image, overlay, visual_style, layout, preset):
+    """
+    Renders and encodes one post inside the render process pool.
+    """
+    from visual_engine import create_social_post
+
+    img = create_social_post(base_image, overlay, visual_style, layout)
+    return export.export_image(img, preset)
+
+
+# Futures submitted to the pools on behalf of the current request
+_request_work = contextvars.ContextVar("api_request_work", default=None)
+
+
+class _Tracked:
+    """
+    Pool mixin that records each submitted future on the current request.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        work = _request_work.get()
+        if work is not None:
+            work.append(future)
+        return future
+
+
+class _TrackedThreadPool(_Tracked, ThreadPoolExecutor):
+    pass
+
+
+class _TrackedProcessPool(_Tracked, ProcessPoolExecutor):
+    pass
+
+
+class Service:
+    """
+    Shared pools and the in-flight request count.
+    """
+
+    def __init__(self):
+        self.inflight = 0
+        self.rejected = 0
+        # Blocking LLM calls wait on io_pool; they spend their time on I/O
+        self.io_pool = None
+        self._render_pool = None
+        self._loop = None
+
+    @property
+    def render_pool(self):
+        if self._render_pool is None:
+            self._render_pool = _TrackedProcessPool(max_workers=RENDER_WORKERS)
+        return self._render_pool
+
+    def attach(self, loop):
+        """
+        Makes io_pool the loop's default executor, so the async LLM path is
+        tracked too. The loop shuts it down on close; a new loop gets a new one.
+        """
+        if loop is not self._loop:
+            self.io_pool = _TrackedThreadPool(max_workers=MAX_INFLIGHT, thread_name_prefix="api-io")
+            loop.set_default_executor(self.io_pool)
+            self._loop = loop
+
+    def release(self, work):
+        """
+        Frees a request's in-flight slot once all its pool work is done.
+        A timed-out thread cannot be interrupted, so until it ends it still
+        counts against MAX_INFLIGHT.
+        """
+        pending = [f for f in work if not f.done()]
+        if not pending:
+            self.inflight -= 1
+            return
+        loop = asyncio.get_running_loop()
+        left = [len(pending)]
+
+        def finished():
+            left[0] -= 1
+            if not left[0]:
+                self.inflight -= 1
+
+        for future in pending:
+            # Done callbacks run on the worker thread
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(finished))
+
+    def shutdown(self):
+        if self.io_pool is not None:
+            self.io_pool.shutdown(wait=False, cancel_futures=True)
+        if self._render_pool is not None:
+            self._render_pool.shutdown(wait=False, cancel_futures=True)
+            self._render_pool = None
+
+    async def blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.io_pool, fn, *args)
+
+
+service = Service()
+
+
+# --- Request helpers ---
+
+def _template(body):
+    template_id = body.get("template_id")
+    if template_id is None:
+        return {}
+    template = get_registry(DEFAULT_TEMPLATES).get(template_id)
+    if template is None:
+        raise HTTPError(404, f"unknown template_id {template_id!r}")
+    return template
+
+
+async def _profile(body):
+    """
+    Resolves the brand profile a request refers to.
+    """
+    if isinstance(body.get("brand_profile"), dict):
+        return body["brand_profile"]
+    if body.get("brand_id"):
+        profile = await service.blocking(get_store().get, body["brand_id"])
+        if profile is None:
+            raise HTTPError(404, f"unknown brand_id {body['brand_id']!r}")
+        return profile
+    if body.get("samples"):
+        return await service.blocking(extract_brand_voice, _samples(body))
+    raise HTTPError(400, "one of brand_profile, brand_id or samples is required")
+
+
+def _required(body, *fields):
+    missing = [f for f in fields if f not in body]
+    if missing:
+        raise HTTPError(400, f"missing field(s): {', '.join(missing)}")
+
+
+def _strings(body, *fields):
+    wrong = [f for f in fields if f in body and not isinstance(body[f], str)]
+    if wrong:
+        raise HTTPError(400, f"field(s) must be strings: {', '.join(wrong)}")
+
+
+def _samples(body):
+    samples = body["samples"]
+    if not isinstance(samples, list) or not all(isinstance(s, str) for s in samples):
+        raise HTTPError(400, "samples must be a list of strings")
+    return samples
+
+
+def _count(body):
+    n = body.get("n", 3)
+    # bool is an int subclass, but "n": true is not a count
+    if not isinstance(n, int) or isinstance(n, bool) or not 1 <= n <= MAX_OPTIONS:
+        raise HTTPError(400, f"n must be an integer from 1 to {MAX_OPTIONS}")
+    return n
+
+
+async def _iterate_in_thread(fn, *args):
+    """
+    Runs a blocking generator on the I/O pool and yields its items on the
+    event loop as they arrive. Closing this iterator (timeout, disconnect)
+    tells the producer to stop after the item it is waiting for.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    end = object()
+    stop = threading.Event()
+
+    def produce():
+        items = fn(*args)
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            # Runs the generator's cleanup: dedup recording, stream close
+            items.close()
+            loop.call_soon_threadsafe(queue.put_nowait, end)
+
+    loop.run_in_executor(service.io_pool, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+# --- Routes ---
+# Each returns (status, content type, body bytes), or an async iterator of
+# NDJSON rows for streamed responses.
+
+async def health(body):
+    return 200, "application/json", _json({"status": "ok", "inflight": service.inflight,
+                                           "rejected": service.rejected, "llm": llm_client.is_enabled()})
+
+
+async def brand_voice(body):
+    _required(body, "samples")
+    samples = _samples(body)
+    if body.get("brand_id"):
+        profile = await service.blocking(lambda: get_store().add_posts(body["brand_id"], samples, body.get("name")))
+    else:
+        profile = await service.blocking(extract_brand_voice, samples)
+    return 200, "application/json", _json(profile)
+
+
+async def captions(body):
+    _required(body, "intent")
+    _strings(body, "intent", "platform", "template_name")
+    n = _count(body)
+    profile = await _profile(body)
+    template = _template(body)
+    args = (profile, body["intent"], template.get("name", body.get("template_name", "")),
+            body.get("platform", "LinkedIn"), n, bool(body.get("bypass_cache", False)))
+    if body.get("stream"):
+        return _iterate_in_thread(stream_captions, *args)
+    return 200, "application/json", _json(await agenerate_captions(*args))
+
+
+async def fanout(body):
+    _required(body, "intent", "platforms")
+    platforms = body["platforms"]
+    if not isinstance(platforms, list) or not platforms or not all(isinstance(p, str) for p in platforms):
+        raise HTTPError(400, "platforms must be a non-empty list of platform names")
+    _strings(body, "intent", "template_name")
+    n = _count(body)
+    profile = await _profile(body)
+    template = _template(body)
+    args = (profile, body["intent"], template.get("name", body.get("template_name", "")),
+            platforms, n, bool(body.get("bypass_cache", False)))
+    if body.get("stream"):
+        return _iterate_in_thread(stream_fanout, *args)
+    return 200, "application/json", _json(await agenerate_fanout(*args))
+
+
+async def render(body):
+    _required(body, "overlay")
+    _strings(body, "overlay", "preset")
+    template = _template(body)
+    preset = body.get("preset", "png")
+    try:
+        export.get_preset(preset)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    visual_style = body.get("visual_style")
+    if visual_style is None:
+        visual_style = (await _profile(body)).get("visual_style", {})
+    if not isinstance(visual_style, dict):
+        raise HTTPError(400, "visual_style must be an object")
+    data = await asyncio.get_running_loop().run_in_executor(
+        service.render_pool, render_bytes, template.get("default_image", DEFAULT_IMAGE), body["overlay"],
+        visual_style, template.get("layout"), preset,
+    )
+    return 200, export.mime_type(preset), data
+
+
+async def critique(body):
+    profile = await _profile(body)
+    if "posts" in body:
+        if not isinstance(body["posts"], list):
+            raise HTTPError(400, "posts must be a list")
+        return 200, "application/json", _json(await service.blocking(critique_posts, body["posts"], profile))
+    _required(body, "caption")
+    _strings(body, "caption")
+    return 200, "application/json", _json(await service.blocking(critique_post, body["caption"], profile))
+
+
+async def improve(body):
+    _required(body, "caption", "feedback")
+    _strings(body, "caption", "feedback")
+    improved = await service.blocking(improve_post, body["caption"], body["feedback"])
+    return 200, "application/json", _json({"caption": improved})
+
+
+ROUTES = {
+    ("GET", "/health"): health,
+    ("POST", "/v1/brand-voice"): brand_voice,
+    ("POST", "/v1/captions"): captions,
+    ("POST", "/v1/fanout"): fanout,
+    ("POST", "/v1/render"): render,
+    ("POST", "/v1/critique"): critique,
+    ("POST", "/v1/improve"): improve,
+}
+
+
+# --- ASGI plumbing ---
+
+def _json(value):
+    return json.dumps(value).encode("utf-8")
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            raise HTTPError(413, "request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    raw = b"".join(chunks)
+    if not raw:
+        return {}
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        raise HTTPError(400, "body is not valid JSON")
+    if not isinstance(body, dict):
+        raise HTTPError(400, "body must be a JSON object")
+    return body
+
+
+async def _respond(send, status, content_type, data, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(data)).encode()),
+                    *headers],
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def _stream(send, rows, deadline):
+    """
+    Sends rows as NDJSON while they arrive. Headers are already out, so a
+    timeout or error is reported as a final {"error": ...} row.
+    """
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")]})
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            try:
+                row = await asyncio.wait_for(rows.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            await send({"type": "http.response.body", "body": _json(row) + b"\n", "more_body": True})
+    except asyncio.TimeoutError:
+        await send({"type": "http.response.body", "body": _json({"error": "timeout"}) + b"\n", "more_body": True})
+    except Exception as e:
+        print(f"API stream error: {e}")
+        await send({"type": "http.response.body", "body": _json({"error": str(e)}) + b"\n", "more_body": True})
+    finally:
+        # Stops the producer when the deadline passed or send failed
+        await rows.aclose()
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            service.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    route = ROUTES.get((scope["method"], scope["path"]))
+    if route is None:
+        known = any(path == scope["path"] for _, path in ROUTES)
+        return await _respond(send, 405 if known else 404, "application/json",
+                              _json({"error": "method not allowed" if known else "not found"}))
+    # Backpressure: shed load instead of building an unbounded backlog
+    if service.inflight >= MAX_INFLIGHT:
+        service.rejected += 1
+        return await _respond(send, 503, "application/json", _json({"error": "server busy"}),
+                              [(b"retry-after", b"1")])
+
+    service.attach(asyncio.get_running_loop())
+    service.inflight += 1
+    work = []
+    _request_work.set(work)
+    deadline = time.monotonic() + REQUEST_TIMEOUT
+    try:
+        body = await _read_body(receive)
+        result = await asyncio.wait_for(route(body), REQUEST_TIMEOUT)
+        if isinstance(result, tuple):
+            await _respond(send, *result)
+        else:
+            await _stream(send, result, deadline)
+    except HTTPError as e:
+        await _respond(send, e.status, "application/json", _json({"error": e.message}))
+    except asyncio.TimeoutError:
+        await _respond(send, 504, "application/json", _json({"error": "request timed out"}))
+    except Exception as e:
+        print(f"API error on {scope['path']}: {e}")
+        await _respond(send, 500, "application/json", _json({"error": "internal error"}))
+    finally:
+        service.release(work)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fake-llm", metavar="LATENCY",
+                        help="Use the fake LLM backend with this latency (see fake_llm.parse_latency)")
+    args = parser.parse_args()
+
+    if uvicorn is None:
+        print("Error: uvicorn is not installed. Run: pip install uvicorn")
+        raise SystemExit(1)
+    if args.fake_llm:
+        from fake_llm import FakeLLMBackend
+        llm_client.set_backend(FakeLLMBackend(latency=args.fake_llm))
+        # Load tests measure the service, not the production rate limit
+        llm_client.get_client().bucket = llm_client.TokenBucket(rate=1e6, capacity=10 ** 6)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
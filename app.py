@@ -1,20 +1,200 @@
 import streamlit as st
+import functools
 import json
 import os
-from brand_voice import extract_brand_voice
-from generator import generate_captions
-from critic import critique_post, improve_post
-from visual_engine import create_social_post
-import io
+import uuid
+import PIL
+import artifact_store
+import brand_voice
+from brand_store import get_store
+from agent_loop import TARGET_SCORE
+from job_queue import get_queue, FINISHED
+from visual_engine import create_social_post, RENDER_VERSION
+import export
+from template_registry import get_registry, TemplateError
+import telemetry
+import time
 
 # Page Config
 st.set_page_config(page_title="AI Social Media Agent", page_icon="🐦", layout="wide")
 
+# Options rendered on every rerun; later ones render only when opened.
+# Must stay below the number of generated options (3) to save any work.
+EAGER_OPTIONS = 1
+
+DEFAULT_IMAGE = "assets/product_shot.png"
+
+# Every Generate click writes captions for all of these in one pass
+PLATFORMS = ["LinkedIn", "Instagram"]
+
+# Cached here rather than in brand_voice, which stays free of Streamlit
+extract_brand_voice = st.cache_data(brand_voice.extract_brand_voice)
+
+def render_key(base_image, overlay, visual_style, layout, preset):
+    """
+    Artifact key for one export. It covers the background file's version,
+    the preset's settings and the renderer and encoder versions, so renders
+    made before any of them changed are never served.
+    """
+    try:
+        stat = os.stat(base_image)
+        source = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        source = None
+    return artifact_store.artifact_key("render", RENDER_VERSION, PIL.__version__, base_image, source,
+                                       overlay, visual_style, layout, export.get_preset(preset))
+
+def render_post(base_image, overlay, visual_style, layout, presets, session=None):
+    """
+    Puts the preview and each preset export of one post in the artifact
+    store, rendering the post once for whatever is not stored yet, so it is
+    rendered once for all sessions and reruns.
+    """
+    store = artifact_store.get_store()
+    missing = [p for p in (export.PREVIEW,) + tuple(presets)
+               if not store.has(render_key(base_image, overlay, visual_style, layout, p))]
+    if missing:
+        img = create_social_post(base_image, overlay, visual_style, layout)
+        with telemetry.span("app.export"):
+            files = export.export_all(img, missing)
+        for preset in missing:
+            name = preset["name"] if isinstance(preset, dict) else preset
+            store.put(render_key(base_image, overlay, visual_style, layout, preset), files[name], session)
+
+def post_file(base_image, overlay, visual_style, layout, preset, session=None):
+    """
+    Returns one export's bytes from the artifact store, rendering it again
+    if it was evicted. Download buttons call it lazily, off the script thread.
+    """
+    key = render_key(base_image, overlay, visual_style, layout, preset)
+    data = artifact_store.get_store().get(key, session)
+    if data is None:
+        data = export.export_image(create_social_post(base_image, overlay, visual_style, layout), preset)
+        artifact_store.get_store().put(key, data, session)
+    return data
+
+def submit_job(kind, payload, label, **meta):
+    """
+    Queues a background job for this session; job_monitor applies its
+    result when it finishes. The job remembers which drafts it was made for.
+    """
+    job_id = get_queue().submit(kind, payload, run_id=jobs_run_id())
+    st.session_state['jobs'][job_id] = dict(meta, kind=kind, label=label, generation=st.session_state['generation'])
+
+def score_text(score):
+    # Polish leaves score None for versions it ran out of time to critique
+    return "not scored" if score is None else f"{score}/10"
+
+def jobs_run_id():
+    # Jobs outlive the rerun that submitted them, so their spans are
+    # tagged per session and shown in their own developer panel table
+    return f"{st.session_state['artifact_session']}-jobs"
+
+def show_platform(platform):
+    """
+    Puts platform's captions in the draft list. Critiques and polish
+    history belong to the captions they were made for, so they are cleared.
+    """
+    st.session_state['generated_posts'] = st.session_state['platform_posts'][platform]
+    st.session_state['generation'] += 1
+    st.session_state['active_platform'] = platform
+    for key in [k for k in st.session_state if k.startswith(('critique_', 'rounds_', 'cap_'))]:
+        del st.session_state[key]
+
+def apply_job(meta, result):
+    posts = st.session_state['generated_posts']
+    if meta['kind'] in ('critique', 'improve', 'polish') and meta.get('generation') != st.session_state['generation']:
+        # Made for drafts that have since been replaced; indices no longer match
+        st.session_state['notices'].append(("warning", f"{meta['label']} finished after the options changed; result discarded."))
+        return
+    if meta['kind'] == 'fanout':
+        st.session_state['platform_posts'] = result
+        st.session_state['template_id'] = meta['template_id']
+        show_platform(meta['platform'])
+        count = len(result[meta['platform']])
+        st.session_state['notices'].append(("success", f"Generated {count} options for {', '.join(result)}!"))
+    elif meta['kind'] == 'generate':
+        st.session_state['generated_posts'] = result
+        st.session_state['generation'] += 1
+        st.session_state['template_id'] = meta['template_id']
+        for key in [k for k in st.session_state if k.startswith('rounds_')]:
+            del st.session_state[key]
+        st.session_state['notices'].append(("success", f"Generated {len(result)} options!"))
+    elif meta['kind'] == 'critique':
+        for i, critique in zip(meta['indices'], result):
+            st.session_state[f'critique_{i}'] = critique
+    elif meta['kind'] == 'improve':
+        for i, caption in zip(meta['indices'], result):
+            if i < len(posts):
+                posts[i]['caption'] = caption
+                st.session_state.pop(f'cap_{i}', None)
+    elif meta['kind'] == 'polish':
+        for i, polished in enumerate(result[:len(posts)]):
+            posts[i]['caption'] = polished['caption']
+            st.session_state[f'critique_{i}'] = {"score": polished['score'], "feedback": polished['feedback']}
+            st.session_state[f'rounds_{i}'] = polished['rounds']
+            # Drop the stale widget value so the text area shows the rewrite
+            st.session_state.pop(f'cap_{i}', None)
+
+@st.fragment(run_every=0.5)
+def job_monitor():
+    """
+    Polls this session's background jobs without rerunning the page; once
+    one finishes, applies its result and reruns the whole page.
+    """
+    queue = get_queue()
+    changed = False
+    for job_id, meta in list(st.session_state['jobs'].items()):
+        job = queue.status(job_id)
+        if job is None or job['status'] in FINISHED:
+            del st.session_state['jobs'][job_id]
+            changed = True
+            if job and job['status'] == 'done':
+                apply_job(meta, job['result'])
+            elif job and job['status'] == 'failed':
+                st.session_state['notices'].append(("error", f"{meta['label']} failed: {job['error']}"))
+            continue
+        col_bar, col_cancel = st.columns([4, 1])
+        with col_bar:
+            st.progress(job['progress'], text=f"{meta['label']} ({job['status']})")
+            # Options streamed so far
+            if meta['kind'] in ('generate', 'fanout'):
+                for j, draft in enumerate(job['partial'] or []):
+                    caption = draft.get('caption') or draft.get('captions', {}).get(meta.get('platform'), '')
+                    st.markdown(f"**Option {j+1}:** {caption}")
+        with col_cancel:
+            if st.button("Cancel", key=f"cancel_{job_id}"):
+                queue.cancel(job_id)
+    if changed:
+        st.rerun()
+
+# Tags this rerun's spans, so the developer panel skips other sessions' spans
+_rerun_id = uuid.uuid4().hex
+telemetry.set_run(_rerun_id)
+_rerun_mark = telemetry.mark()
+_rerun_start = time.perf_counter()
+
 # Session State Initialization
 if 'brand_profile' not in st.session_state:
     st.session_state['brand_profile'] = None
+if 'brand_id' not in st.session_state:
+    st.session_state['brand_id'] = None
 if 'generated_posts' not in st.session_state:
     st.session_state['generated_posts'] = []
+if 'generation' not in st.session_state:
+    # Bumped whenever generated_posts is replaced
+    st.session_state['generation'] = 0
+if 'platform_posts' not in st.session_state:
+    st.session_state['platform_posts'] = {}
+if 'active_platform' not in st.session_state:
+    st.session_state['active_platform'] = None
+if 'artifact_session' not in st.session_state:
+    # Charges this session's rendered images to its own memory budget
+    st.session_state['artifact_session'] = uuid.uuid4().hex
+if 'jobs' not in st.session_state:
+    st.session_state['jobs'] = {}
+if 'notices' not in st.session_state:
+    st.session_state['notices'] = []
 
 # Sidebar Navigation
 with st.sidebar:
@@ -35,12 +215,17 @@ with st.sidebar:
     page = st.radio("Navigation", ["Setup Brand", "Generate Content", "Review & Polish"])
     st.markdown("---")
     st.caption("Hack-Nation Challenge 12")
+    dev_panel = st.checkbox("Developer panel", help="Trace each stage of this page run.")
+    telemetry.enable(dev_panel, owner=st.session_state['artifact_session'])
 
 # --- Page 1: Setup Brand ---
 if page == "Setup Brand":
     st.header("Step 1: Teach the Agent Your Brand")
     
     st.markdown("Paste 2-3 examples of your best performing posts to help the agent learn your voice.")
+
+    brand_name = st.text_input("Brand Name (Optional)", placeholder="e.g. Acme Labs",
+                               help="Named brands are saved: each analysis adds its posts to the brand's stored profile.")
     
     col1, col2 = st.columns(2)
     with col1:
@@ -52,13 +237,26 @@ if page == "Setup Brand":
     if st.button("Analyze Brand Voice"):
         samples = [p for p in [post1, post2, post3] if p.strip()]
         if samples:
-            profile = extract_brand_voice(samples)
+            if brand_name.strip():
+                brand_id = get_store().id_for(brand_name)
+                profile = get_store().add_posts(brand_id, samples, name=brand_name.strip())
+            else:
+                brand_id = None
+                profile = extract_brand_voice(samples)
             st.session_state['brand_profile'] = profile
+            st.session_state['brand_id'] = brand_id
             st.success("Brand Voice Analyzed!")
             st.json(profile)
         else:
             st.warning("Please enter at least one example post.")
 
+    saved_brands = get_store().list()
+    if saved_brands:
+        st.markdown("---")
+        st.subheader("Saved Brands")
+        st.dataframe([{"Brand": b['name'], "Posts": b['posts'], "Voice": b['tone']} for b in saved_brands],
+                     hide_index=True)
+
 # Imports moved to top
 
 
@@ -66,6 +264,19 @@ if page == "Setup Brand":
 elif page == "Generate Content":
     st.header("Step 2: Generate New Posts")
     
+    # Saved brands load straight from the store, without re-analysis
+    saved_brands = {b['brand_id']: b['name'] for b in get_store().list()}
+    if saved_brands:
+        choices = list(saved_brands)
+        if st.session_state['brand_profile'] and st.session_state['brand_id'] not in saved_brands:
+            choices.insert(0, None)
+        current = st.session_state['brand_id'] if st.session_state['brand_id'] in choices else choices[0]
+        chosen = st.selectbox("Brand", choices, index=choices.index(current),
+                              format_func=lambda b: saved_brands.get(b, "This session's brand (unsaved)"))
+        if chosen is not None and (chosen != st.session_state['brand_id'] or not st.session_state['brand_profile']):
+            st.session_state['brand_id'] = chosen
+            st.session_state['brand_profile'] = get_store().get(chosen)
+
     if not st.session_state['brand_profile']:
         st.warning("Please set up your brand voice in Step 1 first.")
     else:
@@ -82,28 +293,57 @@ elif page == "Generate Content":
         with col_input1:
             # Load Templates
             try:
-                with open('templates.json', 'r') as f:
-                    templates = json.load(f)
-                template_names = [t['name'] for t in templates]
-                selected_template_name = st.selectbox("Choose a Template", template_names)
-                selected_template = next(t for t in templates if t['name'] == selected_template_name)
+                registry = get_registry('templates.json')
+                selected_template_name = st.selectbox("Choose a Template", registry.names())
+                selected_template = registry.by_name(selected_template_name)
             except FileNotFoundError:
                 st.error("templates.json not found.")
                 st.stop()
+            except TemplateError as e:
+                st.error(str(e))
+                st.stop()
         
         with col_input2:
-            platform = st.radio("Target Platform", ["LinkedIn", "Instagram"], horizontal=True)
+            platform = st.radio("Target Platform", PLATFORMS, horizontal=True)
+            # Every platform was generated together; switching needs no new call
+            if platform in st.session_state['platform_posts'] and platform != st.session_state['active_platform']:
+                show_platform(platform)
 
         intent = st.text_input("What is this post about?", placeholder="e.g. Announcing the Hack-Nation winners")
+        fresh = st.checkbox("Fresh ideas (skip cache)", help="Ask the AI again instead of reusing a cached answer for the same request.")
         
-        if st.button("Generate Options"):
-            with st.spinner("Generating creative options..."):
-                captions = generate_captions(profile, intent, selected_template, platform, n=3)
-                st.session_state['generated_posts'] = captions
-                st.success("Generated 3 options!")
+        pending = {meta['kind'] for meta in st.session_state['jobs'].values()}
+        if st.button("Generate Options", disabled='fanout' in pending):
+            # Runs on the shared worker pool; job_monitor streams the options in
+            submit_job('fanout', {"brand_profile": profile, "intent": intent, "template_name": selected_template,
+                                  "platforms": PLATFORMS, "n": 3, "bypass_cache": fresh},
+                       f"Generating creative options for {', '.join(PLATFORMS)}",
+                       template_id=selected_template['id'], platform=platform)
+            pending.add('fanout')
+
+        if st.session_state['jobs']:
+            job_monitor()
+        for level, message in st.session_state['notices']:
+            getattr(st, level)(message)
+        st.session_state['notices'] = []
 
         if st.session_state['generated_posts']:
             st.subheader("Draft Options")
+            col_crit, col_polish, col_target = st.columns([1, 1, 2])
+            with col_crit:
+                if st.button("Critique All Options", disabled='critique' in pending):
+                    posts = st.session_state['generated_posts']
+                    submit_job('critique', {"posts": posts, "brand_profile": profile},
+                               "Critiquing all options", indices=list(range(len(posts))))
+                    st.rerun()
+            with col_target:
+                target = st.slider("Target score", 5, 10, TARGET_SCORE)
+            with col_polish:
+                if st.button("Auto-Polish All", disabled='polish' in pending):
+                    submit_job('polish', {"posts": st.session_state['generated_posts'], "brand_profile": profile,
+                                          "target_score": target, "max_seconds": 30},
+                               "Critiquing and rewriting until each option hits the target")
+                    st.rerun()
             for i, post in enumerate(st.session_state['generated_posts']):
                 with st.container():
                     st.markdown(f"**Option {i+1}**")
@@ -113,25 +353,28 @@ elif page == "Generate Content":
                     # Display the structured post
                     c1, c2 = st.columns([1, 2])
                     with c1:
-                        # Render Image
-                        base_image = "assets/product_shot.png" # Default fallback, should use template data
-                        # Find the template image from the selected template object if possible, or use a default
-                        if 'default_image' in selected_template:
-                             base_image = selected_template['default_image']
-                        
-                        generated_img = create_social_post(base_image, post['overlay'], profile['visual_style'])
-                        st.image(generated_img, caption=f"Style: {post.get('image_style', 'Standard')}", use_column_width=True)
+                        # Render Image with the template the options were generated for
+                        template = registry.get(st.session_state.get('template_id')) or selected_template
                         
-                        # Download Button
-                        buf = io.BytesIO()
-                        generated_img.save(buf, format="PNG")
-                        byte_im = buf.getvalue()
-                        st.download_button(
-                            label=f"Download Image {i+1}",
-                            data=byte_im,
-                            file_name=f"social_post_{i+1}.png",
-                            mime="image/png"
-                        )
+                        if i < EAGER_OPTIONS or st.toggle("Show image", key=f"show_{i}"):
+                            # Option i shares its overlay across platforms: one render exports them all
+                            presets = export.platform_presets(platform)
+                            session = st.session_state['artifact_session']
+                            args = (template['default_image'], post['overlay'], profile['visual_style'], template['layout'])
+                            render_post(*args, export.fanout_presets(st.session_state['platform_posts'] or [platform]), session)
+                            # Streamlit keeps a copy of what it shows, so show the small preview
+                            st.image(post_file(*args, export.PREVIEW, session),
+                                     caption=f"Style: {post.get('image_style', 'Standard')}", use_column_width=True)
+                            
+                            # Download Buttons, one per platform size; bytes are fetched on click
+                            for preset in presets:
+                                st.download_button(
+                                    label=f"Download Image {i+1} ({preset})",
+                                    data=functools.partial(post_file, *args, preset, session),
+                                    file_name=export.file_name(f"social_post_{i+1}_{preset}", preset),
+                                    mime=export.mime_type(preset),
+                                    key=f"dl_{i}_{preset}"
+                                )
 
                     with c2:
                          st.text_area("Caption", post['caption'], height=150, key=f"cap_{i}")
@@ -141,15 +384,25 @@ elif page == "Generate Content":
                     with col_a:
                         if st.button(f"Critique {i+1}", key=f"crit_{i}"):
                             # Pass just the caption for now, expand later
-                            critique = critique_post(post['caption'], profile)
-                            st.write(f"**Score:** {critique['score']}/10")
+                            submit_job('critique', {"posts": [post['caption']], "brand_profile": profile},
+                                       f"Critiquing option {i+1}", indices=[i])
+                            st.rerun()
+                        if f'critique_{i}' in st.session_state:
+                            critique = st.session_state[f'critique_{i}']
+                            st.write(f"**Score:** {score_text(critique['score'])}")
                             st.caption(f"Feedback: {critique['feedback']}")
-                            st.session_state[f'critique_{i}'] = critique
+                    
+                    if f'rounds_{i}' in st.session_state:
+                        with st.expander(f"Polish history ({len(st.session_state[f'rounds_{i}']) - 1} rewrites)"):
+                            for step in st.session_state[f'rounds_{i}']:
+                                st.markdown(f"**Round {step['round']}** · score {score_text(step['score'])} · {step['feedback']}")
+                                st.caption(step['caption'])
                     
                     if f'critique_{i}' in st.session_state:
                          if st.button(f"Apply Fix {i+1}", key=f"imp_{i}"):
-                             improved = improve_post(post['caption'], st.session_state[f'critique_{i}']['feedback'])
-                             st.session_state['generated_posts'][i]['caption'] = improved
+                             submit_job('improve', {"captions": [post['caption']],
+                                                    "feedback": [st.session_state[f'critique_{i}']['feedback']]},
+                                        f"Applying fix to option {i+1}", indices=[i])
                              st.rerun()
 
 
@@ -182,20 +435,20 @@ elif page == "Review & Polish":
             st.markdown("**Preview**")
             # Generate preview image
             profile = st.session_state.get('brand_profile', {})
-            base_image = "assets/product_shot.png"
+            template = get_registry('templates.json').get(st.session_state.get('template_id'), {})
+            base_image = template.get('default_image', DEFAULT_IMAGE)
             
-            preview_img = create_social_post(base_image, overlay_text, profile.get('visual_style', {}))
-            st.image(preview_img, use_column_width=True)
+            preset = st.selectbox("Export as", list(export.PRESETS), key="export_preset")
+            session = st.session_state['artifact_session']
+            args = (base_image, overlay_text, profile.get('visual_style', {}), template.get('layout'))
+            st.image(post_file(*args, export.PREVIEW, session), use_column_width=True)
             
-            # Download button
-            buf = io.BytesIO()
-            preview_img.save(buf, format="PNG")
-            byte_im = buf.getvalue()
+            # Download button; the export is rendered or fetched on click
             st.download_button(
                 label="📥 Download Final Image",
-                data=byte_im,
-                file_name="final_social_post.png",
-                mime="image/png",
+                data=functools.partial(post_file, *args, preset, session),
+                file_name=export.file_name("final_social_post", preset),
+                mime=export.mime_type(preset),
                 type="primary"
             )
         
@@ -211,3 +464,18 @@ elif page == "Review & Polish":
             st.caption("👆 Click to select, then Ctrl+C to copy")
 
 
+# --- Developer Panel ---
+if dev_panel:
+    telemetry.record_span("app.rerun", time.perf_counter() - _rerun_start, page=page)
+    with st.sidebar:
+        st.markdown("---")
+        st.subheader("Stage Breakdown")
+        st.dataframe(telemetry.breakdown(_rerun_mark, _rerun_id), hide_index=True)
+        st.caption("Background jobs")
+        st.dataframe(telemetry.breakdown(run_id=jobs_run_id()), hide_index=True)
+        st.caption("Counters")
+        st.json(telemetry.counters())
+        st.caption("Artifact store")
+        st.json(artifact_store.get_store().stats())
+        st.download_button("Prometheus metrics", telemetry.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+        st.download_button("OpenTelemetry JSON", json.dumps(telemetry.to_otel_json()), file_name="traces.json", mime="application/json")
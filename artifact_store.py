@@ -0,0 +1,213 @@
+"""
+Memory-bounded store for rendered images and other encoded artifacts.
+
+Artifacts are bytes referenced by a short key, so the UI keeps only keys in
+session state. Recently used artifacts stay in memory within a per-session
+budget (ARTIFACT_SESSION_BYTES) and a process-wide one
+(ARTIFACT_MEMORY_BYTES). Past either budget the least recently used are
+spilled to files under .cache/artifacts/ and read back through a memory map
+on their next use. The spill directory is itself capped at
+ARTIFACT_DISK_BYTES, least recently used files first; an artifact evicted
+from both is gone and get() returns None, so callers re-create it.
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+import telemetry
+
+CACHE_DIR = os.environ.get("ARTIFACT_CACHE_DIR", os.path.join(".cache", "artifacts"))
+SESSION_BYTES = int(os.environ.get("ARTIFACT_SESSION_BYTES", 8 << 20))
+MEMORY_BYTES = int(os.environ.get("ARTIFACT_MEMORY_BYTES", 64 << 20))
+DISK_BYTES = int(os.environ.get("ARTIFACT_DISK_BYTES", 1 << 30))
+
+
+def artifact_key(*parts):
+    """
+    Derives a stable key from JSON-serializable parts, e.g. the arguments
+    an image was rendered from.
+    """
+    blob = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Two-tier LRU cache of bytes: memory within budgets, then disk. Thread-safe.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, session_bytes=SESSION_BYTES, memory_bytes=MEMORY_BYTES,
+                 disk_bytes=DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.session_bytes = session_bytes
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        # key -> (session, data), least recently used first
+        self._memory = OrderedDict()
+        self._used = {}
+        self._memory_total = 0
+        # key -> file size, least recently used first
+        self._disk = None
+        self._disk_total = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def _disk_index(self):
+        """
+        Lists spill files left by earlier runs, oldest first, on first use.
+        """
+        if self._disk is None:
+            self._disk = OrderedDict()
+            try:
+                entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".bin")]
+            except FileNotFoundError:
+                entries = []
+            for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+                size = entry.stat().st_size
+                self._disk[entry.name[:-len(".bin")]] = size
+                self._disk_total += size
+        return self._disk
+
+    def put(self, key, data, session=None):
+        """
+        Stores data under key for session (any hashable id) and returns key.
+        """
+        data = bytes(data)
+        with self._lock:
+            self._remember(key, data, session)
+            self._enforce(session)
+        return key
+
+    def get(self, key, session=None):
+        """
+        Returns the bytes for key, or None once it has been evicted. A
+        spilled artifact moves back into memory, charged to session.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] != session:
+                    self._forget(key)
+                    self._remember(key, entry[1], session)
+                    self._enforce(session)
+                else:
+                    self._memory.move_to_end(key)
+                return entry[1]
+            data = self._read(key)
+            if data is None:
+                return None
+            telemetry.incr("artifact_disk_hits")
+            self._remember(key, data, session)
+            self._enforce(session)
+            return data
+
+    def has(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk_index()
+
+    def release(self, session):
+        """
+        Spills everything session holds in memory, e.g. when it ends.
+        """
+        with self._lock:
+            for key in [k for k, (owner, _) in self._memory.items() if owner == session]:
+                self._spill(key)
+
+    def stats(self):
+        with self._lock:
+            disk = self._disk_index()
+            return {"memory_items": len(self._memory), "memory_bytes": self._memory_total,
+                    "sessions": len(self._used), "disk_items": len(disk), "disk_bytes": self._disk_total}
+
+    # --- Internals; callers hold self._lock ---
+
+    def _remember(self, key, data, session):
+        if key in self._memory:
+            self._forget(key)
+        self._memory[key] = (session, data)
+        self._used[session] = self._used.get(session, 0) + len(data)
+        self._memory_total += len(data)
+
+    def _forget(self, key):
+        session, data = self._memory.pop(key)
+        self._memory_total -= len(data)
+        self._used[session] -= len(data)
+        if not self._used[session]:
+            del self._used[session]
+        return data
+
+    def _enforce(self, session):
+        """
+        Spills least recently used artifacts until session and the process
+        are back within their memory budgets.
+        """
+        while self._used.get(session, 0) > self.session_bytes:
+            self._spill(next(k for k, (owner, _) in self._memory.items() if owner == session))
+        while self._memory_total > self.memory_bytes:
+            self._spill(next(iter(self._memory)))
+
+    def _spill(self, key):
+        data = self._forget(key)
+        disk = self._disk_index()
+        if key in disk:
+            disk.move_to_end(key)
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        disk[key] = len(data)
+        self._disk_total += len(data)
+        telemetry.incr("artifact_spills")
+        while self._disk_total > self.disk_bytes and len(disk) > 1:
+            old, size = disk.popitem(last=False)
+            self._disk_total -= size
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+            telemetry.incr("artifact_evictions")
+
+    def _read(self, key):
+        disk = self._disk_index()
+        try:
+            with open(self._path(key), "rb") as f:
+                # Empty files cannot be mapped
+                if not os.fstat(f.fileno()).st_size:
+                    data = b""
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        data = mm[:]
+        except FileNotFoundError:
+            if key in disk:
+                # Removed by another process sharing the directory
+                self._disk_total -= disk.pop(key)
+            return None
+        if key not in disk:
+            # Spilled by another process sharing the directory
+            disk[key] = len(data)
+            self._disk_total += len(data)
+        disk.move_to_end(key)
+        return data
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Returns the process-wide store.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
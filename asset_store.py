@@ -0,0 +1,157 @@
+"""
+Pre-decoded background and font store for the visual engine.
+
+Each background image is decoded once and written as raw RGB pixels to
+.cache/assets/. Renderers memory-map that file instead of decoding the PNG
+again, so several processes share the same pages. Entries are invalidated
+when the source file's mtime or size changes. Fonts are cached per
+(face, size).
+"""
+import glob
+import hashlib
+import mmap
+import os
+import threading
+from functools import lru_cache
+
+from PIL import Image, ImageFont
+
+CACHE_DIR = os.environ.get("ASSET_CACHE_DIR", os.path.join(".cache", "assets"))
+FALLBACK_SIZE = (800, 600)
+FALLBACK_COLOR = "gray"
+DEFAULT_FONT = "arial.ttf"
+
+_lock = threading.Lock()
+# path -> (signature, read-only image backed by the mmap)
+_mapped = {}
+
+
+def _signature(path):
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def _path_hash(path):
+    return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+
+
+def _raw_path(path, signature, size):
+    sig_hash = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"{_path_hash(path)}_{sig_hash}_{size[0]}x{size[1]}.rgb")
+
+
+def _find_raw(path, signature):
+    sig_hash = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:12]
+    matches = glob.glob(os.path.join(CACHE_DIR, f"{_path_hash(path)}_{sig_hash}_*.rgb"))
+    if not matches:
+        return None, None
+    w, h = os.path.basename(matches[0]).rsplit("_", 1)[1][:-len(".rgb")].split("x")
+    return matches[0], (int(w), int(h))
+
+
+def _decode_to_raw(path, signature):
+    """
+    Decodes the image once and writes its pixels to the raw cache, replacing
+    any stale entries for the same source path.
+    """
+    img = Image.open(path).convert("RGB")
+    raw_path = _raw_path(path, signature, img.size)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for stale in glob.glob(os.path.join(CACHE_DIR, f"{_path_hash(path)}_*.rgb")):
+        if stale != raw_path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    tmp = f"{raw_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(img.tobytes())
+    os.replace(tmp, raw_path)
+    return raw_path, img.size
+
+
+def _map(path):
+    """
+    Returns a read-only image over the memory-mapped pixels of path,
+    decoding at most once per source file version across all processes.
+    """
+    signature = _signature(path)
+    with _lock:
+        entry = _mapped.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        raw_path, size = _find_raw(path, signature)
+        if raw_path is None:
+            raw_path, size = _decode_to_raw(path, signature)
+        with open(raw_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Stale maps are left to the garbage collector: images handed out by
+        # shared_background may still reference them.
+        image = Image.frombuffer("RGB", size, mm, "raw", "RGB", 0, 1)
+        _mapped[path] = (signature, image)
+        return image
+
+
+@lru_cache(maxsize=8)
+def _fallback(size=FALLBACK_SIZE):
+    return Image.new("RGB", size, color=FALLBACK_COLOR)
+
+
+def shared_background(path):
+    """
+    Returns a read-only image backed directly by the shared memory map.
+    Use load_background for an image you can draw on.
+    """
+    try:
+        return _map(path)
+    except FileNotFoundError:
+        return _fallback()
+
+
+def load_background(path):
+    """
+    Returns a writable RGB copy of the background at path. Missing files
+    fall back to a plain gray canvas, like create_social_post always did.
+    """
+    return shared_background(path).copy()
+
+
+@lru_cache(maxsize=256)
+def get_font(face=DEFAULT_FONT, size=40):
+    """
+    Returns a cached FreeType font, falling back to PIL's default font
+    (at the requested size where this Pillow supports it).
+    """
+    try:
+        return ImageFont.truetype(face, size)
+    except IOError:
+        pass
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def preload(templates):
+    """
+    Decodes every template's default_image up front, e.g. before forking
+    render workers.
+    """
+    for template in templates:
+        path = template.get("default_image")
+        if path:
+            try:
+                _map(path)
+            except FileNotFoundError:
+                pass
+
+
+def clear():
+    """
+    Forgets in-process mappings and cached fonts (the on-disk raw files stay).
+    """
+    with _lock:
+        _mapped.clear()
+    get_font.cache_clear()
@@ -0,0 +1,249 @@
+"""
+Headless batch campaign runner.
+
+Streams a JSONL file of campaign requests through the full pipeline
+(extract_brand_voice -> generate_captions -> create_social_post -> critique_posts)
+without Streamlit. Each input line looks like:
+
+    {"id": "acme-1", "samples": ["post one", "post two"], "intent": "Launch day",
+     "template_id": "announcement", "platform": "LinkedIn", "n": 3}
+
+A record may name a stored brand with "brand_id" instead of (or as well
+as) "samples": its profile is loaded from brand_store, and any samples are
+added to that brand first.
+
+Usage:
+    python batch_runner.py campaigns.jsonl --out results.jsonl --images out_images
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import asset_store
+import export
+import llm_client
+from brand_voice import extract_brand_voice
+from brand_store import get_store
+from generator import generate_captions
+from critic import critique_posts
+from template_registry import get_registry
+
+DEFAULT_TEMPLATES = "templates.json"
+DEFAULT_IMAGE = "assets/product_shot.png"
+
+
+def load_templates(path=DEFAULT_TEMPLATES):
+    """
+    Returns the validated templates.json indexed by template id.
+    """
+    return get_registry(path).index()
+
+
+def render_post(base_image, overlay, visual_style, out_stem, presets, layout=None):
+    """
+    Renders one post once and writes it in every export preset. Runs inside
+    the render process pool, so only paths and plain data cross the process
+    boundary. Returns {preset name: path}.
+    """
+    from visual_engine import create_social_post
+
+    img = create_social_post(base_image, overlay, visual_style, layout)
+    return export.save_exports(img, out_stem, presets)
+
+
+def process_record(line_no, record, templates, image_dir, render_pool, presets=None):
+    """
+    Runs one campaign request through every stage and returns its result row.
+    LLM-bound stages run on the calling (I/O pool) thread; rendering is handed
+    to the process pool.
+    """
+    samples = record.get("samples") or []
+    brand_id = record.get("brand_id")
+    if not brand_id:
+        profile = extract_brand_voice(samples)
+    elif samples:
+        profile = get_store().add_posts(brand_id, samples)
+    else:
+        profile = get_store().get(brand_id)
+        if profile is None:
+            raise ValueError(f"unknown brand_id {brand_id!r}")
+
+    template = templates.get(record.get("template_id"), {})
+    template_name = template.get("name", record.get("template_id"))
+    platform = record.get("platform", "LinkedIn")
+    captions = generate_captions(profile, record.get("intent", ""), template_name, platform, record.get("n", 3))
+
+    base_image = template.get("default_image", DEFAULT_IMAGE)
+    visual_style = profile.get("visual_style", {})
+    renders = []
+    for i, post in enumerate(captions):
+        out_stem = os.path.join(image_dir, f"{line_no:08d}_{i + 1}")
+        renders.append(render_pool.submit(render_post, base_image, post.get("overlay", ""), visual_style,
+                                          out_stem, presets or export.platform_presets(platform),
+                                          template.get("layout")))
+
+    # Critique all variants in one call while the images render.
+    critiques = critique_posts(captions, profile)
+    posts = []
+    for post, critique in zip(captions, critiques):
+        posts.append({
+            "caption": post.get("caption", ""),
+            "overlay": post.get("overlay", ""),
+            "image_style": post.get("image_style"),
+            "critique": critique,
+        })
+    for post, render in zip(posts, renders):
+        post["exports"] = render.result()
+        post["image"] = next(iter(post["exports"].values()))
+
+    return {
+        "line": line_no,
+        "id": record.get("id"),
+        "platform": platform,
+        "template_id": record.get("template_id"),
+        "profile": profile,
+        "posts": posts,
+    }
+
+
+def run_one(line_no, raw, templates, image_dir, render_pool, presets=None):
+    """
+    Wraps process_record so one bad record never stops the run.
+    """
+    try:
+        with llm_client.batch_priority():
+            return process_record(line_no, json.loads(raw), templates, image_dir, render_pool, presets)
+    except Exception as e:
+        return {"line": line_no, "error": f"{type(e).__name__}: {e}"}
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"next_line": 0, "results_bytes": 0}
+
+
+def write_checkpoint(path, next_line, results_bytes):
+    """
+    Atomically records how far the run has got.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"next_line": next_line, "results_bytes": results_bytes}, f)
+    os.replace(tmp, path)
+
+
+def run_batch(input_path, output_path, image_dir, templates_path=DEFAULT_TEMPLATES,
+              io_workers=8, render_workers=None, max_inflight=64, checkpoint_every=1, resume=True,
+              presets=None):
+    """
+    Streams input_path through the pipeline and appends one JSON row per input
+    line to output_path, in input order.
+
+    At most `max_inflight` records are held in memory at any time, so memory
+    stays bounded regardless of input size. After every `checkpoint_every`
+    written rows, a checkpoint (next input line + results file size) is saved
+    next to output_path; a rerun resumes from it and drops any partial rows
+    written after it.
+
+    Each post is rendered once and written in every export preset in
+    `presets` (default: the presets for the record's platform).
+    """
+    for name in presets or ():
+        export.get_preset(name)
+    os.makedirs(image_dir, exist_ok=True)
+    templates = load_templates(templates_path)
+    # Decode backgrounds once so forked render workers share the mapped pixels.
+    asset_store.preload(templates.values())
+    checkpoint_path = output_path + ".ckpt"
+    state = read_checkpoint(checkpoint_path) if resume else {"next_line": 0, "results_bytes": 0}
+    start_line = state["next_line"]
+
+    mode = "r+b" if resume and os.path.exists(output_path) else "wb"
+    stats = {"processed": 0, "errors": 0, "skipped": start_line}
+    started = time.perf_counter()
+
+    with open(output_path, mode) as out, open(input_path, "r", encoding="utf-8") as src, \
+            ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+            ProcessPoolExecutor(max_workers=render_workers) as render_pool:
+        out.truncate(state["results_bytes"] if mode == "r+b" else 0)
+        out.seek(0, os.SEEK_END)
+
+        inflight = deque()
+        next_line = start_line
+        since_checkpoint = 0
+
+        def drain(block):
+            nonlocal next_line, since_checkpoint
+            while inflight and (block or inflight[0].done()):
+                row = inflight.popleft().result()
+                out.write((json.dumps(row) + "\n").encode("utf-8"))
+                next_line = row["line"] + 1
+                stats["processed"] += 1
+                if "error" in row:
+                    stats["errors"] += 1
+                since_checkpoint += 1
+                if since_checkpoint >= checkpoint_every:
+                    out.flush()
+                    write_checkpoint(checkpoint_path, next_line, out.tell())
+                    since_checkpoint = 0
+                if block:
+                    return
+
+        for line_no, raw in enumerate(src):
+            if line_no < start_line:
+                continue
+            if not raw.strip():
+                # Keep line numbers aligned with the input file.
+                inflight.append(io_pool.submit(lambda n=line_no: {"line": n, "skipped": True}))
+            else:
+                inflight.append(io_pool.submit(run_one, line_no, raw, templates, image_dir, render_pool, presets))
+            drain(block=False)
+            while len(inflight) >= max_inflight:
+                drain(block=True)
+
+        while inflight:
+            drain(block=True)
+        out.flush()
+        write_checkpoint(checkpoint_path, next_line, out.tell())
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL campaign file through the full pipeline.")
+    parser.add_argument("input", help="JSONL file of campaign requests")
+    parser.add_argument("--out", default="results.jsonl", help="Results JSONL file")
+    parser.add_argument("--images", default="batch_images", help="Directory for rendered images")
+    parser.add_argument("--templates", default=DEFAULT_TEMPLATES)
+    parser.add_argument("--io-workers", type=int, default=8, help="Threads for LLM-bound stages")
+    parser.add_argument("--render-workers", type=int, default=None, help="Processes for image rendering")
+    parser.add_argument("--max-inflight", type=int, default=64, help="Records held in memory at once")
+    parser.add_argument("--checkpoint-every", type=int, default=1)
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any checkpoint and start over")
+    parser.add_argument("--presets", help="Comma-separated export presets (default: the record's platform presets)")
+    args = parser.parse_args(argv)
+
+    stats = run_batch(
+        args.input, args.out, args.images,
+        templates_path=args.templates,
+        io_workers=args.io_workers,
+        render_workers=args.render_workers,
+        max_inflight=args.max_inflight,
+        checkpoint_every=args.checkpoint_every,
+        resume=not args.no_resume,
+        presets=args.presets.split(",") if args.presets else None,
+    )
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
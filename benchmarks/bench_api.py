@@ -0,0 +1,170 @@
+"""
+Load generator for the HTTP API.
+
+Fires requests at a fixed concurrency and reports requests per second, tail
+latency and status codes per endpoint. By default it drives api_server.app
+in-process over ASGI with the deterministic fake LLM backend, so it needs no
+server or network; pass --url to load a running server instead (start it
+with `python api_server.py --fake-llm 0.05` to measure against the fake).
+
+Run from the repo root:
+    python -m benchmarks.bench_api --requests 500 --concurrency 32
+    python -m benchmarks.bench_api --url http://127.0.0.1:8000 --endpoint captions
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Measure real work, not cache hits or the caption history of earlier runs
+os.environ["LLM_CACHE_DISABLED"] = "1"
+os.environ["DEDUP_DISABLED"] = "1"
+
+SAMPLES = [
+    "The countdown begins! Only 48 hours until the biggest hackathon of the year. #HackNation #CodeLife",
+    "Did you know you can deploy your project in seconds using our new API? Check the docs. #DevTools",
+]
+PROFILE = {"tone": "Technical", "keywords": ["hackathon", "deploy", "docs"],
+           "visual_style": {"color": "#61DAFB", "font": "Monospace"}, "avg_length": 15}
+ENDPOINTS = ("brand-voice", "captions", "captions-stream", "render", "critique", "improve")
+
+
+def make_request(endpoint, i):
+    """
+    Returns (path, JSON body) for the i-th request to endpoint.
+    """
+    if endpoint == "brand-voice":
+        return "/v1/brand-voice", {"samples": SAMPLES + [f"Post number {i}"]}
+    if endpoint in ("captions", "captions-stream"):
+        return "/v1/captions", {"brand_profile": PROFILE, "intent": f"Launch {i}", "template_id": "announcement",
+                                "n": 3, "stream": endpoint == "captions-stream"}
+    if endpoint == "render":
+        return "/v1/render", {"visual_style": PROFILE["visual_style"], "overlay": f"LAUNCH DAY {i}",
+                              "template_id": "announcement", "preset": "linkedin"}
+    if endpoint == "critique":
+        return "/v1/critique", {"brand_profile": PROFILE, "caption": f"We shipped version {i}! #launch"}
+    return "/v1/improve", {"caption": f"We shipped version {i}.", "feedback": "Add a call to action."}
+
+
+async def call_asgi(app, path, body):
+    """
+    Sends one request straight to the ASGI app; returns (status, body bytes).
+    """
+    raw = json.dumps(body).encode("utf-8")
+    scope = {"type": "http", "method": "POST", "path": path, "headers": [(b"content-type", b"application/json")]}
+    sent = False
+    status, chunks = None, []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        else:
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def call_http(url, path, body):
+    """
+    Sends one HTTP/1.1 request over a fresh connection; returns (status, body bytes).
+    """
+    parts = urlsplit(url)
+    raw = json.dumps(body).encode("utf-8")
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(raw)}\r\nConnection: close\r\n\r\n".encode("latin-1") + raw
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), payload
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+async def run(args, call):
+    rng = random.Random(args.seed)
+    endpoints = ENDPOINTS if args.endpoint == "mix" else (args.endpoint,)
+    plan = [make_request(rng.choice(endpoints), i) for i in range(args.requests)]
+    names = [("captions-stream" if b.get("stream") else p.rsplit("/", 1)[1]) for p, b in plan]
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    queue = iter(range(len(plan)))
+
+    async def worker():
+        for i in queue:
+            path, body = plan[i]
+            start = time.perf_counter()
+            try:
+                status, _ = await call(path, body)
+            except OSError:
+                status = "conn-error"
+            latencies[names[i]].append((time.perf_counter() - start) * 1000)
+            statuses[names[i]][status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.2f}s: "
+          f"{args.requests / elapsed:.1f} req/s")
+    print(f"{'endpoint':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    every = [v for values in latencies.values() for v in values]
+    for name in sorted(latencies) + ["all"]:
+        values = every if name == "all" else latencies[name]
+        counts = sum(statuses.values(), Counter()) if name == "all" else statuses[name]
+        print(f"{name:<18}{len(values):>6}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}"
+              f"{percentile(values, 99):>10.1f}  {dict(counts)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--endpoint", choices=("mix",) + ENDPOINTS, default="mix")
+    parser.add_argument("--url", help="Load a running server instead of the in-process app")
+    parser.add_argument("--latency", default="lognormal:-3.0,0.4",
+                        help="Fake LLM latency for in-process runs (see fake_llm.parse_latency)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(run(args, lambda path, body: call_http(args.url, path, body)))
+        return
+
+    import llm_client
+    import api_server
+    from fake_llm import FakeLLMBackend
+
+    llm_client.set_backend(FakeLLMBackend(latency=args.latency, seed=args.seed))
+    # Measure the service, not the production rate limit
+    llm_client.get_client().bucket = llm_client.TokenBucket(rate=1e6, capacity=10 ** 6)
+    try:
+        asyncio.run(run(args, lambda path, body: call_asgi(api_server.app, path, body)))
+    finally:
+        api_server.service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Server memory as users and option counts grow: exports kept in process
+memory versus the memory-bounded artifact store.
+
+Each simulated user session renders every LinkedIn and Instagram export of
+each of its options. "in memory" models the page before the artifact
+store: the full PNG preview and every download's bytes stay in process
+memory (Streamlit's media file manager holds them for each session).
+"artifact store" models the page now: exports go to the store, and
+Streamlit only holds a copy of each option's small JPEG preview, since
+downloads are produced on click. A pool of real exports is encoded once and
+stored as fresh copies under distinct keys, so the run measures memory
+rather than render time. Every cell runs in a fresh interpreter and reports
+its resident set size.
+
+Run from the repo root:
+    python -m benchmarks.bench_artifacts --users 8 32 128 --variants 3 24
+    python -m benchmarks.bench_artifacts --memory-mb 16 --session-mb 2
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PLATFORMS = ["LinkedIn", "Instagram"]
+POOL = 4
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # Peak rather than current, where /proc is not available
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def export_pool():
+    import export
+    from visual_engine import create_social_posts
+
+    presets = ("png", export.PREVIEW) + export.fanout_presets(PLATFORMS)
+    images = create_social_posts("assets/product_shot.png", [f"OPTION {i}" for i in range(POOL)],
+                                 {"color": "#0077B5", "font": "Sans-Serif"})
+    return [export.export_all(img, presets) for img in images]
+
+
+def child(mode, users, variants):
+    import artifact_store
+
+    pool = export_pool()
+    baseline = rss_mb()
+    store = artifact_store.ArtifactStore(cache_dir=tempfile.mkdtemp(prefix="bench_artifacts_"))
+    kept = {}
+    stored = 0
+    for user in range(users):
+        for variant in range(variants):
+            for name, data in pool[variant % POOL].items():
+                # A fresh copy, as a new render would be
+                copy = bytes(bytearray(data))
+                key = artifact_store.artifact_key(user, variant, name)
+                stored += len(copy)
+                if mode == "memory":
+                    if name != "preview":
+                        kept[key] = copy
+                else:
+                    store.put(key, copy, session=user)
+                    if name == "preview":
+                        # Streamlit's copy of the preview it shows
+                        kept[key] = bytes(bytearray(store.get(key, session=user)))
+    stats = store.stats()
+    return {"stored_mb": stored / 2 ** 20, "rss_growth_mb": rss_mb() - baseline, "disk_mb": stats["disk_bytes"] / 2 ** 20,
+            "shown_mb": sum(len(v) for v in kept.values()) / 2 ** 20}
+
+
+def run_cell(mode, users, variants, env):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_artifacts", "--child", mode, str(users), str(variants)],
+                         cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="*", default=[8, 32, 128])
+    parser.add_argument("--variants", type=int, nargs="*", default=[3, 24])
+    parser.add_argument("--memory-mb", type=float, help="process-wide budget (default ARTIFACT_MEMORY_BYTES)")
+    parser.add_argument("--session-mb", type=float, help="per-session budget (default ARTIFACT_SESSION_BYTES)")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, users, variants = args.child
+        print(json.dumps(child(mode, int(users), int(variants))))
+        return
+
+    env = dict(os.environ)
+    if args.memory_mb:
+        env["ARTIFACT_MEMORY_BYTES"] = str(int(args.memory_mb * 2 ** 20))
+    if args.session_mb:
+        env["ARTIFACT_SESSION_BYTES"] = str(int(args.session_mb * 2 ** 20))
+    print(f"{'users':>6}{'options':>9}{'stored MB':>11}  {'in memory: RSS +MB':>20}  {'artifact store: RSS +MB':>25}"
+          f"{'previews MB':>13}{'spilled MB':>12}")
+    for users in args.users:
+        for variants in args.variants:
+            memory = run_cell("memory", users, variants, env)
+            store = run_cell("store", users, variants, env)
+            print(f"{users:>6}{variants:>9}{memory['stored_mb']:>11.1f}  {memory['rss_growth_mb']:>20.1f}"
+                  f"  {store['rss_growth_mb']:>25.1f}{store['shown_mb']:>13.1f}{store['disk_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
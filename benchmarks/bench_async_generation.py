@@ -0,0 +1,67 @@
+"""
+Compares sequential generate_captions calls against the concurrent
+agenerate_batch path using the local mock backend as a stub.
+
+Run from the repo root:
+    python -m benchmarks.bench_async_generation
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Both runs must return the same options, so the first must not mark them seen
+os.environ["DEDUP_DISABLED"] = "1"
+
+import generator
+
+PROFILE = {
+    "tone": "Energetic",
+    "keywords": ["hackathon", "build"],
+    "visual_style": {"color": "#FF5733", "font": "Modern Bold"},
+}
+TEMPLATES = ["Big Announcement", "Product Promo", "Data Insight"]
+PLATFORMS = ["LinkedIn", "Instagram"]
+
+
+def build_requests(intent):
+    return [
+        {"brand_profile": PROFILE, "intent": intent, "template_name": t, "platform": p, "n": 3}
+        for t in TEMPLATES
+        for p in PLATFORMS
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub backend latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=generator.DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    # Force the local stub backend.
+    os.environ.pop("GEMINI_API_KEY", None)
+    generator.MOCK_LATENCY = args.latency
+    requests = build_requests("Announce our new API")
+
+    start = time.perf_counter()
+    sequential = [
+        generator.generate_captions(r["brand_profile"], r["intent"], r["template_name"], r["platform"], r["n"])
+        for r in requests
+    ]
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = generator.generate_batch(requests, concurrency=args.concurrency)
+    concurrent_time = time.perf_counter() - start
+
+    assert sequential == concurrent
+    print(f"requests:    {len(requests)}")
+    print(f"sequential:  {sequential_time:.2f}s")
+    print(f"concurrent:  {concurrent_time:.2f}s (concurrency={args.concurrency})")
+    print(f"speedup:     {sequential_time / concurrent_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares the original per-image render loop (decode, opaque box, draw) with
+create_social_post and the batched create_social_posts path.
+
+Run from the repo root:
+    python -m benchmarks.bench_compositing
+"""
+import argparse
+import os
+import sys
+import textwrap
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from visual_engine import create_social_post, create_social_posts
+
+BASE_IMAGE = "assets/confetti.png"
+STYLE = {"color": "#FF5733", "font": "Modern Bold"}
+
+
+def legacy_render(base_image_path, overlay_text, brand_style):
+    """
+    The render loop as it was before the asset store and NumPy compositing.
+    """
+    img = Image.open(base_image_path).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    W, H = img.size
+    try:
+        font = ImageFont.truetype("arial.ttf", 40)
+    except IOError:
+        font = ImageFont.load_default()
+    lines = textwrap.wrap(overlay_text, width=20)
+    text_height = 0
+    max_text_width = 0
+    for line in lines:
+        bbox = draw.textbbox((0, 0), line, font=font)
+        text_height += bbox[3] - bbox[1] + 10
+        max_text_width = max(max_text_width, bbox[2] - bbox[0])
+    y_text = (H - text_height) / 2
+    draw.rectangle([(W - max_text_width) / 2 - 20, y_text - 20,
+                    (W + max_text_width) / 2 + 20, y_text + text_height + 20], fill=(0, 0, 0, 128))
+    for line in lines:
+        bbox = draw.textbbox((0, 0), line, font=font)
+        draw.text(((W - (bbox[2] - bbox[0])) / 2, y_text), line, font=font, fill=brand_style["color"])
+        y_text += bbox[3] - bbox[1] + 10
+    return img
+
+
+def rate(fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--variants", type=int, default=300)
+    args = parser.parse_args()
+
+    overlays = [f"VARIANT {i}: LAUNCHING OUR NEW API TODAY" for i in range(args.variants)]
+    create_social_post(BASE_IMAGE, "warm up", STYLE)
+
+    legacy = rate(lambda: [legacy_render(BASE_IMAGE, o, STYLE) for o in overlays], len(overlays))
+    single = rate(lambda: [create_social_post(BASE_IMAGE, o, STYLE) for o in overlays], len(overlays))
+    batch = rate(lambda: create_social_posts(BASE_IMAGE, overlays, STYLE), len(overlays))
+
+    print(f"variants:            {len(overlays)}")
+    print(f"legacy loop:         {legacy:7.1f} images/s")
+    print(f"create_social_post:  {single:7.1f} images/s")
+    print(f"create_social_posts: {batch:7.1f} images/s ({batch / legacy:.1f}x legacy)")
+
+
+if __name__ == "__main__":
+    main()
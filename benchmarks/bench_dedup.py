@@ -0,0 +1,80 @@
+"""
+Measures near-duplicate lookups against a large caption history.
+
+Fills a throwaway index with synthetic captions for one brand, then times
+find() for near-duplicates of stored captions and for unseen captions.
+
+Run from the repo root:
+    python -m benchmarks.bench_dedup --captions 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_index import DedupIndex
+
+COMMON = ("launch api deploy today new our the and with for your team community release "
+          "docs features update").split()
+SYLLABLES = "ka lo mi ne ru sa to vi da fe gu ho ja ke li mo nu pa re si".split()
+_vocab = random.Random(1)
+# A long tail of distinct words, like real captions, plus common ones
+WORDS = COMMON * 20 + ["".join(_vocab.choices(SYLLABLES, k=_vocab.randint(2, 4))) for _ in range(5000)]
+BRAND = "bench"
+
+
+def caption(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 24))) + f" #{rng.randint(0, 10 ** 9)}"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--captions", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    path = os.path.join(tempfile.mkdtemp(), "dedup.sqlite3")
+    index = DedupIndex(path)
+
+    stored = []
+    start = time.perf_counter()
+    for done in range(0, args.captions, args.batch):
+        batch = [caption(rng) for _ in range(min(args.batch, args.captions - done))]
+        index.add_many(BRAND, batch)
+        stored.extend(rng.sample(batch, min(len(batch), 10)))
+    build = time.perf_counter() - start
+
+    def timed(texts):
+        hits, times = 0, []
+        for text in texts:
+            t0 = time.perf_counter()
+            hits += index.find(BRAND, text) is not None
+            times.append((time.perf_counter() - t0) * 1000)
+        return hits, times
+
+    near = [s.replace(s.split()[0], rng.choice(WORDS), 1) + "!" for s in rng.choices(stored, k=args.lookups)]
+    fresh = [caption(rng) for _ in range(args.lookups)]
+    near_hits, near_ms = timed(near)
+    fresh_hits, fresh_ms = timed(fresh)
+
+    print(f"captions stored:      {index.count(BRAND)} ({build:.1f}s to build, "
+          f"{os.path.getsize(path) / 1e6:.0f} MB)")
+    print(f"near-duplicate find:  p50 {percentile(near_ms, 50):.3f} ms  p99 {percentile(near_ms, 99):.3f} ms  "
+          f"recall {near_hits / len(near):.1%}")
+    print(f"unseen caption find:  p50 {percentile(fresh_ms, 50):.3f} ms  p99 {percentile(fresh_ms, 99):.3f} ms  "
+          f"false positives {fresh_hits / len(fresh):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compares the current save path (full-size PNG with default settings) with the
+platform export presets: encode time and file size per preset, and one
+export_all pass against encoding every preset separately.
+
+Run from the repo root:
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --photo
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import export
+from visual_engine import create_social_post
+
+STYLE = {"color": "#FF5733", "font": "Modern Bold"}
+IMAGES = ["assets/confetti.png", "assets/gradient_bg.png", "assets/product_shot.png"]
+
+
+def photo_like(path, size=(800, 600), seed=0):
+    """
+    Writes a smooth-noise background; the bundled assets are flat graphics
+    that compress far better than real photos do.
+    """
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize(size, Image.BICUBIC)
+    noise = rng.integers(-12, 13, (size[1], size[0], 3))
+    Image.fromarray(np.clip(np.asarray(img, dtype=np.int16) + noise, 0, 255).astype(np.uint8)).save(path)
+
+
+def legacy_save(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--photo", action="store_true", help="Use a photo-like background instead of the bundled assets")
+    args = parser.parse_args()
+
+    paths = IMAGES
+    if args.photo:
+        photo = os.path.join(tempfile.mkdtemp(), "photo.png")
+        photo_like(photo)
+        paths = [photo]
+    renders = [create_social_post(path, "LAUNCHING OUR NEW API TODAY", STYLE) for path in paths]
+
+    print(f"{'export':<22}{'ms/image':>10}{'KiB':>10}")
+    ms, size = 0.0, 0
+    for img in renders:
+        t, data = timed(lambda: legacy_save(img), args.repeat)
+        ms += t
+        size += len(data)
+    print(f"{'legacy png':<22}{ms / len(renders):>10.2f}{size / len(renders) / 1024:>10.1f}")
+
+    for name in export.PRESETS:
+        ms, size = 0.0, 0
+        for img in renders:
+            t, data = timed(lambda: export.export_image(img, name), args.repeat)
+            ms += t
+            size += len(data)
+        print(f"{name:<22}{ms / len(renders):>10.2f}{size / len(renders) / 1024:>10.1f}")
+
+    presets = list(export.PRESETS)
+    separate = sum(timed(lambda: [export.export_image(img, p) for p in presets], args.repeat)[0] for img in renders)
+    single_pass = sum(timed(lambda: export.export_all(img, presets), args.repeat)[0] for img in renders)
+    print(f"\nall {len(presets)} presets, separate:  {separate / len(renders):8.2f} ms/image")
+    print(f"all {len(presets)} presets, export_all: {single_pass / len(renders):8.2f} ms/image")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cross-platform package cost: one generate + render per platform versus one
+fan-out pass.
+
+The per-platform flow runs generate_captions for each platform and renders
+and exports its options each time. The fan-out flow asks for every
+platform's captions in one LLM call, renders each option once and exports
+it to all platforms' presets in one export_all() pass. Reports LLM calls,
+input tokens, renders and wall time against the fake backend.
+
+Run from the repo root:
+    python -m benchmarks.bench_fanout --packages 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every package should reach the backend and the renderer
+os.environ["LLM_CACHE_DISABLED"] = "1"
+os.environ["DEDUP_DISABLED"] = "1"
+
+import export
+import llm_client
+from fake_llm import FakeLLMBackend
+from brand_voice import extract_brand_voice
+from generator import generate_captions, generate_fanout
+from visual_engine import create_social_posts
+
+SAMPLES = [
+    "The countdown begins! Only 48 hours until the biggest hackathon of the year. #HackNation #CodeLife",
+    "Did you know you can deploy your project in seconds using our new API? Check the docs. #DevTools",
+    "Shoutout to our amazing community for hitting 10k members! Let's keep hacking! #Community",
+]
+BASE_IMAGE = "assets/product_shot.png"
+TEMPLATE = "Big Announcement"
+
+
+def per_platform(profile, intent, platforms, n):
+    renders = 0
+    for platform in platforms:
+        posts = generate_captions(profile, intent, TEMPLATE, platform, n)
+        images = create_social_posts(BASE_IMAGE, [p["overlay"] for p in posts], profile["visual_style"])
+        renders += len(images)
+        for img in images:
+            export.export_all(img, export.platform_presets(platform))
+    return renders
+
+
+def fanout(profile, intent, platforms, n):
+    captions = generate_fanout(profile, intent, TEMPLATE, platforms, n)
+    overlays = [p["overlay"] for p in captions[platforms[0]]]
+    images = create_social_posts(BASE_IMAGE, overlays, profile["visual_style"])
+    for img in images:
+        export.export_all(img, export.fanout_presets(platforms))
+    return len(images)
+
+
+def run(flow, profile, packages, platforms, n):
+    client = llm_client.get_client()
+    client.usage = dict.fromkeys(client.usage, 0)
+    timings, renders = [], 0
+    for i in range(packages):
+        start = time.perf_counter()
+        renders += flow(profile, f"Launch {i}", platforms, n)
+        timings.append(time.perf_counter() - start)
+    return client.usage["calls"], client.usage["input_tokens"], renders, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packages", type=int, default=10)
+    parser.add_argument("--n", type=int, default=3)
+    parser.add_argument("--platforms", nargs="*", default=["LinkedIn", "Instagram"])
+    parser.add_argument("--latency", default="0.3", help="fake backend latency spec (see fake_llm)")
+    args = parser.parse_args()
+
+    llm_client.set_backend(FakeLLMBackend(latency=args.latency))
+    llm_client.get_client().bucket = llm_client.TokenBucket(1e6, 1e6)
+    profile = extract_brand_voice(SAMPLES)
+    # Warm the asset store and fonts
+    fanout(profile, "Warm up", args.platforms, args.n)
+
+    print(f"packages: {args.packages}, platforms: {', '.join(args.platforms)}, n: {args.n}, latency {args.latency}s")
+    print(f"{'flow':<14}{'LLM calls':>11}{'input tok':>11}{'renders':>9}{'p50 ms/package':>16}")
+    for name, flow in (("per-platform", per_platform), ("fan-out", fanout)):
+        calls, tokens, renders, p50 = run(flow, profile, args.packages, args.platforms, args.n)
+        print(f"{name:<14}{calls:>11}{tokens:>11,}{renders:>9}{p50:>16.1f}")
+    llm_client.set_backend(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures cold-start cost: how long each module takes to import in a fresh
+interpreter, which heavy dependencies it drags in, and how long a spawned
+process-pool worker takes to come up and analyze a chunk.
+
+Run from the repo root:
+    python -m benchmarks.bench_import --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODULES = ["brand_voice", "brand_store", "llm_client", "generator", "critic", "visual_engine",
+           "export", "batch_runner", "job_queue", "api_server"]
+HEAVY = ["streamlit", "google.generativeai", "numpy", "PIL", "pandas"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_cost(module, runs):
+    """
+    Returns (median ms, heavy modules loaded) over `runs` fresh interpreters.
+    """
+    timings, heavy = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        timings.append(result["ms"])
+        heavy = result["heavy"]
+    return statistics.median(timings), heavy
+
+
+def spawn_worker_ms(runs):
+    """
+    Median time to start a spawned worker and analyze one small chunk.
+    """
+    from brand_voice import _analyze_chunk
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            pool.submit(_analyze_chunk, ["Shipping faster builds today!"]).result()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    print(f"{'module':<16}{'import ms':>10}  heavy dependencies loaded")
+    for module in args.modules:
+        ms, heavy = import_cost(module, args.runs)
+        print(f"{module:<16}{ms:>10.1f}  {', '.join(heavy) or '-'}")
+    print(f"spawned brand_voice worker, first chunk: {spawn_worker_ms(args.runs):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
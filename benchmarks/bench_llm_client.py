@@ -0,0 +1,57 @@
+"""
+Drives the shared LLM client against the local fake backend with injected
+latency and errors, and reports throughput, retries and breaker behaviour.
+
+Run from the repo root:
+    python -m benchmarks.bench_llm_client --error-rate 0.2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client
+from fake_llm import FakeLLMBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--rate-per-min", type=float, default=6000)
+    parser.add_argument("--burst", type=int, default=20)
+    args = parser.parse_args()
+
+    backend = FakeLLMBackend(latency=args.latency, error_rate=args.error_rate, error_codes=(429, 503))
+    client = llm_client.LLMClient(
+        backend=backend, rate_per_min=args.rate_per_min, burst=args.burst,
+        base_delay=0.01, max_delay=0.2, breaker=llm_client.CircuitBreaker(failure_threshold=10, reset_timeout=0.5),
+    )
+
+    def call(i):
+        priority = llm_client.INTERACTIVE if i % 5 == 0 else llm_client.BATCH
+        try:
+            client.generate(f"Score it 1-10: post {i}", "fake-model", priority=priority)
+            return True
+        except llm_client.LLMUnavailable:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        ok = sum(pool.map(call, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    print(f"requests:    {args.requests} ({ok} served, {args.requests - ok} fell back to mock)")
+    print(f"throughput:  {args.requests / elapsed:.1f} req/s")
+    print(f"backend:     {backend.calls} calls")
+    print(f"client:      {client.stats}")
+    print(f"breaker:     {client.breaker.state}")
+
+
+if __name__ == "__main__":
+    main()
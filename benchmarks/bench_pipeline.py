@@ -0,0 +1,165 @@
+"""
+End-to-end pipeline benchmark against a deterministic fake LLM backend.
+
+Measures throughput and p50/p95/p99 latency for extract_brand_voice,
+generate_captions, create_social_post, critique_post and improve_post, plus
+the whole flow, and writes the results as JSON so runs can be compared
+between commits. Needs no network access.
+
+Run from the repo root:
+    python -m benchmarks.bench_pipeline --out bench_results.json
+    python -m benchmarks.bench_pipeline --compare bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Measure real work, not cache hits, and keep runs independent of the
+# caption history left by earlier runs.
+os.environ["LLM_CACHE_DISABLED"] = "1"
+os.environ["DEDUP_DISABLED"] = "1"
+
+import llm_client
+from fake_llm import FakeLLMBackend
+from brand_voice import extract_brand_voice
+from generator import generate_captions
+from critic import critique_post, improve_post
+from visual_engine import create_social_post
+
+SAMPLES = [
+    "The countdown begins! Only 48 hours until the biggest hackathon of the year. #HackNation #CodeLife",
+    "Did you know you can deploy your project in seconds using our new API? Check the docs. #DevTools",
+    "Shoutout to our amazing community for hitting 10k members! Let's keep hacking! #Community",
+]
+TEMPLATE = {"id": "announcement", "name": "Big Announcement", "default_image": "assets/confetti.png"}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples_s):
+    values = sorted(s * 1000 for s in samples_s)
+    total = sum(samples_s)
+    return {
+        "n": len(values),
+        "throughput_per_s": round(len(values) / total, 3) if total else None,
+        "mean_ms": round(total * 1000 / len(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "min_ms": round(values[0], 3) if values else 0.0,
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def measure(fn, iterations, warmup=2):
+    for i in range(warmup):
+        fn(i)
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def run_flow(i):
+    """
+    One full pass: analyze, generate, render, critique and improve.
+    """
+    profile = extract_brand_voice(SAMPLES + [f"Post number {i}"])
+    posts = generate_captions(profile, f"Launch {i}", TEMPLATE["name"], "LinkedIn", n=3)
+    for post in posts:
+        create_social_post(TEMPLATE["default_image"], post["overlay"], profile["visual_style"])
+        critique = critique_post(post["caption"], profile)
+        improve_post(post["caption"], critique["feedback"])
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    llm_client.set_backend(FakeLLMBackend(latency=args.latency, seed=args.seed))
+    client = llm_client.get_client()
+    # The benchmark measures the pipeline, not the production rate limit.
+    client.bucket = llm_client.TokenBucket(rate=1e6, capacity=10 ** 6)
+
+    profile = extract_brand_voice(SAMPLES)
+    posts = generate_captions(profile, "Warm up", TEMPLATE["name"], "LinkedIn", n=3)
+    caption = posts[0]["caption"]
+    overlay = posts[0]["overlay"]
+    n = args.iterations
+
+    stages = {
+        "extract_brand_voice": measure(lambda i: extract_brand_voice(SAMPLES + [f"Post number {i}"]), n),
+        "generate_captions": measure(lambda i: generate_captions(profile, f"Launch {i}", TEMPLATE["name"], "LinkedIn", n=3), n),
+        "create_social_post": measure(lambda i: create_social_post(TEMPLATE["default_image"], f"{overlay} {i}", profile["visual_style"]), n),
+        "critique_post": measure(lambda i: critique_post(f"{caption} {i}", profile), n),
+        "improve_post": measure(lambda i: improve_post(f"{caption} {i}", "Add a call to action."), n),
+        "full_flow": measure(run_flow, max(1, n // 4)),
+    }
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": n,
+            "latency": args.latency,
+            "seed": args.seed,
+        },
+        "stages": stages,
+    }
+
+
+def compare(current, baseline):
+    print(f"{'stage':<22}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'Δ p50':>10}")
+    for name, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        delta = ""
+        if base and base["p50_ms"]:
+            delta = f"{(stats['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100:+.1f}%"
+        print(f"{name:<22}{stats['p50_ms']:>12.2f}{stats['p95_ms']:>12.2f}{stats['p99_ms']:>12.2f}{delta:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", default="lognormal:-4.0,0.4",
+                        help="Fake LLM latency distribution (see fake_llm.parse_latency)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
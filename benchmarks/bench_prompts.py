@@ -0,0 +1,101 @@
+"""
+Input tokens and latency per LLM call with and without prefix caching.
+
+Simulates one brand's day of calls (generate, critique, improve in turn)
+against the fake backend, whose prefill cost is charged per input token not
+served from its prefix cache. Runs the same calls with the prefix cache off
+and on, and reports input, cached and billed input tokens and latency.
+
+Run from the repo root:
+    python -m benchmarks.bench_prompts --calls 300
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every call should reach the backend
+os.environ["LLM_CACHE_DISABLED"] = "1"
+os.environ["DEDUP_DISABLED"] = "1"
+
+import llm_client
+import prompts
+from fake_llm import FakeLLMBackend
+from brand_voice import extract_brand_voice
+from generator import generate_captions
+from critic import critique_post, improve_post
+
+SAMPLES = [
+    "The countdown begins! Only 48 hours until the biggest hackathon of the year. #HackNation #CodeLife",
+    "Did you know you can deploy your project in seconds using our new API? Check the docs. #DevTools",
+    "Shoutout to our amazing community for hitting 10k members! Let's keep hacking! #Community",
+]
+INTENTS = ["New API release", "Hackathon kickoff", "Docs refresh", "Community milestone", "Faster builds"]
+# Keywords as they pile up for a brand with a large archive
+LONG_KEYWORDS = [f"{word}{i}" for i in range(6) for word in
+                 ("hackathon", "developers", "community", "deploy", "api", "docs", "Community", "API")]
+
+
+def day_of_calls(brand, calls):
+    """
+    Yields a zero-argument function per call, cycling through the stages.
+    """
+    for i in range(calls):
+        intent = INTENTS[i % len(INTENTS)]
+        caption = f"{intent} is live! Try it today #{i}"
+        stage = i % 3
+        if stage == 0:
+            yield "generate", lambda: generate_captions(brand, intent, "Big Announcement", "LinkedIn", 3)
+        elif stage == 1:
+            yield "critique", lambda: critique_post(caption, brand)
+        else:
+            yield "improve", lambda: improve_post(caption, "Add a clearer call to action.")
+
+
+def run(brand, calls, latency, prefill, caching):
+    backend = FakeLLMBackend(latency=latency, prefill=prefill)
+    llm_client.set_backend(backend)
+    client = llm_client.get_client()
+    client.bucket = llm_client.TokenBucket(1e6, 1e6)
+    backend.prefix_cache = llm_client.PrefixCache(enabled=caching)
+    client.usage = dict.fromkeys(client.usage, 0)
+
+    timings = {}
+    for stage, call in day_of_calls(brand, calls):
+        start = time.perf_counter()
+        call()
+        timings.setdefault(stage, []).append(time.perf_counter() - start)
+    return dict(client.usage), timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--latency", default="0.01", help="fake backend latency spec (see fake_llm)")
+    parser.add_argument("--prefill", type=float, default=0.0005, help="seconds per uncached input token")
+    args = parser.parse_args()
+
+    brand = dict(extract_brand_voice(SAMPLES), keywords=LONG_KEYWORDS)
+    raw = prompts.estimate_tokens(", ".join(LONG_KEYWORDS))
+    compact = prompts.estimate_tokens(", ".join(prompts.compact_keywords(LONG_KEYWORDS)))
+    print(f"keyword line: {len(LONG_KEYWORDS)} keywords, {raw} tokens -> "
+          f"{len(prompts.compact_keywords(LONG_KEYWORDS))} keywords, {compact} tokens")
+    print(f"calls: {args.calls}, latency {args.latency}s, prefill {args.prefill * 1000:.2f} ms/token\n")
+
+    print(f"{'prefix cache':<14}{'input tok':>11}{'cached':>9}{'billed':>10}{'tok/call':>10}"
+          f"{'generate ms':>13}{'critique ms':>13}{'improve ms':>12}")
+    for caching in (False, True):
+        usage, timings = run(brand, args.calls, args.latency, args.prefill, caching)
+        billed_per_call = usage["billed_input_tokens"] / max(usage["calls"], 1)
+        medians = [statistics.median(timings[s]) * 1000 for s in ("generate", "critique", "improve")]
+        print(f"{'on' if caching else 'off':<14}{usage['input_tokens']:>11,}{usage['cached_tokens']:>9,}"
+              f"{usage['billed_input_tokens']:>10,.0f}{billed_per_call:>10.1f}"
+              + "".join(f"{ms:>13.1f}" for ms in medians[:2]) + f"{medians[2]:>12.1f}")
+    llm_client.set_backend(None)
+
+
+if __name__ == "__main__":
+    main()
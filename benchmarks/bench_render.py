@@ -0,0 +1,58 @@
+"""
+Measures create_social_post latency with the pre-decoded asset store against
+decoding the background PNG and loading the font on every call.
+
+Run from the repo root:
+    python -m benchmarks.bench_render
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFont
+
+import asset_store
+from visual_engine import create_social_post
+
+STYLE = {"color": "#FF5733", "font": "Modern Bold"}
+
+
+def per_call_decode(path):
+    img = Image.open(path).convert("RGB")
+    try:
+        ImageFont.truetype("arial.ttf", 40)
+    except IOError:
+        ImageFont.load_default()
+    return img
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    with open("templates.json", "r") as f:
+        templates = json.load(f)
+    asset_store.preload(templates)
+
+    for template in templates:
+        path = template["default_image"]
+        decode_ms = timed(lambda: per_call_decode(path), args.iterations)
+        store_ms = timed(lambda: asset_store.load_background(path), args.iterations)
+        render_ms = timed(lambda: create_social_post(path, "ANNOUNCING: Our new API", STYLE), args.iterations)
+        print(f"{template['id']:<14} decode {decode_ms:6.2f} ms | store {store_ms:6.2f} ms | full render {render_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
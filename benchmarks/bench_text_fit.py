@@ -0,0 +1,79 @@
+"""
+Compares the original fixed-size text layout (textwrap by character count,
+textbbox on every line twice) with fit_text, which wraps by pixel width and
+searches the largest font size that fits the box.
+
+Run from the repo root:
+    python -m benchmarks.bench_text_fit
+"""
+import argparse
+import os
+import random
+import sys
+import textwrap
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+import visual_engine
+from asset_store import get_font
+
+WORDS = ("launch api deploy seconds community hackathon developers shipping "
+         "faster builds release today announcing weekend docs features").split()
+BOX = (480, 380)
+
+
+def overlays(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 16))).upper() + f" {i}"
+            for i in range(count)]
+
+
+def legacy_layout(text, draw, font):
+    lines = textwrap.wrap(text, width=20)
+    height = 0
+    for line in lines:
+        bbox = draw.textbbox((0, 0), line, font=font)
+        height += bbox[3] - bbox[1] + 10
+    placed = []
+    for line in lines:
+        bbox = draw.textbbox((0, 0), line, font=font)
+        placed.append((line, bbox[2] - bbox[0]))
+    return placed, height
+
+
+def per_item_us(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) * 1e6 / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--overlays", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts = overlays(args.overlays)
+    draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+    font = get_font(visual_engine.FONT_FACE, visual_engine.FONT_SIZE)
+
+    legacy = per_item_us(lambda t: legacy_layout(t, draw, font), texts)
+    visual_engine.fit_text.cache_clear()
+    visual_engine._advance.cache_clear()
+    cold = per_item_us(lambda t: visual_engine.fit_text(t, *BOX, 56), texts)
+    warm = per_item_us(lambda t: visual_engine.fit_text(t, *BOX, 56), texts)
+    visual_engine.fit_text.cache_clear()
+    glyphs_warm = per_item_us(lambda t: visual_engine.fit_text(t, *BOX, 56), texts)
+
+    print(f"overlays:                         {len(texts)}")
+    print(f"legacy fixed 40px layout:         {legacy:8.1f} us/overlay")
+    print(f"fit_text, cold caches:            {cold:8.1f} us/overlay")
+    print(f"fit_text, warm glyph cache:       {glyphs_warm:8.1f} us/overlay")
+    print(f"fit_text, repeated overlay:       {warm:8.1f} us/overlay")
+
+
+if __name__ == "__main__":
+    main()
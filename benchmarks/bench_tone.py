@@ -0,0 +1,88 @@
+"""
+Tone classification throughput as the lexicons grow.
+
+Scores the same synthetic posts with the original substring checks, with the
+bundled tone_lexicons.json, and with lexicons padded to thousands of
+synthetic words, stems and phrases. Throughput should stay flat as the
+lexicons grow, since scoring is a lookup per token.
+
+Run from the repo root:
+    python -m benchmarks.bench_tone --posts 20000
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tone_engine
+
+WORDS = ("launch api deploy seconds community hackathon developers shipping faster builds "
+         "release today announcing weekend docs features help support amazing journey").split()
+SYLLABLES = "ka lo mi ne ru sa to vi da fe gu ho ja ke li mo nu pa re si".split()
+
+
+def posts(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))) + rng.choice(["", "!", " 🚀", "?"])
+            for _ in range(count)]
+
+
+def legacy_signals(text):
+    text = text.lower()
+    return ("!" in text, "help" in text or "support" in text, "code" in text or "hack" in text or "api" in text)
+
+
+def padded_config(base, extra_terms, seed=1):
+    """
+    Adds extra_terms synthetic words, stems and two-word phrases, spread
+    over every tone, in a "synthetic" language.
+    """
+    rng = random.Random(seed)
+    config = copy.deepcopy(base)
+    lexicon = {tone: {} for tone in config["tones"]}
+    tones = list(lexicon)
+    for i in range(extra_terms):
+        word = "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) + str(i)
+        kind = i % 3
+        term = word if kind == 0 else word + "*" if kind == 1 else f"{word} {rng.choice(WORDS)}"
+        lexicon[tones[i % len(tones)]][term] = round(rng.uniform(0.5, 1.5), 2)
+    config["lexicons"]["synthetic"] = lexicon
+    return config
+
+
+def per_second(fn, texts):
+    start = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    texts = posts(args.posts)
+    with open(tone_engine.DEFAULT_PATH, "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    print(f"posts: {len(texts)}")
+    print(f"{'classifier':<34}{'terms':>8}{'compile ms':>12}{'posts/s':>12}")
+    print(f"{'legacy substring checks':<34}{3 + 4:>8}{'-':>12}{per_second(legacy_signals, texts):>12,.0f}")
+    for label, config in [("bundled lexicons", base)] + [
+            (f"bundled + {size:,} synthetic", padded_config(base, size)) for size in args.sizes]:
+        start = time.perf_counter()
+        engine = tone_engine.ToneEngine(config)
+        compile_ms = (time.perf_counter() - start) * 1000
+        rate = per_second(lambda t: engine.rank(engine.scores(t)), texts)
+        print(f"{label:<34}{engine.size:>8}{compile_ms:>12.1f}{rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
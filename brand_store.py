@@ -0,0 +1,210 @@
+"""
+Persistent multi-brand profile store.
+
+Each brand is one SQLite row keyed by brand id, holding the analyzer's
+running state (keyword counts, tone signals, word and post totals) and the
+profile computed from it. Loading a brand is a single primary-key read with
+no re-analysis; adding posts updates the stored state incrementally, so
+only the new posts are scanned. A hash of every post added is kept, so
+submitting the same samples again does not count them twice. Set
+BRAND_STORE_PATH to move the database.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from brand_voice import BrandVoiceAccumulator, analyze_corpus, DEFAULT_MAX_VOCAB
+
+DEFAULT_PATH = os.environ.get("BRAND_STORE_PATH", os.path.join(".cache", "brands.sqlite3"))
+
+
+def brand_id_for(name):
+    """
+    Derives a stable brand id from a display name: a readable slug plus a
+    short hash of the exact name, so names that slug alike ("Acme Labs",
+    "acme-labs") stay separate brands, e.g. "Acme Labs" -> "acme-labs-a0681f".
+    """
+    name = name.strip()
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "brand"
+    return f"{slug}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:6]}"
+
+
+def post_hash(post):
+    """
+    Identifies a post by its text, ignoring surrounding whitespace.
+    """
+    return hashlib.sha1(post.strip().encode("utf-8")).hexdigest()
+
+
+class BrandStore:
+    """
+    SQLite-backed brand profiles. Thread-safe; updates from several
+    processes are serialized by SQLite.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_vocab=DEFAULT_MAX_VOCAB):
+        self.path = path
+        self.max_vocab = max_vocab
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Autocommit mode, so updates can take the write lock up front
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS brands ("
+                "brand_id TEXT PRIMARY KEY, name TEXT NOT NULL, state TEXT NOT NULL, "
+                "profile TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS brand_posts ("
+                "brand_id TEXT NOT NULL, post_hash TEXT NOT NULL, PRIMARY KEY (brand_id, post_hash))"
+            )
+        return self._db
+
+    def get(self, brand_id):
+        """
+        Returns the stored profile for brand_id, or None.
+        """
+        with self._lock:
+            row = self._conn().execute("SELECT profile FROM brands WHERE brand_id = ?", (brand_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def id_for(self, name):
+        """
+        Returns the id of the brand stored under exactly this name (which
+        may predate brand_id_for), or a new id from brand_id_for.
+        """
+        with self._lock:
+            row = self._conn().execute("SELECT brand_id FROM brands WHERE name = ? ORDER BY created LIMIT 1",
+                                       (name.strip(),)).fetchone()
+        return row[0] if row else brand_id_for(name)
+
+    def accumulator(self, brand_id):
+        """
+        Returns the brand's analyzer state, or a fresh one if it is new.
+        """
+        with self._lock:
+            row = self._conn().execute("SELECT state FROM brands WHERE brand_id = ?", (brand_id,)).fetchone()
+        if row is None:
+            return BrandVoiceAccumulator(max_vocab=self.max_vocab)
+        return BrandVoiceAccumulator.from_state(json.loads(row[0]))
+
+    def _update(self, brand_id, name, apply):
+        """
+        Loads the brand's state, runs apply(accumulator, db) and saves the
+        result, all under SQLite's write lock. Returns the new profile.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT name, state, created FROM brands WHERE brand_id = ?", (brand_id,)).fetchone()
+                if row is None:
+                    acc = BrandVoiceAccumulator(max_vocab=self.max_vocab)
+                    created = now
+                else:
+                    acc = BrandVoiceAccumulator.from_state(json.loads(row[1]))
+                    created = row[2]
+                    name = name or row[0]
+                apply(acc, db)
+                profile = dict(acc.to_profile(), brand_id=brand_id, name=name or brand_id, posts=acc.posts)
+                db.execute(
+                    "INSERT OR REPLACE INTO brands (brand_id, name, state, profile, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (brand_id, profile["name"], json.dumps(acc.to_state()), json.dumps(profile), created, now),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return profile
+
+    def add_posts(self, brand_id, posts, name=None):
+        """
+        Adds posts to the brand (creating it if needed) and returns the
+        updated profile. Posts the brand already has are skipped, so only
+        new posts are analyzed.
+        """
+        def apply(acc, db):
+            new = {}
+            for post in posts:
+                new.setdefault(post_hash(post), post)
+            seen = set()
+            hashes = list(new)
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                seen.update(h for (h,) in db.execute(
+                    f"SELECT post_hash FROM brand_posts WHERE brand_id = ? AND post_hash IN ({','.join('?' * len(chunk))})",
+                    (brand_id, *chunk),
+                ))
+            fresh = [h for h in hashes if h not in seen]
+            db.executemany("INSERT INTO brand_posts (brand_id, post_hash) VALUES (?, ?)", [(brand_id, h) for h in fresh])
+            acc.update(new[h] for h in fresh)
+
+        return self._update(brand_id, name, apply)
+
+    def add_corpus(self, brand_id, source, name=None, field=None, workers=None):
+        """
+        Like add_posts for a large archive (path or iterable), analyzed in
+        chunks by brand_voice.analyze_corpus. Archives are streamed, not
+        checked against earlier posts, so import each one once.
+        """
+        # Analyzed without any lock held; only the merge runs in the write transaction
+        fresh = analyze_corpus(source, field, workers=workers, accumulator=BrandVoiceAccumulator(self.max_vocab))
+        return self._update(brand_id, name, lambda acc, db: acc.merge(fresh))
+
+    def list(self):
+        """
+        Returns [{"brand_id", "name", "posts", "tone", "updated"}], by name.
+        """
+        with self._lock:
+            rows = self._conn().execute("SELECT profile, updated FROM brands ORDER BY name").fetchall()
+        brands = []
+        for profile, updated in rows:
+            profile = json.loads(profile)
+            brands.append({
+                "brand_id": profile["brand_id"],
+                "name": profile["name"],
+                "posts": profile.get("posts", 0),
+                "tone": profile.get("tone"),
+                "updated": updated,
+            })
+        return brands
+
+    def delete(self, brand_id):
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM brands WHERE brand_id = ?", (brand_id,))
+                db.execute("DELETE FROM brand_posts WHERE brand_id = ?", (brand_id,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Returns the process-wide store.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = BrandStore()
+        return _default_store
@@ -1,8 +1,26 @@
+import csv
+import json
+import os
 import re
 from collections import Counter
-import streamlit as st
+import telemetry
+from tone_engine import get_engine
 
-@st.cache_data
+WORD_RE = re.compile(r'\w+')
+
+# Filter common stop words (very basic list)
+STOP_WORDS = frozenset(['the', 'a', 'an', 'and', 'is', 'to', 'in', 'of', 'for', 'with', 'on', 'at', 'by', 'from'])
+
+# Field names tried, in order, when reading posts from CSV/JSONL exports
+TEXT_FIELDS = ("text", "post", "caption", "content", "message")
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Distinct keywords an accumulator keeps counting; rarer ones are dropped.
+# The table may grow to twice this between trims (see _prune).
+DEFAULT_MAX_VOCAB = 5000
+
+@telemetry.traced("brand_voice.extract")
 def extract_brand_voice(sample_posts):
     """
     Analyzes list of sample posts and returns a dictionary of brand voice attributes.
@@ -12,34 +30,195 @@ def extract_brand_voice(sample_posts):
     if not sample_posts:
         return {"tone": "Neutral", "keywords": []}
 
-    all_text = " ".join(sample_posts).lower()
-    words = re.findall(r'\w+', all_text)
-    
-    # Filter common stop words (very basic list)
-    stop_words = set(['the', 'a', 'an', 'and', 'is', 'to', 'in', 'of', 'for', 'with', 'on', 'at', 'by', 'from'])
-    filtered_words = [w for w in words if w not in stop_words and len(w) > 3]
-    
-    # Get most common keywords
-    keyword_counts = Counter(filtered_words)
-    top_keywords = [word for word, count in keyword_counts.most_common(5)]
-    
-    # Determine tone based on simple heuristics
-    tone = "Professional"
-    visual_style = {"color": "#0077B5", "font": "Sans-Serif"} # Default LinkedIn Blue
-
-    if "!" in all_text:
-        tone = "Energetic"
-        visual_style = {"color": "#FF5733", "font": "Modern Bold"} # Orange
-    if "help" in all_text or "support" in all_text:
-        tone = "Helpful"
-        visual_style = {"color": "#28A745", "font": "Friendly/Rounded"} # Green
-    if "code" in all_text or "hack" in all_text or "api" in all_text:
-        tone = "Technical"
-        visual_style = {"color": "#61DAFB", "font": "Monospace"} # React Blue/Tech
-
-    return {
-        "tone": tone,
-        "keywords": top_keywords,
-        "visual_style": visual_style,
-        "avg_length": sum(len(p.split()) for p in sample_posts) / len(sample_posts)
-    }
+    acc = BrandVoiceAccumulator()
+    acc.update(sample_posts)
+    return acc.to_profile()
+
+class BrandVoiceAccumulator:
+    """
+    Mergeable partial state of a brand voice analysis: keyword counts, tone
+    scores and length statistics. Feed posts with update(), combine partial
+    results with merge(), and read the profile with to_profile().
+    Use to_state()/from_state() to persist it and add new posts later
+    without rescanning history.
+    """
+
+    def __init__(self, max_vocab=DEFAULT_MAX_VOCAB):
+        # max_vocab caps the keyword table (approximate counts beyond it);
+        # it is trimmed back to max_vocab once it reaches twice that size.
+        # None keeps every keyword
+        self.max_vocab = max_vocab
+        self.keyword_counts = Counter()
+        self.posts = 0
+        self.total_words = 0
+        # Summed lexicon scores per tone (see tone_engine)
+        self.tone_scores = Counter()
+
+    def add(self, post):
+        text = post.lower()
+        self.posts += 1
+        self.total_words += len(post.split())
+        self.keyword_counts.update(w for w in WORD_RE.findall(text) if w not in STOP_WORDS and len(w) > 3)
+        self.tone_scores.update(get_engine().scores(text))
+        self._prune()
+
+    def update(self, posts):
+        for post in posts:
+            self.add(post)
+        return self
+
+    def merge(self, other):
+        self.keyword_counts.update(other.keyword_counts)
+        self.posts += other.posts
+        self.total_words += other.total_words
+        self.tone_scores.update(other.tone_scores)
+        self._prune()
+        return self
+
+    def _prune(self):
+        # Trimming sorts the table, so it waits until the table doubles and
+        # a trim is paid for by max_vocab new keywords. Up to 2 * max_vocab
+        # keywords are held in between.
+        if self.max_vocab and len(self.keyword_counts) > 2 * self.max_vocab:
+            self._trim()
+
+    def _trim(self):
+        if self.max_vocab and len(self.keyword_counts) > self.max_vocab:
+            self.keyword_counts = Counter(dict(self.keyword_counts.most_common(self.max_vocab)))
+
+    def to_profile(self):
+        """
+        Returns the same profile dict extract_brand_voice always has, plus
+        the ranked tone probabilities behind the chosen tone.
+        """
+        if not self.posts:
+            return {"tone": "Neutral", "keywords": []}
+
+        # Get most common keywords
+        top_keywords = [word for word, count in self.keyword_counts.most_common(5)]
+
+        # Most likely tone across all posts, styled from the lexicon config
+        engine = get_engine()
+        ranked = engine.rank(self.tone_scores)
+        tone = ranked[0][0]
+
+        return {
+            "tone": tone,
+            "keywords": top_keywords,
+            "visual_style": engine.visual_style(tone),
+            "avg_length": self.total_words / self.posts,
+            "tone_probabilities": {name: round(p, 3) for name, p in ranked},
+        }
+
+    def to_state(self):
+        # Saved states stay within the cap
+        self._trim()
+        return {
+            "keyword_counts": list(self.keyword_counts.items()),
+            "posts": self.posts,
+            "total_words": self.total_words,
+            "tone_scores": dict(self.tone_scores),
+            "max_vocab": self.max_vocab,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        # A saved None means uncapped; states saved before the cap existed get the default
+        acc = cls(max_vocab=state["max_vocab"] if "max_vocab" in state else DEFAULT_MAX_VOCAB)
+        acc.keyword_counts = Counter(dict(state.get("keyword_counts", [])))
+        acc.posts = state.get("posts", 0)
+        acc.total_words = state.get("total_words", 0)
+        acc.tone_scores.update(state.get("tone_scores", {}))
+        return acc
+
+def _analyze_chunk(posts):
+    return BrandVoiceAccumulator().update(posts)
+
+def _post_text(item, field=None):
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        if field:
+            return item.get(field) or ""
+        for name in TEXT_FIELDS:
+            if item.get(name):
+                return item[name]
+    return ""
+
+def iter_posts(path, field=None):
+    """
+    Streams post texts from a CSV, JSONL or plain text (one post per line) file.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            reader = csv.DictReader(f)
+            if field is None and reader.fieldnames:
+                field = next((n for n in TEXT_FIELDS if n in reader.fieldnames), reader.fieldnames[0])
+            for row in reader:
+                text = row.get(field) or ""
+                if text.strip():
+                    yield text
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    text = _post_text(json.loads(line), field)
+                    if text.strip():
+                        yield text
+        else:
+            for line in f:
+                if line.strip():
+                    yield line.rstrip("\n")
+
+def _chunks(posts, size):
+    chunk = []
+    for post in posts:
+        chunk.append(post)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def analyze_corpus(source, field=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, accumulator=None):
+    """
+    Streams a large post archive through the analyzer and returns the
+    accumulator; call .to_profile() for the usual profile dict.
+
+    source is an iterable of posts (strings or dicts) or a path to a
+    CSV/JSONL/text file. Chunks are tokenized across a process pool and
+    merged in input order, with only a few chunks in flight at a time so
+    memory does not grow with the corpus. Pass an existing accumulator to
+    add new posts to a previous analysis.
+    """
+    with telemetry.span("brand_voice.analyze_corpus", workers=workers or 0):
+        return _analyze_corpus(source, field, chunk_size, workers, accumulator)
+
+def _analyze_corpus(source, field, chunk_size, workers, accumulator):
+    if isinstance(source, (str, os.PathLike)):
+        posts = iter_posts(source, field)
+    else:
+        posts = (_post_text(item, field) for item in source)
+
+    acc = accumulator or BrandVoiceAccumulator()
+    chunks = _chunks(posts, chunk_size)
+
+    if workers is not None and workers <= 1:
+        for chunk in chunks:
+            acc.update(chunk)
+        return acc
+
+    # Only corpus runs need the process pool machinery
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = 2 * workers
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(_analyze_chunk, chunk))
+            if len(pending) >= window:
+                acc.merge(pending.pop(0).result())
+        for future in pending:
+            acc.merge(future.result())
+    return acc
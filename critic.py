@@ -1,23 +1,65 @@
 import time
 import os
 import json
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+import llm_client
+import prompts
+import telemetry
+from llm_cache import get_cache
 
-def critique_post(post_content, brand_profile):
+# Simulated round-trip latency of the mock critic, in seconds.
+MOCK_LATENCY = 1.0
+
+CRITIC_MODEL = 'gemini-1.0-pro'
+IMPROVER_MODEL = 'gemini-1.5-flash'
+
+@telemetry.traced("critic.critique")
+def critique_post(post_content, brand_profile, bypass_cache=False):
     """
     Evaluates the post for compliance with brand voice.
-    uUses OpenAI if key is present.
+    Uses Gemini if key is present; repeated critiques are served from cache.
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if api_key and genai:
-        return critique_post_with_llm(api_key, post_content, brand_profile)
+    if llm_client.is_enabled():
+        return critique_post_with_llm(os.environ.get("GEMINI_API_KEY"), post_content, brand_profile, bypass_cache)
 
     # Mock Critic Agent.
-    time.sleep(1)
-    
+    time.sleep(MOCK_LATENCY)
+    return mock_critique(post_content, brand_profile)
+
+@telemetry.traced("critic.critique_batch")
+def critique_posts(posts, brand_profile, bypass_cache=False, progress=None):
+    """
+    Critiques many posts in a single round trip.
+    posts is a list of caption strings (or post dicts with a "caption").
+    Returns one {"score", "feedback"} dict per post, in the same order.
+    progress(done, total), if given, is called as posts are scored; it may
+    raise to stop early (e.g. a queue job's cancel check).
+    """
+    captions = [caption_of(p) for p in posts]
+    if not captions:
+        return []
+
+    if llm_client.is_enabled():
+        return critique_posts_with_llm(os.environ.get("GEMINI_API_KEY"), captions, brand_profile, bypass_cache, progress)
+
+    # Mock Critic Agent: one simulated round trip for the whole batch.
+    time.sleep(MOCK_LATENCY)
+    critiques = [mock_critique(c, brand_profile) for c in captions]
+    if progress:
+        progress(len(critiques), len(captions))
+    return critiques
+
+def caption_of(post):
+    """
+    Returns the caption of a post given as a string or a post dict.
+    """
+    if isinstance(post, dict):
+        return post.get("caption", "")
+    return post
+
+def mock_critique(post_content, brand_profile):
+    """
+    Heuristic critique used when no API key is set, without any latency.
+    """
     tone = brand_profile.get('tone', 'Neutral')
     score = 8  # Default good score
     feedback = "Looks good!"
@@ -40,63 +82,137 @@ def critique_post(post_content, brand_profile):
         "feedback": feedback
     }
 
-def improve_post(post_content, feedback):
+@telemetry.traced("critic.improve")
+def improve_post(post_content, feedback, bypass_cache=False):
     """
     Rewrites post based on feedback.
-    Uses OpenAI if key is present.
+    Uses Gemini if key is present.
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if api_key and genai:
-        return improve_post_with_llm(api_key, post_content, feedback)
+    if llm_client.is_enabled():
+        return improve_post_with_llm(os.environ.get("GEMINI_API_KEY"), post_content, feedback, bypass_cache)
         
     # Mock rewriting
-    return post_content + " (Improved)"
+    return mock_improve(post_content, feedback)
 
-def critique_post_with_llm(api_key, post_content, brand_profile):
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.0-pro')
-    
-    tone = brand_profile.get('tone', 'Neutral')
-    
-    prompt = f"""
-    You are a strict Brand Compliance Officer.
-    Brand Voice: {tone}
-    
-    Review this post:
-    "{post_content}"
-    
-    Score it 1-10 on alignment with the brand voice and effectiveness.
-    Provide 1 sentence of specific feedback for improvement.
-    
-    Output strictly valid JSON:
-    {{
-        "score": 8,
-        "feedback": "Short feedback here."
-    }}
+def mock_improve(post_content, feedback):
     """
-    
+    Mock rewrite: applies only the punctuation fix mock_critique asks for
+    when a post lacks energy. It never adds claims or hashtags the author
+    did not write, so other feedback leaves the post unchanged (the polish
+    loop then stops with "plateau").
+    """
+    text = post_content.strip()
+    hint = feedback.lower()
+    if ("energy" in hint or "exclamation" in hint) and "!" not in text:
+        text = text.rstrip(".") + "!"
+    return text
+
+def parse_critique(text):
+    text = text.replace("```json", "").replace("```", "").strip()
+    data = json.loads(text)
+    if not isinstance(data, dict) or "score" not in data:
+        raise ValueError("Expected a JSON object with a score")
+    return data
+
+def _is_valid_critique(text):
     try:
-        response = model.generate_content(prompt)
-        text = response.text.replace("```json", "").replace("```", "").strip()
-        data = json.loads(text)
-        return data
-    except:
-        return {"score": 5, "feedback": "AI Error. Check connection."}
-
-def improve_post_with_llm(api_key, post_content, feedback):
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    
-    prompt = f"""
-    Rewrite this social media post to address the feedback.
-    Original: "{post_content}"
-    Feedback: "{feedback}"
-    
-    Output only the rewritten post text.
+        parse_critique(text)
+        return True
+    except ValueError:
+        return False
+
+def critique_post_with_llm(api_key, post_content, brand_profile, bypass_cache=False):
+    prompt = prompts.critique_prompt(brand_profile, post_content)
+
+    try:
+        text = get_cache().get_or_call(
+            CRITIC_MODEL, prompt,
+            lambda: llm_client.get_client().generate(prompt, CRITIC_MODEL, api_key=api_key),
+            bypass=bypass_cache, validate=_is_valid_critique,
+        )
+        return parse_critique(text)
+    except (llm_client.LLMUnavailable, ValueError) as e:
+        # Score with the heuristic critic rather than inventing a number
+        print(f"Gemini Error, using mock critique: {e}")
+        telemetry.incr("llm_fallbacks", stage="critique")
+        return mock_critique(post_content, brand_profile)
+
+def improve_post_with_llm(api_key, post_content, feedback, bypass_cache=False):
+    prompt = prompts.improve_prompt(post_content, feedback)
+
+    try:
+        text = get_cache().get_or_call(
+            IMPROVER_MODEL, prompt,
+            lambda: llm_client.get_client().generate(prompt, IMPROVER_MODEL, api_key=api_key),
+            bypass=bypass_cache,
+        )
+        return text.strip()
+    except llm_client.LLMUnavailable as e:
+        print(f"Gemini Error, using mock rewrite: {e}")
+        telemetry.incr("llm_fallbacks", stage="improve")
+        return mock_improve(post_content, feedback)
+
+def parse_batch_critique(text, count):
     """
-    
+    Maps a batch critique answer back onto post indexes.
+    Returns {index: critique} for every item that parsed cleanly; items
+    that are missing, duplicated or malformed are left out.
+    """
+    text = text.replace("```json", "").replace("```", "").strip()
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("critiques", data.get("results", []))
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of critiques")
+
+    results = {}
+    use_position = len(data) == count and not any(isinstance(item, dict) and "id" in item for item in data)
+    for position, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = position if use_position else int(item["id"]) - 1
+            score = float(item["score"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not 0 <= index < count or index in results or not 1 <= score <= 10:
+            continue
+        results[index] = {
+            "score": int(score) if score.is_integer() else score,
+            "feedback": str(item.get("feedback", "")),
+        }
+    return results
+
+def critique_posts_with_llm(api_key, captions, brand_profile, bypass_cache=False, progress=None):
+    prompt = prompts.batch_critique_prompt(brand_profile, captions)
+
+    def is_complete(text):
+        try:
+            return len(parse_batch_critique(text, len(captions))) == len(captions)
+        except ValueError:
+            return False
+
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except:
-        return post_content + " (AI Error)"
+        text = get_cache().get_or_call(
+            CRITIC_MODEL, prompt,
+            lambda: llm_client.get_client().generate(prompt, CRITIC_MODEL, api_key=api_key),
+            bypass=bypass_cache, validate=is_complete,
+        )
+        parsed = parse_batch_critique(text, len(captions))
+    except llm_client.LLMUnavailable as e:
+        print(f"Gemini Error, using mock critiques: {e}")
+        telemetry.incr("llm_fallbacks", stage="critique")
+        return [mock_critique(c, brand_profile) for c in captions]
+    except ValueError as e:
+        print(f"Gemini Error: {e}")
+        parsed = {}
+
+    # Fall back to single critiques only for the posts that did not parse.
+    if len(parsed) < len(captions):
+        telemetry.incr("critique_parse_fallbacks", len(captions) - len(parsed))
+    critiques = []
+    for i, c in enumerate(captions):
+        critiques.append(parsed[i] if i in parsed else critique_post_with_llm(api_key, c, brand_profile, bypass_cache))
+        if progress:
+            progress(len(critiques), len(captions))
+    return critiques
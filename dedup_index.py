@@ -0,0 +1,219 @@
+"""
+Near-duplicate index over every caption generated for each brand.
+
+Captions are reduced to MinHash signatures over character shingles and
+bucketed with LSH (locality-sensitive hashing): the signature is cut into
+bands and each band is hashed to one key, so similar captions share at
+least one key with high probability. A lookup is one indexed SQLite query
+for the caption's band keys plus a signature comparison for the few
+candidates it returns, which stays sub-millisecond with millions of stored
+captions. The index lives next to the LLM cache and persists across
+sessions. Set DEDUP_DISABLED=1 to turn it off, or DEDUP_PATH to move it.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_PATH = os.environ.get("DEDUP_PATH", os.path.join(".cache", "dedup.sqlite3"))
+# Estimated Jaccard similarity at or above which captions are near-duplicates
+DEFAULT_THRESHOLD = 0.7
+SHINGLE_SIZE = 5
+# 20 bands of 6 rows: pairs at 0.7 similarity share a band ~92% of the
+# time, pairs at 0.3 only ~1.5%
+BANDS = 20
+ROWS = 6
+NUM_PERM = BANDS * ROWS
+# Candidates checked per lookup, so one crowded bucket cannot slow it down
+MAX_CANDIDATES = 200
+
+# Fixed seeds: signatures are persisted, so the hash family must not change
+_rng = np.random.default_rng(1)
+# Odd multipliers make each a*x + b (mod 2**32) a permutation of 32-bit values
+_A = (_rng.integers(0, 2 ** 31, NUM_PERM, dtype=np.uint32) * 2 + 1)[:, None]
+_B = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint32)[:, None]
+# Per-band weights for folding a band's rows into one 64-bit key
+_BAND_WEIGHTS = _rng.integers(1, 2 ** 63, (BANDS, ROWS), dtype=np.uint64) | np.uint64(1)
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def shingles(text):
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """
+    Returns the MinHash signature of text as NUM_PERM uint32 values.
+    """
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint32)
+    return (_A * hashes + _B).min(axis=1)
+
+
+def band_keys(sig):
+    """
+    Hashes each band of the signature to a signed 64-bit SQLite key.
+    """
+    folded = (sig.reshape(BANDS, ROWS).astype(np.uint64) * _BAND_WEIGHTS).sum(axis=1)
+    return folded.view(np.int64).tolist()
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimated Jaccard similarity of the two captions.
+    """
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def brand_key(brand_profile):
+    """
+    Identifies the brand a caption belongs to: its stored id when it has
+    one, otherwise a hash of its tone and keywords.
+    """
+    if brand_profile.get("brand_id"):
+        return str(brand_profile["brand_id"])
+    payload = json.dumps([brand_profile.get("tone"), brand_profile.get("keywords", [])], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class DedupIndex:
+    """
+    Persistent MinHash/LSH index of captions per brand. Thread-safe.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                "id INTEGER PRIMARY KEY, brand TEXT NOT NULL, text TEXT NOT NULL, "
+                "signature BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lsh ("
+                "brand TEXT NOT NULL, key INTEGER NOT NULL, caption_id INTEGER NOT NULL, "
+                "PRIMARY KEY (brand, key, caption_id)) WITHOUT ROWID"
+            )
+            self._db.commit()
+        return self._db
+
+    def find(self, brand, text, sig=None):
+        """
+        Returns (caption text, similarity) of the closest stored caption at
+        or above the threshold, or None.
+        """
+        sig = signature(text) if sig is None else sig
+        keys = band_keys(sig)
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT c.text, c.signature FROM captions c WHERE c.id IN ("
+                f"SELECT DISTINCT caption_id FROM lsh WHERE brand = ? AND key IN ({','.join('?' * len(keys))}) "
+                "LIMIT ?)",
+                (brand, *keys, MAX_CANDIDATES),
+            ).fetchall()
+        best = None
+        for stored, blob in rows:
+            score = similarity(sig, np.frombuffer(blob, dtype=np.uint32))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (stored, score)
+        return best
+
+    def is_duplicate(self, brand, text):
+        return self.find(brand, text) is not None
+
+    def split(self, brand, texts, accepted=()):
+        """
+        Splits texts into (unique, duplicate) index lists. A text is a
+        duplicate if it is near a stored caption, an `accepted` text or an
+        earlier unique text in the same call. Nothing is stored.
+        """
+        kept_sigs = [signature(t) for t in accepted]
+        unique, duplicate = [], []
+        for i, text in enumerate(texts):
+            sig = signature(text)
+            if any(similarity(sig, other) >= self.threshold for other in kept_sigs) \
+                    or self.find(brand, text, sig) is not None:
+                duplicate.append(i)
+            else:
+                unique.append(i)
+                kept_sigs.append(sig)
+        return unique, duplicate
+
+    def add_many(self, brand, texts):
+        """
+        Stores captions for brand in one transaction.
+        """
+        now = time.time()
+        prepared = [(text, signature(text)) for text in texts if text]
+        with self._lock:
+            db = self._conn()
+            try:
+                lsh = []
+                for text, sig in prepared:
+                    # Ids come from SQLite inside the write transaction, so
+                    # processes sharing the file never pick the same one
+                    cur = db.execute("INSERT INTO captions (brand, text, signature, created) VALUES (?, ?, ?, ?)",
+                                     (brand, text, sig.tobytes(), now))
+                    lsh += [(brand, key, cur.lastrowid) for key in band_keys(sig)]
+                db.executemany("INSERT OR IGNORE INTO lsh (brand, key, caption_id) VALUES (?, ?, ?)", lsh)
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+
+    def add(self, brand, text):
+        self.add_many(brand, [text])
+
+    def count(self, brand=None):
+        with self._lock:
+            db = self._conn()
+            if brand is None:
+                return db.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+            return db.execute("SELECT COUNT(*) FROM captions WHERE brand = ?", (brand,)).fetchone()[0]
+
+    def clear(self, brand=None):
+        with self._lock:
+            db = self._conn()
+            if brand is None:
+                db.execute("DELETE FROM lsh")
+                db.execute("DELETE FROM captions")
+            else:
+                db.execute("DELETE FROM lsh WHERE brand = ?", (brand,))
+                db.execute("DELETE FROM captions WHERE brand = ?", (brand,))
+            db.commit()
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Returns the process-wide index, or None when DEDUP_DISABLED=1.
+    """
+    global _default_index
+    if os.environ.get("DEDUP_DISABLED") == "1":
+        return None
+    with _default_lock:
+        if _default_index is None:
+            _default_index = DedupIndex()
+        return _default_index
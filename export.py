@@ -0,0 +1,249 @@
+"""
+Platform export presets for rendered posts.
+
+A preset picks the output size, how the render is fitted to it (letterbox,
+scale down or center crop), the resampling filter, the encoder and its settings, whether
+metadata is stripped and an optional upper bound on file size. export_all()
+turns one render into every requested preset in a single pass: each distinct
+size is resized once and shared by all presets that need it.
+"""
+import io
+
+from PIL import Image, ImageStat
+
+import telemetry
+
+RESAMPLE = {
+    "nearest": Image.NEAREST,
+    "bilinear": Image.BILINEAR,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS,
+}
+EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Lowest quality tried when squeezing a lossy export under max_bytes
+MIN_QUALITY = 40
+
+# size None keeps the render's own size. Platform sizes letterbox the 4:3
+# render with its own edge color: a crop would cut off overlay text.
+PRESETS = {
+    "png": {"size": None, "format": "PNG", "compress_level": 3},
+    "instagram_square": {"size": (1080, 1080), "fit": "pad", "pad_color": "edge", "resample": "bicubic",
+                         "format": "JPEG", "quality": 88, "max_bytes": 1_000_000},
+    "instagram_portrait": {"size": (1080, 1350), "fit": "pad", "pad_color": "edge", "resample": "bicubic",
+                           "format": "JPEG", "quality": 88, "max_bytes": 1_000_000},
+    "linkedin": {"size": (1200, 627), "fit": "pad", "pad_color": "edge", "resample": "bicubic",
+                 "format": "JPEG", "quality": 88, "max_bytes": 1_000_000},
+    "linkedin_png": {"size": (1200, 627), "fit": "pad", "pad_color": "edge", "resample": "bicubic",
+                     "format": "PNG", "compress_level": 6, "max_bytes": 2_000_000},
+    "web_webp": {"size": None, "format": "WEBP", "quality": 80, "method": 2},
+}
+
+# Small in-app preview; not offered as a download
+PREVIEW = {"name": "preview", "size": (640, 640), "fit": "contain", "resample": "bicubic",
+           "format": "JPEG", "quality": 80}
+
+# Presets offered for each target platform, most common first
+PLATFORM_PRESETS = {
+    "LinkedIn": ("linkedin",),
+    "Instagram": ("instagram_square", "instagram_portrait"),
+}
+
+
+def get_preset(preset):
+    """
+    Accepts a preset name or a preset dict and returns the dict. Preset
+    dicts passed to export_all also need a "name" to key the output by.
+    """
+    if isinstance(preset, dict):
+        return preset
+    try:
+        return PRESETS[preset]
+    except KeyError:
+        raise ValueError(f"Unknown export preset: {preset}") from None
+
+
+def file_name(stem, preset):
+    return f"{stem}.{EXTENSIONS[get_preset(preset)['format']]}"
+
+
+def mime_type(preset):
+    return MIME_TYPES[get_preset(preset)["format"]]
+
+
+def _cover_box(src_size, dst_size):
+    # Largest centered crop of src with the aspect ratio of dst
+    sw, sh = src_size
+    dw, dh = dst_size
+    if sw * dh > dw * sh:
+        cw = sh * dw / dh
+        return ((sw - cw) / 2, 0, (sw + cw) / 2, sh)
+    ch = sw * dh / dw
+    return (0, (sh - ch) / 2, sw, (sh + ch) / 2)
+
+
+def _edge_color(img):
+    # Mean color of the outermost pixels, so letterbox bars blend in
+    w, h = img.size
+    strips = [img.crop(box) for box in ((0, 0, w, 1), (0, h - 1, w, h), (0, 0, 1, h), (w - 1, 0, w, h))]
+    means = [ImageStat.Stat(strip).mean for strip in strips]
+    return tuple(round(sum(m[band] for m in means) / len(means)) for band in range(3))
+
+
+def resize(img, preset):
+    """
+    Fits img to the preset size. "cover" crops and scales in one resample;
+    "pad" scales to fit and letterboxes with the preset's pad color ("edge"
+    uses the mean color of the render's border); "contain" only scales down
+    to fit, keeping the aspect ratio.
+    """
+    preset = get_preset(preset)
+    size = preset.get("size")
+    if not size or tuple(size) == img.size:
+        return img
+    resample = RESAMPLE[preset.get("resample", "bicubic")]
+    if preset.get("fit", "cover") == "contain":
+        scale = min(size[0] / img.width, size[1] / img.height, 1.0)
+        if scale == 1.0:
+            return img
+        return img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), resample,
+                          reducing_gap=3.0)
+    if preset.get("fit", "cover") == "pad":
+        scale = min(size[0] / img.width, size[1] / img.height)
+        inner = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        pad_color = preset.get("pad_color", "black")
+        if pad_color == "edge":
+            pad_color = _edge_color(img)
+        canvas = Image.new("RGB", tuple(size), tuple(pad_color) if isinstance(pad_color, list) else pad_color)
+        canvas.paste(img.resize(inner, resample, reducing_gap=3.0),
+                     ((size[0] - inner[0]) // 2, (size[1] - inner[1]) // 2))
+        return canvas
+    return img.resize(tuple(size), resample, box=_cover_box(img.size, size), reducing_gap=3.0)
+
+
+def _save_kwargs(img, preset, quality=None):
+    fmt = preset["format"]
+    kwargs = {}
+    if fmt == "PNG":
+        kwargs["compress_level"] = preset.get("compress_level", 6)
+    elif fmt == "JPEG":
+        kwargs["quality"] = quality or preset.get("quality", 85)
+        kwargs["subsampling"] = preset.get("subsampling", "4:2:0")
+        kwargs["optimize"] = preset.get("optimize", True)
+        kwargs["progressive"] = preset.get("progressive", False)
+    elif fmt == "WEBP":
+        kwargs["quality"] = quality or preset.get("quality", 80)
+        kwargs["method"] = preset.get("method", 2)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not preset.get("strip_metadata", True):
+        for key in ("exif", "icc_profile"):
+            if img.info.get(key):
+                kwargs[key] = img.info[key]
+    return kwargs
+
+
+def _encode(img, preset, quality=None):
+    buf = io.BytesIO()
+    img.save(buf, format=preset["format"], **_save_kwargs(img, preset, quality))
+    return buf.getvalue()
+
+
+def encode(img, preset):
+    """
+    Encodes an already-resized image. When the result is over max_bytes,
+    lossy formats binary-search the highest quality that fits and PNG falls
+    back to a 256-color palette; if nothing fits, the smallest attempt is
+    returned.
+    """
+    preset = get_preset(preset)
+    with telemetry.span("export.encode", format=preset["format"]):
+        data = _encode(img, preset)
+        limit = preset.get("max_bytes")
+        if not limit or len(data) <= limit:
+            return data
+
+        if preset["format"] == "PNG":
+            smaller = min(data, _encode(img.quantize(256), preset), key=len)
+            if len(smaller) > limit:
+                telemetry.incr("export_over_limit", format=preset["format"])
+            return smaller
+
+        best = None
+        lo, hi = MIN_QUALITY, preset.get("quality", 85) - 1
+        while lo <= hi:
+            quality = (lo + hi) // 2
+            attempt = _encode(img, preset, quality)
+            if len(attempt) <= limit:
+                best = attempt
+                lo = quality + 1
+            else:
+                hi = quality - 1
+        if best is None:
+            best = _encode(img, preset, MIN_QUALITY)
+            telemetry.incr("export_over_limit", format=preset["format"])
+        return best
+
+
+def export_image(img, preset):
+    """
+    Resizes and encodes one render for a preset; returns the file bytes.
+    """
+    preset = get_preset(preset)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return encode(resize(img, preset), preset)
+
+
+def export_all(img, presets=None):
+    """
+    Exports one render to several presets (default: all of them) in a single
+    pass. Returns {preset name: bytes}.
+    """
+    presets = list(PRESETS) if presets is None else list(presets)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    resized = {}
+    out = {}
+    with telemetry.span("export.all", count=len(presets)):
+        for name in presets:
+            preset = get_preset(name)
+            if isinstance(name, dict):
+                if "name" not in preset:
+                    raise ValueError("Preset dicts passed to export_all need a \"name\"")
+                name = preset["name"]
+            pad_color = preset.get("pad_color")
+            key = (tuple(preset["size"]) if preset.get("size") else None, preset.get("fit", "cover"),
+                   preset.get("resample", "bicubic"), tuple(pad_color) if isinstance(pad_color, list) else pad_color)
+            if key not in resized:
+                with telemetry.span("export.resize"):
+                    resized[key] = resize(img, preset)
+            out[name] = encode(resized[key], preset)
+    return out
+
+
+def save_exports(img, stem, presets=None):
+    """
+    Writes every preset export of img next to `stem` (e.g. out/post_1 ->
+    out/post_1.linkedin.jpg) and returns {preset name: path}.
+    """
+    paths = {}
+    for name, data in export_all(img, presets).items():
+        path = file_name(f"{stem}.{name}", name)
+        with open(path, "wb") as f:
+            f.write(data)
+        paths[name] = path
+    return paths
+
+
+def platform_presets(platform):
+    return PLATFORM_PRESETS.get(platform, ("png",))
+
+
+def fanout_presets(platforms):
+    """
+    Every preset of several platforms, in order and without repeats, so one
+    export_all() pass covers them all.
+    """
+    return tuple(dict.fromkeys(name for platform in platforms for name in platform_presets(platform)))
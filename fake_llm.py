@@ -0,0 +1,169 @@
+"""
+Local fake LLM backend for tests and benchmarks.
+
+Plugs into llm_client.set_backend and answers the generator and critic
+prompts with deterministic, well-formed responses, while injecting
+configurable latency and errors. No network access is needed.
+"""
+import json
+import random
+import re
+import threading
+import time
+from llm_client import PrefixCache
+from prompts import estimate_tokens
+
+
+class FakeLLMError(Exception):
+    """
+    Error raised by the fake backend; .code mirrors an HTTP status.
+    """
+
+    def __init__(self, code, message="Injected fake LLM error"):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def parse_latency(spec):
+    """
+    Parses a latency distribution spec into (kind, params):
+        "0.05" or "const:0.05"     fixed seconds
+        "uniform:0.02,0.08"        uniform between two bounds
+        "normal:0.05,0.01"         mean, stddev (clipped at 0)
+        "lognormal:-3.0,0.5"       mu, sigma of the underlying normal
+    """
+    if isinstance(spec, (int, float)):
+        return "const", (float(spec),)
+    kind, _, args = spec.partition(":")
+    if not args:
+        return "const", (float(kind),)
+    return kind, tuple(float(a) for a in args.split(","))
+
+
+def sample_latency(dist, rng):
+    kind, params = dist
+    if kind == "const":
+        return params[0]
+    if kind == "uniform":
+        return rng.uniform(*params)
+    if kind == "normal":
+        return max(0.0, rng.gauss(*params))
+    if kind == "lognormal":
+        return rng.lognormvariate(*params)
+    raise ValueError(f"Unknown latency distribution: {kind}")
+
+
+class FakeLLMBackend:
+    """
+    latency is seconds per call, or a distribution spec understood by
+    parse_latency; error_rate is the probability a call fails with one of
+    error_codes. responder(model_name, prompt) -> str overrides the
+    built-in answers. The same seed gives the same latencies and errors.
+    prefill adds seconds per input token not served from the simulated
+    provider prefix cache, before the first output. Like GeminiBackend,
+    generate and stream fill an optional `usage` dict with the tokens read
+    from that cache.
+    """
+
+    def __init__(self, latency=0.05, error_rate=0.0, error_codes=(503,), responder=None, seed=0, prefill=0.0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.responder = responder or default_response
+        self.prefill = prefill
+        self.prefix_cache = PrefixCache()
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def available(self):
+        return True
+
+    def _roll(self):
+        """
+        Returns (latency, error code or None) for the next call.
+        """
+        with self._lock:
+            self.calls += 1
+            latency = sample_latency(self.latency, self._rng)
+            fail = self._rng.random() < self.error_rate
+            return latency, (self._rng.choice(self.error_codes) if fail else None)
+
+    def _prefill_seconds(self, model_name, prompt, usage):
+        cached = self.prefix_cache.touch(model_name, prompt)
+        if usage is not None:
+            usage["cached_tokens"] = cached
+        return (estimate_tokens(prompt) - cached) * self.prefill
+
+    def generate(self, model_name, prompt, api_key=None, usage=None):
+        latency, code = self._roll()
+        time.sleep(self._prefill_seconds(model_name, prompt, usage) + latency)
+        if code:
+            raise FakeLLMError(code)
+        return self.responder(model_name, prompt)
+
+    def stream(self, model_name, prompt, api_key=None, chunk_size=16, usage=None):
+        """
+        Streams the answer in chunk_size pieces spread evenly over latency.
+        """
+        latency, code = self._roll()
+        time.sleep(self._prefill_seconds(model_name, prompt, usage))
+        if code:
+            time.sleep(latency)
+            raise FakeLLMError(code)
+        text = self.responder(model_name, prompt)
+        pieces = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        for piece in pieces:
+            time.sleep(latency / len(pieces))
+            yield piece
+
+
+# Distinct caption shapes, so fake options are not near-duplicates of each other
+ANGLES = [
+    "{intent} is live on {platform}! Here is what changes for your team. #news",
+    "Three things to know about {intent}: faster setup, fewer steps, happier users.",
+    "We asked our community what they wanted next. The answer: {intent}. Try it today.",
+    "Behind the scenes of {intent}: months of work, one simple goal.",
+    "Quick poll: how will you use {intent}? Tell us in the comments below.",
+    "From first sketch to launch day, the story of {intent} and the people who built it.",
+]
+
+
+def default_response(model_name, prompt):
+    """
+    Builds a plausible answer for each prompt the app sends.
+    """
+    if "Review each of these" in prompt:
+        count = int(re.search(r"Review each of these (\d+) posts", prompt).group(1))
+        return json.dumps([{"id": i + 1, "score": 8, "feedback": "Add a clearer call to action."} for i in range(count)])
+    if "Score it 1-10" in prompt:
+        return json.dumps({"score": 8, "feedback": "Add a clearer call to action."})
+    if "for each of these platforms:" in prompt:
+        match = re.search(r'Create (\d+) distinct posts about "(.*)" for each of these platforms: (.*)', prompt)
+        n, intent, platforms = int(match.group(1)), match.group(2), match.group(3).strip().split(", ")
+        return "```json\n" + json.dumps([
+            {
+                "overlay": f"{intent[:24].upper()}",
+                "image_style": "gray",
+                "captions": {p: ANGLES[i % len(ANGLES)].format(intent=intent, platform=p) for p in platforms},
+            }
+            for i in range(n)
+        ]) + "\n```"
+    if "Create" in prompt and "distinct posts" in prompt:
+        match = re.search(r'Create (\d+) distinct posts about "(.*)" for (\w+)', prompt)
+        n, intent, platform = (int(match.group(1)), match.group(2), match.group(3)) if match else (3, "update", "LinkedIn")
+        # Start past the angles already used by posts the prompt says to avoid
+        offset = len(re.findall(r'^\s*- "', prompt, re.M))
+        return "```json\n" + json.dumps([
+            {
+                "caption": ANGLES[(offset + i) % len(ANGLES)].format(intent=intent, platform=platform),
+                "overlay": f"{intent[:24].upper()}",
+                "image_style": "gray",
+            }
+            for i in range(n)
+        ]) + "\n```"
+    if "Rewrite this social media post" in prompt:
+        match = re.search(r'Original: "(.*)"\s*\n\s*Feedback:', prompt, re.S)
+        original = match.group(1) if match else ""
+        return f"{original} Learn more today!"
+    return "OK"
@@ -1,24 +1,175 @@
 import random
-import time
+import asyncio
 import os
 import json
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+import sqlite3
+import time
+import llm_client
+import prompts
+import telemetry
+from llm_cache import get_cache
+from json_stream import JSONArrayStreamParser, salvage_json_objects
+
+# Simulated round-trip latency of the mock backend, in seconds.
+MOCK_LATENCY = 1.0
+
+# Default number of generation requests allowed in flight at once.
+DEFAULT_CONCURRENCY = 4
 
-def generate_captions(brand_profile, intent, template_name, platform="LinkedIn", n=3):
+GENERATION_MODEL = 'gemini-1.0-pro'
+
+# Extra LLM calls allowed per request to replace near-duplicate options.
+DEDUP_ROUNDS = 2
+
+def _dedup_index():
     """
-    Generates captions using OpenAI if key is present, else uses Mock.
+    Returns (index, brand_key), or (None, None) when deduplication is off
+    (DEDUP_DISABLED=1) or numpy is not installed.
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if api_key and genai:
-        return generate_captions_with_llm(api_key, brand_profile, intent, template_name, platform, n)
-    
-    # Mock LLM generation. 
+    if os.environ.get("DEDUP_DISABLED") == "1":
+        return None, None
+    try:
+        # Imported on first use: dedup_index loads numpy
+        from dedup_index import get_index, brand_key
+    except ImportError:
+        return None, None
+    return get_index(), brand_key
+
+def _record(index, brand, captions):
+    # The options are already generated; a busy index must not lose them
+    try:
+        index.add_many(brand, captions)
+    except sqlite3.Error as e:
+        print(f"Dedup index error, options not recorded: {e}")
+
+def _run(coro, async_name):
+    """
+    Runs coro to completion for a sync wrapper. asyncio.run cannot be used
+    inside a running event loop, so callers there must await the async API.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError(f"Called from a running event loop; use 'await generator.{async_name}(...)' instead")
+
+def generate_captions(brand_profile, intent, template_name, platform="LinkedIn", n=3, bypass_cache=False):
+    """
+    Generates captions using Gemini if key is present, else uses Mock.
+    Synchronous wrapper around agenerate_captions.
+    Set bypass_cache=True to skip the response cache and get fresh output.
+    Raises RuntimeError inside a running event loop; await agenerate_captions there.
+    """
+    return _run(agenerate_captions(brand_profile, intent, template_name, platform, n, bypass_cache), "agenerate_captions")
+
+async def agenerate_captions(brand_profile, intent, template_name, platform="LinkedIn", n=3, bypass_cache=False):
+    """
+    Async version of generate_captions. Waiting on the backend does not
+    block the event loop, so many calls can run side by side.
+    """
+    with telemetry.span("generator.generate", platform=platform, n=n):
+        return await _agenerate_captions(brand_profile, intent, template_name, platform, n, bypass_cache)
+
+async def _agenerate_captions(brand_profile, intent, template_name, platform, n, bypass_cache):
+    posts, fresh = await _agenerate_options(brand_profile, intent, template_name, platform, n, bypass_cache)
+    if not fresh:
+        # A cached answer was filtered and recorded when it was first generated
+        return posts
+
+    async def replace(missing, avoid):
+        posts, _ = await _agenerate_options(brand_profile, intent, template_name, platform, missing, bypass_cache, avoid)
+        return posts
+
+    return await _adedupe(brand_profile, posts, n, replace, lambda p: p.get("caption", ""))
+
+async def _agenerate_options(brand_profile, intent, template_name, platform, n, bypass_cache, avoid=None):
+    """
+    Returns (posts, fresh); fresh is False when the answer came from the
+    response cache.
+    """
+    if llm_client.is_enabled():
+        try:
+            return await _acaptions_with_llm(
+                os.environ.get("GEMINI_API_KEY"), brand_profile, intent, template_name, platform, n, bypass_cache, avoid
+            )
+        except llm_client.LLMUnavailable as e:
+            # API unhealthy: serve the mock instead of failing
+            print(f"Gemini unavailable, using mock: {e}")
+            telemetry.incr("llm_fallbacks", stage="generate")
+            return mock_captions(brand_profile, intent, platform, n), True
+
+    # Mock LLM generation.
     # Simulate API latency
-    time.sleep(1.0)
-    
+    await asyncio.sleep(MOCK_LATENCY)
+    return mock_captions(brand_profile, intent, platform, n), True
+
+async def _adedupe(brand_profile, options, n, replace, caption):
+    """
+    Drops options whose caption(option) is a near-duplicate of another
+    option or of captions already generated for the brand, then awaits
+    replace(missing, avoid) for just the missing number of replacements (up
+    to DEDUP_ROUNDS times). Returns the new options and records them in the
+    index. If replacements run out, rejected options are used to still
+    return n in total.
+    """
+    index, brand_key = _dedup_index()
+    if index is None:
+        return options
+    brand = brand_key(brand_profile)
+    kept, rejected = [], []
+    for attempt in range(DEDUP_ROUNDS + 1):
+        unique, duplicate = index.split(brand, [caption(o) for o in options], [caption(o) for o in kept])
+        kept += [options[i] for i in unique]
+        rejected += [options[i] for i in duplicate]
+        missing = n - len(kept)
+        # The mock backend would only repeat itself
+        if missing <= 0 or attempt == DEDUP_ROUNDS or not llm_client.is_enabled():
+            break
+        options = await replace(missing, [caption(o) for o in kept + rejected])
+
+    if rejected:
+        telemetry.incr("dedup_rejected", len(rejected))
+    _record(index, brand, [caption(o) for o in kept])
+    return kept + rejected[:max(n - len(kept), 0)]
+
+async def agenerate_batch(requests, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Runs many generation requests concurrently, at most `concurrency` at a time.
+    Each request is a dict with brand_profile, intent, template_name and
+    optionally platform and n. Results are returned in request order; a
+    failed request yields an empty list, like the LLM path does.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(req):
+        async with semaphore:
+            try:
+                return await agenerate_captions(
+                    req["brand_profile"],
+                    req["intent"],
+                    req.get("template_name"),
+                    req.get("platform", "LinkedIn"),
+                    req.get("n", 3),
+                    req.get("bypass_cache", False),
+                )
+            except Exception as e:
+                print(f"Generation Error: {e}")
+                return []
+
+    return await asyncio.gather(*(run_one(req) for req in requests))
+
+def generate_batch(requests, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Synchronous wrapper around agenerate_batch; not usable inside a running
+    event loop.
+    """
+    return _run(agenerate_batch(requests, concurrency), "agenerate_batch")
+
+def mock_captions(brand_profile, intent, platform="LinkedIn", n=3):
+    """
+    Builds captions from the mock pattern tables, without any latency.
+    """
     tone = brand_profile.get('tone', 'Neutral')
     keywords = brand_profile.get('keywords', [])
     keywords_str = ", ".join(keywords[:2])
@@ -102,59 +253,366 @@ def generate_captions(brand_profile, intent, template_name, platform="LinkedIn",
             
     return captions
 
-def generate_captions_with_llm(api_key, brand_profile, intent, template_name, platform, n=3):
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.0-pro')
-    
-    tone = brand_profile.get('tone', 'Neutral')
-    # Handle list or string for keywords safely
-    k_list = brand_profile.get('keywords', [])
-    if isinstance(k_list, list):
-        keywords = ", ".join(k_list)
-    else:
-        keywords = str(k_list)
-        
-    visual_style = brand_profile.get('visual_style', {}).get('color', 'gray')
-
-    prompt = f"""
-    You are a social media manager.
-    Brand Tone: {tone}
-    Keywords: {keywords}
-    
-    Task: Create {n} distinct posts about "{intent}" for {platform}.
-    Template: {template_name}
-    
-    Constraints:
-    - LinkedIn: Professional, 1-3 hashtags.
-    - Instagram: Visual, 5-10 hashtags, "Link in bio".
-    
-    Output strictly valid JSON array like this:
-    [
-      {{
-        "caption": "Post text...",
-        "overlay": "Image text (max 5 words)",
-        "image_style": "{visual_style}"
-      }}
-    ]
+def generate_captions_with_llm(api_key, brand_profile, intent, template_name, platform, n=3, bypass_cache=False, avoid=None):
+    return _run(agenerate_captions_with_llm(api_key, brand_profile, intent, template_name, platform, n, bypass_cache, avoid),
+                "agenerate_captions_with_llm")
+
+def parse_captions(text):
+    """
+    Parses the model's JSON answer into a list of caption dicts.
+    Raises ValueError if the text is not a usable answer.
     """
+    # Clean markdown if present
+    text = text.replace("```json", "").replace("```", "").strip()
+    data = json.loads(text)
 
+    # Handle if wrapped in dict or list
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and "posts" in data:
+        return data["posts"]
+    raise ValueError("Expected a JSON array of posts")
+
+def _is_valid_captions(text):
     try:
-        response = model.generate_content(prompt)
-        text = response.text
-        # Clean markdown if present
-        text = text.replace("```json", "").replace("```", "").strip()
-        
-        data = json.loads(text)
-        
-        # Handle if wrapped in dict or list
-        if isinstance(data, list):
-            return data
-        if isinstance(data, dict) and "posts" in data:
-            return data["posts"]
-            
-        return []
-    except Exception as e:
+        return bool(parse_captions(text))
+    except ValueError:
+        return False
+
+def build_caption_prompt(brand_profile, intent, template_name, platform, n=3, avoid=None):
+    """
+    Brand-stable prefix plus the request; see prompts.caption_prompt.
+    """
+    return prompts.caption_prompt(brand_profile, intent, template_name, platform, n, avoid)
+
+async def agenerate_captions_with_llm(api_key, brand_profile, intent, template_name, platform, n=3, bypass_cache=False, avoid=None):
+    """
+    Raises llm_client.LLMUnavailable if Gemini cannot be reached.
+    """
+    posts, _ = await _acaptions_with_llm(api_key, brand_profile, intent, template_name, platform, n, bypass_cache, avoid)
+    return posts
+
+async def _acaptions_with_llm(api_key, brand_profile, intent, template_name, platform, n, bypass_cache, avoid):
+    prompt = build_caption_prompt(brand_profile, intent, template_name, platform, n, avoid)
+    fresh = False
+
+    async def call():
+        nonlocal fresh
+        fresh = True
+        return await llm_client.get_client().agenerate(prompt, GENERATION_MODEL, api_key=api_key)
+
+    text = await get_cache().aget_or_call(
+        GENERATION_MODEL, prompt, call, bypass=bypass_cache, validate=_is_valid_captions
+    )
+    try:
+        return parse_captions(text), fresh
+    except ValueError as e:
+        # Keep whatever complete options made it before the damage
+        salvaged = salvage_json_objects(text)
+        if salvaged:
+            return salvaged, fresh
         print(f"Gemini Error: {e}")
-        import streamlit as st
-        st.error(f"Gemini Error: {e}")
-        return []
+        telemetry.incr("llm_parse_errors", stage="generate")
+        return [], fresh
+
+def stream_captions(brand_profile, intent, template_name, platform="LinkedIn", n=3, bypass_cache=False):
+    """
+    Yields caption dicts one by one as soon as each is ready, so the first
+    option can be shown while the rest are still being generated.
+    """
+    start = time.perf_counter()
+    count = 0
+    for post in _stream_unique(brand_profile, intent, template_name, platform, n, bypass_cache):
+        if not count:
+            telemetry.record_span("generator.first_option", time.perf_counter() - start, platform=platform)
+        count += 1
+        yield post
+    telemetry.record_span("generator.stream", time.perf_counter() - start, platform=platform, n=count)
+
+def _stream_unique(brand_profile, intent, template_name, platform, n, bypass_cache):
+    """
+    Streamed options without near-duplicates; see _unique_stream. A cached
+    answer is passed through as is.
+    """
+    prompt = build_caption_prompt(brand_profile, intent, template_name, platform, n)
+    if llm_client.is_enabled():
+        cached = get_cache().lookup(GENERATION_MODEL, prompt, bypass=bypass_cache)
+        if cached is not None:
+            # Filtered and recorded when it was first generated
+            yield from salvage_json_objects(cached)
+            return
+
+    def replace(missing, avoid):
+        return stream_captions_with_llm(os.environ.get("GEMINI_API_KEY"), brand_profile, intent, template_name,
+                                        platform, missing, bypass_cache, avoid)
+
+    posts = _stream_captions(prompt, brand_profile, intent, platform, n, bypass_cache)
+    yield from _unique_stream(brand_profile, posts, n, replace, lambda p: p.get("caption", ""))
+
+def _stream_captions(prompt, brand_profile, intent, platform, n, bypass_cache):
+    if llm_client.is_enabled():
+        yielded = 0
+        try:
+            for post in _stream_answer(os.environ.get("GEMINI_API_KEY"), prompt, bypass_cache, _is_valid_captions):
+                yielded += 1
+                yield post
+            return
+        except llm_client.LLMUnavailable as e:
+            print(f"Gemini unavailable, using mock: {e}")
+            telemetry.incr("llm_fallbacks", stage="generate")
+            # Top up with mock options only for what the stream did not deliver
+            for post in mock_captions(brand_profile, intent, platform, n)[yielded:]:
+                yield post
+            return
+
+    # Mock LLM generation, spreading the simulated latency over the options.
+    for post in mock_captions(brand_profile, intent, platform, n):
+        time.sleep(MOCK_LATENCY / max(n, 1))
+        yield post
+
+def stream_captions_with_llm(api_key, brand_profile, intent, template_name, platform, n=3, bypass_cache=False,
+                             avoid=None):
+    """
+    Streams the model's answer and yields each caption object as soon as
+    its closing brace arrives. Raises llm_client.LLMUnavailable if Gemini
+    cannot be reached.
+    """
+    prompt = build_caption_prompt(brand_profile, intent, template_name, platform, n, avoid)
+
+    cached = get_cache().lookup(GENERATION_MODEL, prompt, bypass=bypass_cache)
+    if cached is not None:
+        for post in salvage_json_objects(cached):
+            yield post
+        return
+    yield from _stream_answer(api_key, prompt, bypass_cache, _is_valid_captions)
+
+def _stream_answer(api_key, prompt, bypass_cache, validate):
+    """
+    Streams a fresh answer to prompt, yields each JSON object as soon as it
+    is complete and caches the whole answer if validate(answer) passes.
+    """
+    chunks = []
+    parser = JSONArrayStreamParser()
+    for chunk in llm_client.get_client().generate_stream(prompt, GENERATION_MODEL, api_key=api_key):
+        chunks.append(chunk)
+        for item in parser.feed(chunk):
+            yield item
+    get_cache().store(GENERATION_MODEL, prompt, "".join(chunks), bypass=bypass_cache, validate=validate)
+
+def stream_fanout(brand_profile, intent, template_name, platforms=("LinkedIn", "Instagram"), n=3, bypass_cache=False):
+    """
+    Yields n options for several platforms from a single generation pass.
+    Each option is one image captioned for every platform:
+    {"overlay", "image_style", "captions": {platform: caption}}.
+    """
+    platforms = list(platforms)
+    if not platforms:
+        raise ValueError("platforms must not be empty")
+    start = time.perf_counter()
+    count = 0
+    for option in _fanout_unique(brand_profile, intent, template_name, platforms, n, bypass_cache):
+        count += 1
+        yield option
+    telemetry.record_span("generator.fanout", time.perf_counter() - start, platforms=len(platforms), n=count)
+
+def generate_fanout(brand_profile, intent, template_name, platforms=("LinkedIn", "Instagram"), n=3, bypass_cache=False):
+    """
+    Returns {platform: captions} for every platform, at the cost of one
+    generate_captions call. Option i has the same overlay on every platform.
+    """
+    platforms = list(platforms)
+    return fanout_posts(list(stream_fanout(brand_profile, intent, template_name, platforms, n, bypass_cache)), platforms)
+
+async def agenerate_fanout(brand_profile, intent, template_name, platforms=("LinkedIn", "Instagram"), n=3,
+                           bypass_cache=False):
+    """
+    Async version of generate_fanout: one non-streamed call for every
+    platform, without blocking the event loop.
+    """
+    platforms = list(platforms)
+    if not platforms:
+        raise ValueError("platforms must not be empty")
+    with telemetry.span("generator.fanout", platforms=len(platforms), n=n):
+        options, fresh = await _afanout_options(brand_profile, intent, template_name, platforms, n, bypass_cache)
+        if fresh:
+            async def replace(missing, avoid):
+                options, _ = await _afanout_options(brand_profile, intent, template_name, platforms, missing,
+                                                    bypass_cache, avoid)
+                return options
+
+            options = await _adedupe(brand_profile, options, n, replace, lambda o: o["captions"][platforms[0]])
+        return fanout_posts(options, platforms)
+
+async def _afanout_options(brand_profile, intent, template_name, platforms, n, bypass_cache, avoid=None):
+    """
+    Returns (options, fresh); fresh is False when the answer came from the
+    response cache.
+    """
+    if llm_client.is_enabled():
+        prompt = prompts.fanout_prompt(brand_profile, intent, template_name, platforms, n, avoid)
+        fresh = False
+
+        async def call():
+            nonlocal fresh
+            fresh = True
+            return await llm_client.get_client().agenerate(prompt, GENERATION_MODEL,
+                                                           api_key=os.environ.get("GEMINI_API_KEY"))
+
+        try:
+            text = await get_cache().aget_or_call(
+                GENERATION_MODEL, prompt, call, bypass=bypass_cache, validate=lambda t: bool(parse_fanout(t, platforms))
+            )
+            return parse_fanout(text, platforms), fresh
+        except llm_client.LLMUnavailable as e:
+            print(f"Gemini unavailable, using mock: {e}")
+            telemetry.incr("llm_fallbacks", stage="fanout")
+            return mock_fanout(brand_profile, intent, platforms, n), True
+
+    # One simulated round trip for all platforms
+    await asyncio.sleep(MOCK_LATENCY)
+    return mock_fanout(brand_profile, intent, platforms, n), True
+
+def fanout_posts(options, platforms):
+    """
+    Splits fan-out options into {platform: [caption dict]}, in the shape
+    generate_captions returns.
+    """
+    return {
+        p: [{"caption": o["captions"][p], "overlay": o["overlay"], "image_style": o["image_style"]} for o in options]
+        for p in platforms
+    }
+
+def _fanout_unique(brand_profile, intent, template_name, platforms, n, bypass_cache):
+    """
+    Fan-out options without near-duplicates, compared on the first
+    platform's caption; see _unique_stream. A cached answer is passed
+    through as is.
+    """
+    prompt = prompts.fanout_prompt(brand_profile, intent, template_name, platforms, n)
+    if llm_client.is_enabled():
+        cached = get_cache().lookup(GENERATION_MODEL, prompt, bypass=bypass_cache)
+        if cached is not None:
+            # Filtered and recorded when it was first generated
+            yield from parse_fanout(cached, platforms)
+            return
+
+    def replace(missing, avoid):
+        return stream_fanout_with_llm(os.environ.get("GEMINI_API_KEY"), brand_profile, intent, template_name,
+                                      platforms, missing, bypass_cache, avoid)
+
+    options = _stream_fanout(prompt, brand_profile, intent, platforms, n, bypass_cache)
+    yield from _unique_stream(brand_profile, options, n, replace, lambda o: o["captions"][platforms[0]])
+
+def _unique_stream(brand_profile, options, n, replace, caption):
+    """
+    Passes streamed options through as long as caption(option) is not a
+    near-duplicate of an earlier option or of the brand's stored captions.
+    Once the stream ends, replace(missing, avoid) streams replacements for
+    the rejected ones (up to DEDUP_ROUNDS times); rejected options fill any
+    gap left after that. Kept captions are recorded in the index.
+    """
+    index, brand_key = _dedup_index()
+    if index is None:
+        yield from options
+        return
+    brand = brand_key(brand_profile)
+    kept, rejected = [], []
+    try:
+        for attempt in range(DEDUP_ROUNDS + 1):
+            try:
+                for option in options:
+                    if len(kept) >= n:
+                        # More than asked for; keep reading so the answer is still cached
+                        continue
+                    unique, _ = index.split(brand, [caption(option)], [caption(o) for o in kept])
+                    if unique:
+                        kept.append(option)
+                        yield option
+                    else:
+                        rejected.append(option)
+            except llm_client.LLMUnavailable as e:
+                # Only replacement rounds get here; the first stream falls back to the mock
+                print(f"Gemini unavailable, keeping duplicates: {e}")
+                break
+            missing = n - len(kept)
+            # The mock backend would only repeat itself
+            if missing <= 0 or attempt == DEDUP_ROUNDS or not llm_client.is_enabled():
+                break
+            options = replace(missing, [caption(o) for o in kept + rejected])
+    finally:
+        if rejected:
+            telemetry.incr("dedup_rejected", len(rejected))
+        _record(index, brand, [caption(o) for o in kept])
+    yield from rejected[:max(n - len(kept), 0)]
+
+def _stream_fanout(prompt, brand_profile, intent, platforms, n, bypass_cache):
+    if llm_client.is_enabled():
+        yielded = 0
+        try:
+            for option in _stream_fanout_answer(os.environ.get("GEMINI_API_KEY"), prompt, platforms, bypass_cache):
+                yielded += 1
+                yield option
+            return
+        except llm_client.LLMUnavailable as e:
+            print(f"Gemini unavailable, using mock: {e}")
+            telemetry.incr("llm_fallbacks", stage="fanout")
+            for option in mock_fanout(brand_profile, intent, platforms, n)[yielded:]:
+                yield option
+            return
+
+    # One simulated round trip for all platforms
+    for option in mock_fanout(brand_profile, intent, platforms, n):
+        time.sleep(MOCK_LATENCY / max(n, 1))
+        yield option
+
+def mock_fanout(brand_profile, intent, platforms, n=3):
+    """
+    Builds fan-out options from the mock pattern tables, without any
+    latency. Mock overlays do not depend on the platform.
+    """
+    captions = {p: mock_captions(brand_profile, intent, p, n) for p in platforms}
+    return [
+        {"overlay": post["overlay"], "image_style": post["image_style"],
+         "captions": {p: captions[p][i]["caption"] for p in platforms}}
+        for i, post in enumerate(captions[platforms[0]])
+    ]
+
+def fanout_option(item, platforms):
+    """
+    Normalizes one object of the model's fan-out answer. Returns None
+    unless it has a caption for every platform.
+    """
+    if not isinstance(item, dict) or not isinstance(item.get("captions"), dict):
+        return None
+    captions = {p: item["captions"].get(p) for p in platforms}
+    if not all(isinstance(c, str) and c.strip() for c in captions.values()):
+        return None
+    return {"overlay": str(item.get("overlay", "")), "image_style": item.get("image_style", "gray"), "captions": captions}
+
+def parse_fanout(text, platforms):
+    """
+    Returns the usable options in a (possibly truncated) fan-out answer.
+    """
+    return [o for o in (fanout_option(item, platforms) for item in salvage_json_objects(text)) if o]
+
+def stream_fanout_with_llm(api_key, brand_profile, intent, template_name, platforms, n=3, bypass_cache=False,
+                           avoid=None):
+    """
+    Streams one answer holding every platform's captions and yields each
+    option as soon as it is complete. Options missing a platform are
+    dropped. Raises llm_client.LLMUnavailable if Gemini cannot be reached.
+    """
+    prompt = prompts.fanout_prompt(brand_profile, intent, template_name, platforms, n, avoid)
+
+    cached = get_cache().lookup(GENERATION_MODEL, prompt, bypass=bypass_cache)
+    if cached is not None:
+        for option in parse_fanout(cached, platforms):
+            yield option
+        return
+    yield from _stream_fanout_answer(api_key, prompt, platforms, bypass_cache)
+
+def _stream_fanout_answer(api_key, prompt, platforms, bypass_cache):
+    items = _stream_answer(api_key, prompt, bypass_cache, lambda text: bool(parse_fanout(text, platforms)))
+    for option in (fanout_option(item, platforms) for item in items):
+        if option:
+            yield option
@@ -0,0 +1,503 @@
+"""
+Local background job queue for generation, rendering, critique and rewrites.
+
+Jobs are rows in a SQLite file, so every Streamlit session (and any other
+process pointed at the same file) shares one queue and one worker pool. The
+UI submits a job, keeps only its id, and polls status(); the script thread is
+never blocked on an LLM call. Handlers report progress (and partial results,
+e.g. options streamed so far) and check for cancellation between steps.
+Interactive jobs are claimed ahead of batch jobs.
+
+The first get_queue() call in a process starts its worker pool, unless a
+pool in another process sharing the file already serves it (for example a
+second Streamlit process); it takes over if that process goes away. Every
+pool periodically fails jobs orphaned by a dead worker and purges old ones.
+Tune with JOB_WORKERS (0 runs no workers in this process) and
+JOB_QUEUE_PATH, or run a standalone worker pool:
+    python job_queue.py --workers 8
+Jobs that need Gemini fail if the worker running them has no
+GEMINI_API_KEY, instead of quietly using the mock backend.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import llm_client
+import telemetry
+from agent_loop import polish_posts
+from critic import critique_posts, improve_post
+from generator import stream_captions, stream_fanout, fanout_posts
+
+DEFAULT_PATH = os.environ.get("JOB_QUEUE_PATH", os.path.join(".cache", "jobs.sqlite3"))
+DEFAULT_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+RENDER_DIR = os.path.join(".cache", "renders")
+# How often idle workers look for jobs submitted by other processes
+POLL_SECONDS = 0.5
+# Running jobs with no heartbeat for this long belonged to a dead worker
+STALE_SECONDS = 600
+# How often a pool recovers stale jobs, purges old ones and renews its lease
+MAINTENANCE_SECONDS = 30
+# A shared pool whose lease is not renewed for this long is taken over
+LEASE_SECONDS = 90
+# Finished jobs are kept this long
+KEEP_SECONDS = 24 * 3600
+
+INTERACTIVE = 0
+BATCH = 1
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a handler by Job.check() once the job is cancelled.
+    """
+
+
+def handler(kind):
+    """
+    Registers fn(job, **payload) as the handler for jobs of this kind.
+    """
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+class Job:
+    """
+    Handle passed to a running handler.
+    """
+
+    def __init__(self, queue, job_id, kind):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+
+    def progress(self, done, total, partial=None):
+        """
+        Records done/total progress and, optionally, a JSON-serializable
+        partial result the UI can show before the job finishes.
+        """
+        self.queue._progress(self.id, done / total if total else 0.0, partial)
+
+    def cancelled(self):
+        return self.queue._cancel_requested(self.id)
+
+    def check(self):
+        if self.cancelled():
+            raise JobCancelled(self.id)
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue with an in-process worker pool. Thread-safe.
+    With shared=True the pool only runs while no other process's shared
+    pool serves the same file; standalone pools always run.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, workers=DEFAULT_WORKERS, shared=False):
+        self.path = path
+        self.workers = workers
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._db = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._maintainer = None
+        self._owner = uuid.uuid4().hex
+        # Ids of the jobs this process's workers are running
+        self._active = set()
+
+    def _conn(self):
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Autocommit mode, so claiming a job can take the write lock up front
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "priority INTEGER NOT NULL, status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, "
+                "partial TEXT, result TEXT, error TEXT, cancel INTEGER NOT NULL DEFAULT 0, "
+                "created REAL NOT NULL, started REAL, finished REAL, heartbeat REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority, id)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+        return self._db
+
+    # --- Client side ---
+
+    def submit(self, kind, payload, priority=INTERACTIVE, run_id=None):
+        """
+        Queues a job and returns its id. payload must be JSON-serializable.
+        The job's spans are tagged with run_id (by default the caller's
+        telemetry run), since worker threads do not share its context.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"unknown job kind {kind!r}")
+        # _llm records that the submitter would have called Gemini, so a
+        # worker without a key fails the job instead of using the mock
+        payload = dict(payload, _run_id=run_id or telemetry.current_run(), _llm=llm_client.is_enabled())
+        with self._lock:
+            cur = self._conn().execute(
+                "INSERT INTO jobs (kind, payload, priority, status, created) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), priority, QUEUED, time.time()),
+            )
+        self._wake.set()
+        return cur.lastrowid
+
+    def status(self, job_id):
+        """
+        Returns {"id", "kind", "status", "progress", "partial", "result",
+        "error", "created", "started", "finished"}, or None for unknown ids.
+        """
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT id, kind, status, progress, partial, result, error, created, started, finished "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("id", "kind", "status", "progress", "partial", "result", "error",
+                        "created", "started", "finished"), row))
+        for key in ("partial", "result"):
+            job[key] = json.loads(job[key]) if job[key] is not None else None
+        return job
+
+    def result(self, job_id):
+        """
+        Returns the result of a finished job; raises RuntimeError if it
+        failed or was cancelled and None while it is still pending.
+        """
+        job = self.status(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job["status"] == DONE:
+            return job["result"]
+        if job["status"] in FINISHED:
+            raise RuntimeError(f"job {job_id} {job['status']}: {job['error']}")
+        return None
+
+    def wait(self, job_id, timeout=None):
+        """
+        Blocks until the job finishes (for scripts, not the UI) and returns
+        its status.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.status(job_id)
+            if job is None or job["status"] in FINISHED:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(0.05)
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job at once; a running job stops at its next
+        check(). Returns False if the job had already finished.
+        """
+        with self._lock:
+            db = self._conn()
+            cur = db.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+                             (CANCELLED, time.time(), job_id, QUEUED))
+            if cur.rowcount:
+                return True
+            cur = db.execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+            return bool(cur.rowcount)
+
+    def counts(self):
+        """
+        Returns {status: number of jobs}.
+        """
+        with self._lock:
+            return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def purge(self, older_than=KEEP_SECONDS):
+        """
+        Deletes finished jobs older than `older_than` seconds.
+        """
+        with self._lock:
+            self._conn().execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND finished < ?",
+                (*FINISHED, time.time() - older_than),
+            )
+
+    def recover(self):
+        """
+        Fails running jobs whose worker stopped beating (it died).
+        """
+        with self._lock:
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE status = ? AND heartbeat < ?",
+                (FAILED, "worker lost", time.time(), RUNNING, time.time() - STALE_SECONDS),
+            )
+
+    # --- Worker side ---
+
+    def start(self):
+        """
+        Starts the pool (once): the maintenance thread, and the worker
+        threads as soon as this process may run them.
+        """
+        with self._lock:
+            if self._maintainer or self.workers <= 0:
+                return
+            self._maintainer = threading.Thread(target=self._maintain, name="job-maintenance", daemon=True)
+        self._maintenance()
+        self._maintainer.start()
+
+    def running(self):
+        """
+        True when this process's worker threads are serving the queue.
+        """
+        return bool(self._threads)
+
+    def stop(self, timeout=None):
+        """
+        Stops the workers after their current jobs.
+        """
+        self._stop.set()
+        self._wake.set()
+        threads = self._threads + ([self._maintainer] if self._maintainer else [])
+        for thread in threads:
+            if thread.is_alive():
+                thread.join(timeout)
+        with self._lock:
+            self._threads = []
+            self._maintainer = None
+            self._conn().execute("DELETE FROM leases WHERE name = 'workers' AND owner = ?", (self._owner,))
+        self._stop.clear()
+
+    def _take_lease(self):
+        # Held by whoever renewed it last, until it goes LEASE_SECONDS without renewal
+        now = time.time()
+        with self._lock:
+            cur = self._conn().execute(
+                "INSERT INTO leases (name, owner, expires) VALUES ('workers', ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+                (self._owner, now + LEASE_SECONDS, now),
+            )
+            return cur.rowcount > 0
+
+    def _maintenance(self):
+        if not self._take_lease() and self.shared:
+            # Another process's pool serves the queue and looks after it
+            return
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            # Jobs between progress reports are still alive
+            self._conn().executemany("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = ?",
+                                     [(time.time(), job_id, RUNNING) for job_id in self._active])
+        self.recover()
+        self.purge()
+
+    def _maintain(self):
+        while not self._stop.wait(MAINTENANCE_SECONDS):
+            try:
+                self._maintenance()
+            except sqlite3.Error as e:
+                print(f"Job queue maintenance failed: {e}")
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, kind, payload, priority FROM jobs WHERE status = ? ORDER BY priority, id LIMIT 1",
+                    (QUEUED,),
+                ).fetchone()
+                if row is not None:
+                    db.execute("UPDATE jobs SET status = ?, started = ?, heartbeat = ? WHERE id = ?",
+                               (RUNNING, now, now, row[0]))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _work(self):
+        while not self._stop.is_set():
+            row = self._claim()
+            if row is None:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(*row)
+
+    def _run(self, job_id, kind, payload, priority):
+        with self._lock:
+            self._active.add(job_id)
+        try:
+            self._execute(job_id, kind, payload, priority)
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _execute(self, job_id, kind, payload, priority):
+        job = Job(self, job_id, kind)
+        payload = json.loads(payload)
+        telemetry.set_run(payload.pop("_run_id", None))
+        needs_llm = payload.pop("_llm", False)
+        try:
+            if needs_llm and not llm_client.is_enabled():
+                raise RuntimeError("submitted for Gemini, but this worker has no GEMINI_API_KEY")
+            job.check()
+            if priority == BATCH:
+                with llm_client.batch_priority():
+                    result = HANDLERS[kind](job, **payload)
+            else:
+                result = HANDLERS[kind](job, **payload)
+            if job.cancelled():
+                raise JobCancelled(job_id)
+            self._finish(job_id, DONE, result=json.dumps(result))
+        except JobCancelled:
+            self._finish(job_id, CANCELLED)
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e}")
+            self._finish(job_id, FAILED, error=f"{type(e).__name__}: {e}")
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, "
+                "progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END WHERE id = ?",
+                (status, result, error, time.time(), status, job_id),
+            )
+
+    def _progress(self, job_id, fraction, partial):
+        with self._lock:
+            self._conn().execute(
+                "UPDATE jobs SET progress = ?, partial = COALESCE(?, partial), heartbeat = ? WHERE id = ?",
+                (fraction, None if partial is None else json.dumps(partial), time.time(), job_id),
+            )
+
+    def _cancel_requested(self, job_id):
+        with self._lock:
+            row = self._conn().execute("SELECT cancel, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row[0]) or row[1] == CANCELLED
+
+
+# --- Handlers ---
+
+@handler("generate")
+def run_generate(job, brand_profile, intent, template_name, platform="LinkedIn", n=3, bypass_cache=False):
+    posts = []
+    for post in stream_captions(brand_profile, intent, template_name, platform, n, bypass_cache):
+        posts.append(post)
+        job.progress(len(posts), n, partial=posts)
+        job.check()
+    return posts
+
+
+@handler("fanout")
+def run_fanout(job, brand_profile, intent, template_name, platforms, n=3, bypass_cache=False):
+    options = []
+    for option in stream_fanout(brand_profile, intent, template_name, platforms, n, bypass_cache):
+        options.append(option)
+        job.progress(len(options), n, partial=options)
+        job.check()
+    return fanout_posts(options, platforms)
+
+
+@handler("render")
+def run_render(job, base_image, overlay, visual_style, presets, layout=None):
+    # Imported here: rendering needs Pillow, the other jobs do not
+    import export
+    from visual_engine import create_social_post
+
+    img = create_social_post(base_image, overlay, visual_style, layout)
+    os.makedirs(RENDER_DIR, exist_ok=True)
+    return export.save_exports(img, os.path.join(RENDER_DIR, f"job_{job.id}"), presets)
+
+
+def _reporter(job):
+    """
+    Progress callback for core functions: records progress (which also
+    beats the heartbeat) and raises JobCancelled once the job is cancelled.
+    """
+    def report(done, total):
+        job.progress(done, total)
+        job.check()
+    return report
+
+
+@handler("critique")
+def run_critique(job, posts, brand_profile, bypass_cache=False):
+    return critique_posts(posts, brand_profile, bypass_cache, progress=_reporter(job))
+
+
+@handler("improve")
+def run_improve(job, captions, feedback, bypass_cache=False):
+    improved = []
+    for caption, note in zip(captions, feedback):
+        job.check()
+        improved.append(improve_post(caption, note, bypass_cache))
+        job.progress(len(improved), len(captions), partial=improved)
+    return improved
+
+
+@handler("polish")
+def run_polish(job, posts, brand_profile, target_score, max_seconds=None):
+    return polish_posts(posts, brand_profile, target_score=target_score, max_seconds=max_seconds,
+                        progress=_reporter(job))
+
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+
+def get_queue():
+    """
+    Returns the process-wide queue. Its pool runs unless another process
+    already serves the same queue file.
+    """
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(shared=True)
+            _default_queue.start()
+        return _default_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a worker pool for the shared job queue.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    queue = JobQueue(args.path, max(args.workers, 1))
+    queue.start()
+    print(f"{queue.workers} workers on {args.path}; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        queue.stop()
+
+
+if __name__ == "__main__":
+    main()
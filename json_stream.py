@@ -0,0 +1,96 @@
+"""
+Incremental parser for JSON arrays of objects arriving in pieces.
+
+Feed it text chunks as a model streams them and it returns each top-level
+object as soon as its closing brace arrives. Anything before the opening
+bracket (such as a ```json fence) is skipped. Because objects are emitted as
+they close, every complete item is recovered from truncated or otherwise
+malformed output.
+"""
+import json
+
+
+class JSONArrayStreamParser:
+    def __init__(self):
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item = []
+
+    def feed(self, text):
+        """
+        Consumes a chunk and returns the list of objects completed by it.
+        """
+        items = []
+        for ch in text:
+            if self._done:
+                break
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                continue
+
+            if self._depth:
+                self._item.append(ch)
+            # Strings are tracked between items too, so brackets in a stray
+            # top-level string do not open or close anything
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif self._depth == 0:
+                # Between items at the top level of the array
+                if ch == "{":
+                    self._depth = 1
+                    self._item = [ch]
+                elif ch == "]":
+                    self._done = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._decode("".join(self._item))
+                    self._item = []
+                    if item is not None:
+                        items.append(item)
+        return items
+
+    @staticmethod
+    def _decode(text):
+        try:
+            item = json.loads(text)
+        except ValueError:
+            return None
+        return item if isinstance(item, dict) else None
+
+    @property
+    def done(self):
+        return self._done
+
+
+def iter_json_objects(chunks):
+    """
+    Yields each complete top-level object of a streamed JSON array.
+    """
+    parser = JSONArrayStreamParser()
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+        if parser.done:
+            return
+
+
+def salvage_json_objects(text):
+    """
+    Returns every complete top-level object found in a (possibly truncated)
+    JSON array.
+    """
+    return JSONArrayStreamParser().feed(text)
@@ -0,0 +1,65 @@
+"""
+Layout engine for the `layout` field in templates.json.
+
+Each layout is a list of text regions given as fractions of the canvas.
+geometry() turns them into pixel boxes once per (layout, canvas size), so
+rendering only has to fit and place the text. A region either draws its
+scrim tightly around the text (panel=False) or fills the whole region with
+it (panel=True), e.g. the bottom band of hero_image_bottom.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+# box is (x0, y0, x1, y1); fractions in LAYOUTS, pixels from geometry().
+# Text is fitted inside the box at up to max_size pixels.
+Region = namedtuple("Region", "box max_size halign valign panel")
+
+DEFAULT_LAYOUT = "center_text_overlay"
+
+LAYOUTS = {
+    "center_text_overlay": [
+        Region((0.15, 0.15, 0.85, 0.85), max_size=56, halign="center", valign="middle", panel=False),
+    ],
+    "hero_image_bottom": [
+        Region((0.0, 0.68, 1.0, 1.0), max_size=48, halign="center", valign="middle", panel=True),
+    ],
+    "split_view": [
+        Region((0.5, 0.0, 1.0, 1.0), max_size=48, halign="left", valign="middle", panel=True),
+    ],
+    "top_bottom_text": [
+        Region((0.05, 0.0, 0.95, 0.3), max_size=56, halign="center", valign="top", panel=False),
+        Region((0.05, 0.7, 0.95, 1.0), max_size=56, halign="center", valign="bottom", panel=False),
+    ],
+    "chart_overlay": [
+        Region((0.0, 0.0, 0.6, 0.35), max_size=40, halign="left", valign="top", panel=False),
+    ],
+}
+
+
+@lru_cache(maxsize=64)
+def geometry(layout, W, H):
+    """
+    Returns the layout's regions with pixel boxes for a W x H canvas.
+    Unknown layouts fall back to DEFAULT_LAYOUT.
+    """
+    regions = LAYOUTS.get(layout) or LAYOUTS[DEFAULT_LAYOUT]
+    return tuple(
+        r._replace(box=(round(r.box[0] * W), round(r.box[1] * H), round(r.box[2] * W), round(r.box[3] * H)))
+        for r in regions
+    )
+
+
+def split_text(text, count):
+    """
+    Splits overlay text across `count` regions: on "|" or newlines when the
+    text has them, otherwise into runs of roughly equal word count.
+    """
+    if count <= 1:
+        return [text]
+    for sep in ("|", "\n"):
+        if sep in text:
+            parts = [p.strip() for p in text.split(sep)]
+            return parts[:count - 1] + [" ".join(parts[count - 1:])] + [""] * (count - len(parts))
+    words = text.split()
+    step = -(-len(words) // count) if words else 0
+    return [" ".join(words[i * step:(i + 1) * step]) for i in range(count)]
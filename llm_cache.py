@@ -0,0 +1,232 @@
+"""
+Content-addressed cache for LLM responses.
+
+Responses are keyed on a hash of (model name, normalized prompt, parameters)
+and stored in two tiers: an in-memory LRU and an on-disk SQLite store that
+survives Streamlit reruns and restarts. Set LLM_CACHE_DISABLED=1 to turn
+caching off globally, or pass bypass=True for a fresh answer.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import telemetry
+
+DEFAULT_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+DEFAULT_MEMORY_ENTRIES = 512
+DEFAULT_DISK_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def normalize_prompt(prompt):
+    """
+    Collapses indentation and blank-line differences so that prompts built
+    from the same template hash identically.
+    """
+    lines = [" ".join(line.split()) for line in prompt.strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def make_key(model_name, prompt, params=None):
+    payload = json.dumps(
+        [model_name, normalize_prompt(prompt), params or {}],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier (memory LRU + SQLite) response cache with TTL and size-based
+    eviction. Thread-safe.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_disk_bytes=DEFAULT_DISK_BYTES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "bypassed": 0}
+
+    def _conn(self):
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None.
+        """
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                value, created = hit
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    telemetry.incr("cache_hits", tier="memory")
+                    return value
+                del self._memory[key]
+
+            db = self._conn()
+            row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value, created = row
+                if now - created <= self.ttl:
+                    db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    self._remember(key, value, created)
+                    self.stats["disk_hits"] += 1
+                    telemetry.incr("cache_hits", tier="disk")
+                    return value
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+
+            self.stats["misses"] += 1
+            telemetry.incr("cache_misses")
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            db = self._conn()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            db.commit()
+            self._evict(db)
+
+    def _evict(self, db):
+        """
+        Drops expired rows, then least recently used rows until the store
+        fits in max_disk_bytes.
+        """
+        cur = db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self.stats["evictions"] += max(cur.rowcount, 0)
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_disk_bytes:
+            rows = db.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_disk_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            for (key,) in doomed:
+                self._memory.pop(key, None)
+            self.stats["evictions"] += len(doomed)
+        db.commit()
+
+    def _bypassed(self, bypass):
+        if bypass or os.environ.get("LLM_CACHE_DISABLED") == "1":
+            with self._lock:
+                self.stats["bypassed"] += 1
+            telemetry.incr("cache_bypassed")
+            return True
+        return False
+
+    def _store(self, key, value, validate):
+        # Never cache empty or unparseable responses, so a retry can fix them.
+        if value and (validate is None or validate(value)):
+            self.set(key, value)
+
+    def lookup(self, model_name, prompt, params=None, bypass=False):
+        """
+        Returns the cached response for this request, or None.
+        """
+        if self._bypassed(bypass):
+            return None
+        return self.get(make_key(model_name, prompt, params))
+
+    def store(self, model_name, prompt, value, params=None, bypass=False, validate=None):
+        """
+        Caches a response that was produced outside get_or_call, e.g. by
+        joining a streamed answer.
+        """
+        if bypass or os.environ.get("LLM_CACHE_DISABLED") == "1":
+            return
+        self._store(make_key(model_name, prompt, params), value, validate)
+
+    def get_or_call(self, model_name, prompt, call, params=None, bypass=False, validate=None):
+        """
+        Returns the cached response text for this request, or invokes
+        call() -> str and stores its result if validate(result) passes.
+        """
+        if self._bypassed(bypass):
+            return call()
+        key = make_key(model_name, prompt, params)
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = call()
+        self._store(key, value, validate)
+        return value
+
+    async def aget_or_call(self, model_name, prompt, acall, params=None, bypass=False, validate=None):
+        """
+        Async version of get_or_call; acall is a coroutine function.
+        """
+        if self._bypassed(bypass):
+            return await acall()
+        key = make_key(model_name, prompt, params)
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = await acall()
+        self._store(key, value, validate)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._conn()
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process-wide cache instance.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
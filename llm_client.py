@@ -0,0 +1,549 @@
+"""
+Shared LLM client used by every module that talks to Gemini.
+
+One process-wide client reuses model handles per model name, enforces a
+token-bucket rate limit (interactive calls go ahead of batch calls), retries
+transient errors with jittered exponential backoff and trips a circuit
+breaker when the API keeps failing. While the breaker is open, calls raise
+LLMUnavailable immediately and callers fall back to the mock backend.
+
+Prompts built by prompts.py carry a stable prefix that the provider can
+serve from its prompt cache; large prefixes are also cached on Gemini's side
+with explicit context caching. Backends report the tokens each call actually
+read from cache, and the client bills those at CACHED_INPUT_RATE.
+client.usage holds the running token totals; track_usage() collects the
+usage of one piece of work.
+
+Tune with LLM_RATE_PER_MIN, LLM_BURST and LLM_MAX_RETRIES. Tests and
+benchmarks can swap the backend with set_backend (see fake_llm.py).
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import importlib.util
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+import telemetry
+from prompts import estimate_tokens
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Priority used when a call does not pass one explicitly
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+# Usage dicts of the enclosing track_usage() blocks
+_usage_sinks = contextvars.ContextVar("llm_usage_sinks", default=())
+
+# HTTP-style status codes worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+# Share of the normal input price billed for cached prefix tokens
+CACHED_INPUT_RATE = float(os.environ.get("LLM_CACHED_INPUT_RATE", 0.25))
+# How long a provider keeps an unused prefix cached, in seconds
+PREFIX_CACHE_TTL = float(os.environ.get("LLM_PREFIX_CACHE_TTL", 300))
+# Prefixes shorter than this are never served from the simulated cache
+PREFIX_CACHE_MIN_TOKENS = int(os.environ.get("LLM_PREFIX_CACHE_MIN_TOKENS", 0))
+# Gemini's explicit context caching only accepts prefixes this large
+GEMINI_CACHE_MIN_TOKENS = int(os.environ.get("GEMINI_CACHE_MIN_TOKENS", 32768))
+
+
+class LLMUnavailable(Exception):
+    """
+    Raised when the LLM cannot be reached: circuit open, rate-limit wait
+    timed out, retries exhausted or a non-retryable API error.
+    """
+
+
+def is_retryable(exc):
+    # google.api_core errors carry the HTTP status in .code
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_CODES
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Batch callers leave `batch_reserve` of the
+    burst for interactive callers and always yield to waiting interactive
+    callers.
+    """
+
+    def __init__(self, rate, capacity, batch_reserve=0.2):
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = min(capacity * batch_reserve, max(capacity - 1, 0))
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """
+        Takes one token, waiting if needed. Returns False on timeout.
+        """
+        interactive = priority == INTERACTIVE
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    floor = 0 if interactive else self.reserve
+                    if (interactive or not self._interactive_waiting) and self.tokens - 1 >= floor:
+                        self.tokens -= 1
+                        return True
+                    wait = max((floor + 1 - self.tokens) / self.rate, 0.001)
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, then lets a single
+    trial call through every `reset_timeout` seconds until one succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def release(self):
+        """
+        Ends a trial call that finished without an outcome, so the next
+        call can try again.
+        """
+        with self._lock:
+            self._trial_running = False
+
+
+class PrefixCache:
+    """
+    Simulated provider prompt-prefix cache, used by the fake backend: a
+    prefix is served from cache when the same model saw it less than `ttl`
+    seconds ago. Keeps the `max_entries` most recently used prefixes. Set
+    LLM_PREFIX_CACHE_DISABLED=1 to turn it off.
+    """
+
+    def __init__(self, ttl=PREFIX_CACHE_TTL, max_entries=1024, min_tokens=PREFIX_CACHE_MIN_TOKENS, enabled=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_tokens = min_tokens
+        self.enabled = os.environ.get("LLM_PREFIX_CACHE_DISABLED") != "1" if enabled is None else enabled
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, model_name, prompt):
+        """
+        Records a call with prompt and returns how many of its tokens were
+        served from cache (0 on a miss or for a prompt without a prefix).
+        """
+        prefix = getattr(prompt, "prefix", "")
+        tokens = estimate_tokens(prefix)
+        if not self.enabled or not prefix or tokens < max(self.min_tokens, 1):
+            return 0
+        key = (model_name, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+        now = time.monotonic()
+        with self._lock:
+            last = self._seen.pop(key, None)
+            self._seen[key] = now
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+        return tokens if last is not None and now - last <= self.ttl else 0
+
+
+class GeminiBackend:
+    """
+    Calls Gemini through google.generativeai, configuring the key once and
+    reusing one GenerativeModel per model name. The SDK takes about half a
+    second to import, so it is loaded on the first call, not with this module.
+
+    Prompt prefixes of at least GEMINI_CACHE_MIN_TOKENS are uploaded once as
+    cached content and later calls send only the suffix. Smaller prefixes
+    are sent in full and rely on Gemini's implicit prefix caching.
+
+    generate and stream take an optional `usage` dict and fill it with the
+    token counts Gemini reports for the call.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._cached = {}
+        self._no_cache = set()
+        self._api_key = None
+        self._lock = threading.Lock()
+        self._installed = None
+
+    def available(self):
+        if not os.environ.get("GEMINI_API_KEY"):
+            return False
+        if self._installed is None:
+            # Checks the package is there without importing it; find_spec
+            # raises instead of returning None when "google" itself is missing
+            try:
+                self._installed = importlib.util.find_spec("google.generativeai") is not None
+            except ImportError:
+                self._installed = False
+        return self._installed
+
+    def model(self, model_name, api_key=None):
+        api_key = api_key or os.environ.get("GEMINI_API_KEY")
+        with self._lock:
+            import google.generativeai as genai
+            if api_key != self._api_key:
+                genai.configure(api_key=api_key)
+                self._api_key = api_key
+                self._models.clear()
+                self._cached.clear()
+            if model_name not in self._models:
+                self._models[model_name] = genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def _cached_model(self, model_name, prefix, api_key=None):
+        """
+        Returns a model bound to server-side cached content for prefix, or
+        None when the prefix is too small or the model cannot cache.
+        """
+        if estimate_tokens(prefix) < GEMINI_CACHE_MIN_TOKENS or model_name in self._no_cache:
+            return None
+        self.model(model_name, api_key)
+        key = (model_name, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+        with self._lock:
+            entry = self._cached.get(key)
+        # Renew a little before Gemini expires the content
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        # Upload without the lock, so other calls are not held up by it
+        try:
+            import datetime
+            import google.generativeai as genai
+            from google.generativeai import caching
+            content = caching.CachedContent.create(
+                model=model_name, contents=[prefix], ttl=datetime.timedelta(seconds=PREFIX_CACHE_TTL)
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content=content)
+        except Exception as e:
+            print(f"Gemini context caching unavailable for {model_name}: {e}")
+            with self._lock:
+                self._no_cache.add(model_name)
+            return None
+        with self._lock:
+            self._cached[key] = (model, time.monotonic() + PREFIX_CACHE_TTL * 0.9)
+        return model
+
+    def _request(self, model_name, prompt, api_key=None):
+        """
+        Returns (model, contents) for a call, using cached content for the
+        prompt's prefix when there is one.
+        """
+        prefix = getattr(prompt, "prefix", "")
+        cached = self._cached_model(model_name, prefix, api_key) if prefix else None
+        if cached is not None:
+            return cached, prompt.suffix
+        return self.model(model_name, api_key), str(prompt)
+
+    @staticmethod
+    def _usage(response, usage):
+        metadata = getattr(response, "usage_metadata", None)
+        if usage is None or not metadata:
+            return
+        usage["input_tokens"] = metadata.prompt_token_count
+        usage["cached_tokens"] = getattr(metadata, "cached_content_token_count", 0) or 0
+        usage["output_tokens"] = metadata.candidates_token_count
+
+    def generate(self, model_name, prompt, api_key=None, usage=None):
+        model, contents = self._request(model_name, prompt, api_key)
+        response = model.generate_content(contents)
+        self._usage(response, usage)
+        return response.text
+
+    def stream(self, model_name, prompt, api_key=None, usage=None):
+        model, contents = self._request(model_name, prompt, api_key)
+        for chunk in model.generate_content(contents, stream=True):
+            # The last chunk carries the totals for the whole call
+            self._usage(chunk, usage)
+            yield chunk.text
+
+
+class LLMClient:
+    def __init__(self, backend=None, rate_per_min=None, burst=None, max_retries=None,
+                 base_delay=0.5, max_delay=8.0, acquire_timeout=60.0, breaker=None):
+        self.backend = backend or GeminiBackend()
+        rate_per_min = rate_per_min or float(os.environ.get("LLM_RATE_PER_MIN", 60))
+        burst = burst or int(os.environ.get("LLM_BURST", 10))
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst)
+        self.max_retries = int(os.environ.get("LLM_MAX_RETRIES", 3)) if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "short_circuited": 0, "throttled": 0}
+        self.usage = _empty_usage()
+
+    def _count(self, name, model_name):
+        with self._stats_lock:
+            self.stats[name] += 1
+        telemetry.incr(f"llm_{name}", model=model_name)
+
+    def _count_tokens(self, model_name, prompt, text, reported):
+        """
+        Accounts one successful call and returns its token usage. `reported`
+        holds the counts the backend reported; cached input tokens are
+        billed at CACHED_INPUT_RATE.
+        """
+        # Rough estimate (~4 characters per token) where the backend reports nothing
+        usage = {"input_tokens": reported.get("input_tokens", estimate_tokens(prompt)),
+                 "cached_tokens": reported.get("cached_tokens", 0),
+                 "output_tokens": reported.get("output_tokens", estimate_tokens(text))}
+        cached = usage["cached_tokens"]
+        usage["billed_input_tokens"] = usage["input_tokens"] - cached * (1 - CACHED_INPUT_RATE)
+        with self._stats_lock:
+            for totals in (self.usage, *_usage_sinks.get()):
+                totals["calls"] += 1
+                for name, value in usage.items():
+                    totals[name] += value
+        telemetry.incr("llm_tokens", usage["input_tokens"], model=model_name, direction="input")
+        telemetry.incr("llm_tokens", cached, model=model_name, direction="cached_input")
+        telemetry.incr("llm_tokens", usage["output_tokens"], model=model_name, direction="output")
+        return usage
+
+    def available(self):
+        return self.backend.available()
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform over [0, min(max_delay, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _throttle(self, model_name, priority):
+        if not self.bucket.acquire(priority, timeout=self.acquire_timeout):
+            self._count("throttled", model_name)
+            raise LLMUnavailable("Timed out waiting for the LLM rate limit")
+
+    def _admit(self, model_name, priority):
+        """
+        Takes a rate-limit token, then a slot from the breaker. The token
+        comes first so a half-open trial is never held while waiting on it.
+        """
+        self._throttle(model_name, priority)
+        if not self.breaker.allow():
+            self._count("short_circuited", model_name)
+            raise LLMUnavailable("LLM circuit breaker is open")
+
+    def _settle(self, ok):
+        # One outcome per logical call, however many attempts it took;
+        # None means it ended without one (throttled on a retry, cancelled)
+        if ok is None:
+            self.breaker.release()
+        elif ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def generate(self, prompt, model_name, priority=None, api_key=None):
+        """
+        Returns the response text, retrying transient errors.
+        Raises LLMUnavailable when the call cannot be served.
+        """
+        priority = priority or _priority.get()
+        self._admit(model_name, priority)
+        ok = None
+        try:
+            attempt = 0
+            while True:
+                if attempt:
+                    self._throttle(model_name, priority)
+                self._count("calls", model_name)
+                reported = {}
+                try:
+                    with telemetry.span("llm.call", model=model_name, priority=priority, attempt=attempt) as span:
+                        text = self.backend.generate(model_name, prompt, api_key=api_key, usage=reported)
+                        for name, value in self._count_tokens(model_name, prompt, text, reported).items():
+                            span.set(name, value)
+                except Exception as e:
+                    self._count("failures", model_name)
+                    if not is_retryable(e) or attempt >= self.max_retries:
+                        ok = False
+                        raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+                    self._count("retries", model_name)
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+
+                self._count("successes", model_name)
+                ok = True
+                return text
+        finally:
+            self._settle(ok)
+
+    def generate_stream(self, prompt, model_name, priority=None, api_key=None):
+        """
+        Yields response text chunks as the model produces them.
+        Errors before the first chunk are retried like generate(); once
+        output has started, a failure ends the stream with LLMUnavailable.
+        """
+        priority = priority or _priority.get()
+        self._admit(model_name, priority)
+        ok = None
+        try:
+            attempt = 0
+            while True:
+                if attempt:
+                    self._throttle(model_name, priority)
+                self._count("calls", model_name)
+                reported = {}
+                started = False
+                chunks = []
+                t0 = time.perf_counter()
+                try:
+                    for chunk in self.backend.stream(model_name, prompt, api_key=api_key, usage=reported):
+                        if not started:
+                            telemetry.record_span("llm.stream_first_chunk", time.perf_counter() - t0, model=model_name)
+                        started = True
+                        chunks.append(chunk)
+                        yield chunk
+                except Exception as e:
+                    self._count("failures", model_name)
+                    if started or not is_retryable(e) or attempt >= self.max_retries:
+                        ok = False
+                        raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+                    self._count("retries", model_name)
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+
+                usage = self._count_tokens(model_name, prompt, "".join(chunks), reported)
+                telemetry.record_span("llm.stream", time.perf_counter() - t0, model=model_name, priority=priority, **usage)
+                self._count("successes", model_name)
+                ok = True
+                return
+        finally:
+            # Also runs when the consumer closes the stream early
+            self._settle(ok)
+
+    async def agenerate(self, prompt, model_name, priority=None, api_key=None):
+        """
+        Async version of generate; the blocking call runs on a worker thread.
+        """
+        priority = priority or _priority.get()
+        loop = asyncio.get_running_loop()
+        # Carry the caller's context (trace parent) onto the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(None, ctx.run, self.generate, prompt, model_name, priority, api_key)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the shared process-wide client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
+
+
+def set_backend(backend):
+    """
+    Routes all LLM calls to `backend` (anything with available(),
+    generate(model_name, prompt, api_key=None, usage=None) and the matching
+    stream()). A backend fills the usage dict it is given with the token
+    counts it reports, e.g. {"cached_tokens": ...}.
+    Pass None to restore Gemini.
+    Resets the circuit breaker.
+    """
+    client = get_client()
+    client.backend = backend or GeminiBackend()
+    client.breaker = CircuitBreaker(client.breaker.failure_threshold, client.breaker.reset_timeout)
+
+
+def is_enabled():
+    """
+    True when LLM calls should be attempted instead of the mock backend.
+    """
+    return get_client().available()
+
+
+def _empty_usage():
+    return {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "billed_input_tokens": 0.0, "output_tokens": 0}
+
+
+@contextlib.contextmanager
+def track_usage():
+    """
+    Yields a dict that adds up the token usage of LLM calls made inside the
+    block (in this thread or task, and in workers started with a copy of
+    its context), in the shape of client.usage.
+    """
+    usage = _empty_usage()
+    token = _usage_sinks.set(_usage_sinks.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _usage_sinks.reset(token)
+
+
+@contextlib.contextmanager
+def batch_priority():
+    """
+    Marks LLM calls made inside the block (in this thread or task) as
+    batch traffic, so interactive users are served first.
+    """
+    token = _priority.set(BATCH)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
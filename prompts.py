@@ -0,0 +1,208 @@
+"""
+Prompt assembly: a stable prefix plus a small per-request suffix.
+
+Everything that only depends on the brand and the task (role, brand voice,
+keywords, constraints, output format) goes first, in a prefix that is
+byte-identical for every call the brand makes; the request itself (intent,
+post text, feedback) goes last. Providers that cache prompt prefixes then
+only process and bill the suffix in full (see llm_client.PrefixCache).
+
+A Prompt is a str, so caches, backends and logs can treat it as plain text;
+llm_client reads its .prefix to use and account for prefix caching.
+"""
+import json
+from functools import lru_cache
+
+# Token budget for the keyword line of a brand prefix
+KEYWORD_TOKEN_BUDGET = 24
+
+
+def estimate_tokens(text):
+    # Rough estimate (~4 characters per token) until the provider reports usage
+    return len(text) // 4
+
+
+class Prompt(str):
+    """
+    Prompt text that remembers which leading part is the stable prefix.
+    """
+
+    def __new__(cls, prefix, suffix):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix = prefix
+        prompt.suffix = suffix
+        return prompt
+
+    def __getnewargs__(self):
+        return (self.prefix, self.suffix)
+
+
+def compact_keywords(keywords, budget=KEYWORD_TOKEN_BUDGET):
+    """
+    Returns the brand keywords (list or comma-separated string) without
+    case-insensitive duplicates, in order, cut off at `budget` tokens.
+    """
+    if isinstance(keywords, str):
+        keywords = keywords.split(",")
+    kept, seen, used = [], set(), 0
+    for keyword in keywords:
+        keyword = str(keyword).strip()
+        if not keyword or keyword.lower() in seen:
+            continue
+        # Keywords are joined with ", "
+        cost = max(estimate_tokens(keyword + ", "), 1)
+        if used + cost > budget:
+            break
+        kept.append(keyword)
+        seen.add(keyword.lower())
+        used += cost
+    return kept
+
+
+def _brand_args(brand_profile):
+    """
+    The parts of a profile the prefixes use, as hashable values.
+    """
+    return (
+        brand_profile.get("tone", "Neutral"),
+        tuple(compact_keywords(brand_profile.get("keywords", []))),
+        brand_profile.get("visual_style", {}).get("color", "gray"),
+    )
+
+
+@lru_cache(maxsize=1024)
+def _caption_prefix(tone, keywords, visual_style):
+    return f"""
+    You are a social media manager.
+    Brand Tone: {tone}
+    Keywords: {", ".join(keywords)}
+
+    Constraints:
+    - LinkedIn: Professional, 1-3 hashtags.
+    - Instagram: Visual, 5-10 hashtags, "Link in bio".
+
+    Output strictly valid JSON array like this:
+    [
+      {{
+        "caption": "Post text...",
+        "overlay": "Image text (max 5 words)",
+        "image_style": "{visual_style}"
+      }}
+    ]
+    """
+
+
+@lru_cache(maxsize=1024)
+def _fanout_prefix(tone, keywords, visual_style):
+    return f"""
+    You are a social media manager.
+    Brand Tone: {tone}
+    Keywords: {", ".join(keywords)}
+
+    Constraints:
+    - LinkedIn: Professional, 1-3 hashtags.
+    - Instagram: Visual, 5-10 hashtags, "Link in bio".
+
+    Each post is one image with one overlay, captioned separately for every
+    platform. Output strictly valid JSON array like this:
+    [
+      {{
+        "overlay": "Image text (max 5 words)",
+        "image_style": "{visual_style}",
+        "captions": {{"<platform>": "Post text tuned for that platform..."}}
+      }}
+    ]
+    """
+
+
+@lru_cache(maxsize=1024)
+def _critique_prefix(tone, batch):
+    if batch:
+        return f"""
+    You are a strict Brand Compliance Officer.
+    Brand Voice: {tone}
+
+    Score each post 1-10 on alignment with the brand voice and effectiveness.
+    Provide 1 sentence of specific feedback for improvement per post.
+
+    Output strictly valid JSON array with one object per post, using the post number as id:
+    [
+        {{"id": 1, "score": 8, "feedback": "Short feedback here."}}
+    ]
+    """
+    return f"""
+    You are a strict Brand Compliance Officer.
+    Brand Voice: {tone}
+
+    Score it 1-10 on alignment with the brand voice and effectiveness.
+    Provide 1 sentence of specific feedback for improvement.
+
+    Output strictly valid JSON:
+    {{
+        "score": 8,
+        "feedback": "Short feedback here."
+    }}
+    """
+
+
+IMPROVE_PREFIX = """
+    Rewrite this social media post to address the feedback.
+    Output only the rewritten post text.
+    """
+
+
+def _quote(text):
+    return json.dumps(text, ensure_ascii=False)
+
+
+def _avoid_block(avoid):
+    if not avoid:
+        return ""
+    listed = "\n".join(f"    - {_quote(c)}" for c in avoid)
+    return f"\n    Do not repeat or closely paraphrase these existing posts:\n{listed}\n"
+
+
+def caption_prompt(brand_profile, intent, template_name, platform, n=3, avoid=None):
+    tone, keywords, visual_style = _brand_args(brand_profile)
+    avoid_block = _avoid_block(avoid)
+    suffix = f"""
+    Task: Create {n} distinct posts about "{intent}" for {platform}.
+    Template: {template_name}
+    {avoid_block}"""
+    return Prompt(_caption_prefix(tone, keywords, visual_style), suffix)
+
+
+def fanout_prompt(brand_profile, intent, template_name, platforms, n=3, avoid=None):
+    tone, keywords, visual_style = _brand_args(brand_profile)
+    avoid_block = _avoid_block(avoid)
+    suffix = f"""
+    Task: Create {n} distinct posts about "{intent}" for each of these platforms: {", ".join(platforms)}
+    Template: {template_name}
+    {avoid_block}"""
+    return Prompt(_fanout_prefix(tone, keywords, visual_style), suffix)
+
+
+def critique_prompt(brand_profile, post_content):
+    suffix = f"""
+    Review this post:
+    "{post_content}"
+    """
+    return Prompt(_critique_prefix(brand_profile.get("tone", "Neutral"), False), suffix)
+
+
+def batch_critique_prompt(brand_profile, captions):
+    numbered = "\n".join(f"    {i + 1}. {_quote(c)}" for i, c in enumerate(captions))
+    suffix = f"""
+    Review each of these {len(captions)} posts:
+{numbered}
+    """
+    return Prompt(_critique_prefix(brand_profile.get("tone", "Neutral"), True), suffix)
+
+
+def improve_prompt(post_content, feedback):
+    suffix = f"""
+    Original: "{post_content}"
+    Feedback: "{feedback}"
+    """
+    return Prompt(IMPROVE_PREFIX, suffix)
+
@@ -0,0 +1,334 @@
+"""
+Lightweight tracing and metrics for the generate/render/critique pipeline.
+
+Wrap stages in span("stage.name") (or decorate them with @traced) and bump
+counters with incr("name"). Everything is a no-op until tracing is turned
+on with enable() or AGENT_TRACING=1, so the cost when off is one flag check.
+Spans carry the run id set with set_run() (e.g. one page run of one UI
+session), so breakdown() can show a single run while others trace too.
+
+Recorded data can be exported as Prometheus text (to_prometheus) or as an
+OpenTelemetry-compatible OTLP/JSON document (to_otel_json/write_otel_json).
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+SERVICE_NAME = "ai-social-media-agent"
+
+# Histogram buckets for span durations, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MAX_RECENT_SPANS = 5000
+
+# Owners that have not renewed their enable() call for this many seconds
+# (e.g. closed browser tabs) stop keeping tracing on
+OWNER_TTL = 900
+
+_forced = os.environ.get("AGENT_TRACING") == "1"
+_enabled = _forced
+# Owners (e.g. UI sessions) that currently want tracing on -> last renewal
+_owners = {}
+_lock = threading.Lock()
+_current = contextvars.ContextVar("telemetry_span", default=None)
+_run = contextvars.ContextVar("telemetry_run", default=None)
+
+_recent = deque(maxlen=MAX_RECENT_SPANS)
+_recorded = 0
+# (name, labels) -> value
+_counters = {}
+# name -> {"count", "sum", "buckets"}
+_histograms = {}
+
+
+def enabled():
+    return _enabled
+
+
+def enable(flag=True, owner=None):
+    """
+    Turns tracing on or off. With an owner, tracing stays on while any
+    owner still wants it, so one session cannot turn it off for another.
+    Owners must call again at least every OWNER_TTL seconds; ones that
+    stop (a session that ended) are dropped.
+    """
+    global _enabled, _forced
+    now = time.monotonic()
+    with _lock:
+        if owner is None:
+            _forced = bool(flag)
+        elif flag:
+            _owners[owner] = now
+        else:
+            _owners.pop(owner, None)
+        for stale in [o for o, seen in _owners.items() if now - seen > OWNER_TTL]:
+            del _owners[stale]
+        _enabled = _forced or bool(_owners)
+
+
+def set_run(run_id):
+    """
+    Tags spans started from now on in this context (and the threads and
+    tasks it starts) with run_id.
+    """
+    _run.set(run_id)
+
+
+def current_run():
+    return _run.get()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent else "%032x" % random.getrandbits(128)
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.run_id = _run.get()
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error = None
+        self._token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _current.reset(self._token)
+        _record(self)
+        return False
+
+
+def span(name, **attributes):
+    """
+    Times the enclosed block as a named stage.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def traced(name):
+    """
+    Decorator form of span(); works on plain and async functions.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with Span(name, {}):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name, duration, **attributes):
+    """
+    Records an already-measured stage, for code that cannot hold a span open
+    (e.g. across the yields of a generator).
+    """
+    if not _enabled:
+        return
+    s = Span(name, attributes)
+    s.duration = duration
+    s.end_ns = time.time_ns()
+    s.start_ns = s.end_ns - int(duration * 1e9)
+    _record(s)
+
+
+def incr(name, value=1, **labels):
+    """
+    Adds value to a counter, e.g. incr("llm_calls", model="gemini-1.0-pro").
+    """
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _record(s):
+    global _recorded
+    with _lock:
+        _recent.append(s)
+        _recorded += 1
+        hist = _histograms.get(s.name)
+        if hist is None:
+            hist = _histograms[s.name] = {"count": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS)}
+        hist["count"] += 1
+        hist["sum"] += s.duration
+        for i, bound in enumerate(BUCKETS):
+            if s.duration <= bound:
+                hist["buckets"][i] += 1
+
+
+def mark():
+    """
+    Returns a marker; pass it to breakdown() to see only later spans.
+    """
+    with _lock:
+        return _recorded
+
+
+def breakdown(since=0, run_id=None):
+    """
+    Aggregates spans recorded after `since` (and tagged with run_id, if
+    given) into [{"stage", "count", "total_ms", "max_ms", "errors"}],
+    slowest first.
+    """
+    with _lock:
+        new = min(_recorded - since, len(_recent))
+        spans = list(_recent)[len(_recent) - new:] if new > 0 else []
+    if run_id is not None:
+        spans = [s for s in spans if s.run_id == run_id]
+    stages = {}
+    for s in spans:
+        row = stages.setdefault(s.name, {"stage": s.name, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+        ms = s.duration * 1000
+        row["count"] += 1
+        row["total_ms"] += ms
+        row["max_ms"] = max(row["max_ms"], ms)
+        row["errors"] += 1 if s.error else 0
+    rows = sorted(stages.values(), key=lambda r: r["total_ms"], reverse=True)
+    for row in rows:
+        row["total_ms"] = round(row["total_ms"], 3)
+        row["max_ms"] = round(row["max_ms"], 3)
+    return rows
+
+
+def counters():
+    with _lock:
+        return {
+            name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+            for (name, labels), value in sorted(_counters.items())
+        }
+
+
+def reset():
+    global _recorded
+    with _lock:
+        _recent.clear()
+        _recorded = 0
+        _counters.clear()
+        _histograms.clear()
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}"
+
+
+def to_prometheus():
+    """
+    Renders counters and stage duration histograms in the Prometheus text
+    exposition format.
+    """
+    lines = []
+    with _lock:
+        counters_by_name = {}
+        for (name, labels), value in sorted(_counters.items()):
+            counters_by_name.setdefault(name, []).append((labels, value))
+        for name, series in counters_by_name.items():
+            metric = f"agent_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in series:
+                lines.append(f"{metric}{_label_str(labels)} {value}")
+
+        if _histograms:
+            metric = "agent_stage_duration_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for name, hist in sorted(_histograms.items()):
+                for bound, count in zip(BUCKETS, hist["buckets"]):
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {hist["sum"]:.6f}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {hist["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otel_json():
+    """
+    Returns the recent spans as an OTLP/JSON traces document.
+    """
+    with _lock:
+        spans = list(_recent)
+    otel_spans = []
+    for s in spans:
+        item = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otel_value(v)} for k, v in s.attributes.items()]
+            + ([{"key": "run.id", "value": _otel_value(s.run_id)}] if s.run_id else []),
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        otel_spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "telemetry"}, "spans": otel_spans}],
+        }]
+    }
+
+
+def write_otel_json(path):
+    with open(path, "w") as f:
+        json.dump(to_otel_json(), f)
@@ -0,0 +1,121 @@
+"""
+Validated, indexed view of templates.json.
+
+The file is parsed and checked once, indexed by id and by name, and reloaded
+only when its mtime changes. A reload that fails validation keeps serving
+the last good version.
+"""
+import json
+import os
+import threading
+
+import layouts
+
+REQUIRED_FIELDS = ("id", "name", "layout", "default_image")
+DEFAULT_PATH = "templates.json"
+
+
+class TemplateError(ValueError):
+    """
+    Raised when templates.json is malformed.
+    """
+
+
+def validate(templates):
+    """
+    Checks the parsed file and returns it as a list of template dicts.
+    """
+    if not isinstance(templates, list):
+        raise TemplateError("templates.json must contain a JSON array")
+    seen_ids, seen_names = set(), set()
+    for position, template in enumerate(templates):
+        if not isinstance(template, dict):
+            raise TemplateError(f"Template #{position + 1} is not an object")
+        missing = [f for f in REQUIRED_FIELDS if not template.get(f)]
+        if missing:
+            raise TemplateError(f"Template #{position + 1} is missing {', '.join(missing)}")
+        if template["id"] in seen_ids:
+            raise TemplateError(f"Duplicate template id: {template['id']}")
+        if template["name"] in seen_names:
+            raise TemplateError(f"Duplicate template name: {template['name']}")
+        if template["layout"] not in layouts.LAYOUTS:
+            raise TemplateError(f"Template {template['id']} has unknown layout: {template['layout']}")
+        if not isinstance(template.get("structure", []), list):
+            raise TemplateError(f"Template {template['id']} structure must be a list")
+        seen_ids.add(template["id"])
+        seen_names.add(template["name"])
+    return templates
+
+
+class TemplateRegistry:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._templates = []
+        self._by_id = {}
+        self._by_name = {}
+        self._refresh(strict=True)
+
+    def _refresh(self, strict=False):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if strict:
+                raise
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, "r") as f:
+                    templates = validate(json.load(f))
+            except (ValueError, OSError) as e:
+                if strict:
+                    raise TemplateError(f"Could not load {self.path}: {e}") from e
+                print(f"Template reload failed, keeping previous templates: {e}")
+                self._mtime = mtime
+                return
+            self._templates = templates
+            self._by_id = {t["id"]: t for t in templates}
+            self._by_name = {t["name"]: t for t in templates}
+            self._mtime = mtime
+
+    def all(self):
+        self._refresh()
+        return list(self._templates)
+
+    def names(self):
+        self._refresh()
+        return [t["name"] for t in self._templates]
+
+    def get(self, template_id, default=None):
+        self._refresh()
+        return self._by_id.get(template_id, default)
+
+    def by_name(self, name, default=None):
+        self._refresh()
+        return self._by_name.get(name, default)
+
+    def index(self):
+        """
+        Returns {id: template}.
+        """
+        self._refresh()
+        return dict(self._by_id)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path=DEFAULT_PATH):
+    """
+    Returns the shared registry for path.
+    """
+    with _registries_lock:
+        if path not in _registries:
+            _registries[path] = TemplateRegistry(path)
+        return _registries[path]
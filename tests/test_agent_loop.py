@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+import agent_loop
+import critic
+import llm_client
+from fake_llm import FakeLLMBackend
+
+LONG = "We are pleased to share our quarterly product update with the whole community."
+
+
+@pytest.fixture
+def mock_critic(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setattr(critic, "MOCK_LATENCY", 0)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_DISABLED", "1")
+    llm_client.set_backend(FakeLLMBackend(latency=0))
+    yield
+    llm_client.set_backend(None)
+
+
+def test_target_reached_without_rewrites(mock_critic):
+    [result] = agent_loop.polish_posts([LONG], {"tone": "Professional"})
+    assert result["stopped"] == "target"
+    assert len(result["rounds"]) == 1
+
+
+def test_rewrite_that_fixes_feedback_reaches_target(mock_critic):
+    [result] = agent_loop.polish_posts([{"caption": LONG}], {"tone": "Energetic"})
+    assert result["stopped"] == "target"
+    assert [r["score"] for r in result["rounds"]] == [7, 8]
+    assert result["caption"].endswith("!")
+
+
+def test_unchanged_rewrite_is_a_plateau(mock_critic):
+    [result] = agent_loop.polish_posts(["Hi all"], {"tone": "Professional"})
+    assert result["stopped"] == "plateau"
+    assert result["caption"] == "Hi all"
+
+
+def test_max_rounds(mock_critic):
+    [result] = agent_loop.polish_posts([LONG], {"tone": "Energetic"}, max_rounds=0)
+    assert result["stopped"] == "max_rounds"
+
+
+def test_token_budget_counts_reported_usage(fake_llm):
+    [result] = agent_loop.polish_posts([LONG], {"tone": "Professional"}, target_score=10, max_tokens=1)
+    assert result["stopped"] == "token_budget"
+    assert len(result["rounds"]) == 1
+
+
+def test_time_budget_abandons_the_first_critique(mock_critic, monkeypatch):
+    monkeypatch.setattr(critic, "MOCK_LATENCY", 0.5)
+    start = time.monotonic()
+    [result] = agent_loop.polish_posts([LONG], {"tone": "Professional"}, max_seconds=0.05)
+    assert time.monotonic() - start < 0.4
+    assert result["stopped"] == "time_budget"
+    assert result["score"] is None
+
+
+def test_time_budget_keeps_finished_rewrites(mock_critic, monkeypatch):
+    calls = []
+
+    def critique_posts(captions, brand_profile, bypass_cache=False, progress=None):
+        calls.append(captions)
+        if len(calls) > 1:
+            # The rewrite's critique outlives the budget
+            time.sleep(0.5)
+        return [critic.mock_critique(c, brand_profile) for c in captions]
+
+    monkeypatch.setattr(agent_loop, "critique_posts", critique_posts)
+    [result] = agent_loop.polish_posts([LONG], {"tone": "Energetic"}, max_seconds=0.2)
+    assert result["stopped"] == "time_budget"
+    assert result["caption"] == LONG
+    assert [(r["round"], r["score"]) for r in result["rounds"]] == [(0, 7), (1, None)]
+    assert result["rounds"][1]["caption"].endswith("!")
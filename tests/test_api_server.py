@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("PIL")
+
+import api_server
+import generator
+
+PROFILE = {"tone": "Professional", "keywords": ["launch"]}
+
+
+@pytest.fixture
+def mock_backend(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setenv("DEDUP_DISABLED", "1")
+    monkeypatch.setattr(generator, "MOCK_LATENCY", 0)
+
+
+async def _request(method, path, body=None, raw=None):
+    data = raw if raw is not None else json.dumps(body).encode() if body is not None else b""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": data, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await api_server.app({"type": "http", "method": method, "path": path}, receive, send)
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def _call(method, path, body=None, raw=None):
+    return asyncio.run(_request(method, path, body, raw))
+
+
+def test_unknown_route_and_method():
+    assert _call("GET", "/v1/nope")[0] == 404
+    assert _call("GET", "/v1/captions")[0] == 405
+
+
+def test_invalid_json_is_a_client_error():
+    status, data = _call("POST", "/v1/captions", raw=b"{not json")
+    assert status == 400
+    assert json.loads(data) == {"error": "body is not valid JSON"}
+    assert _call("POST", "/v1/captions", raw=b"[1, 2]")[0] == 400
+
+
+@pytest.mark.parametrize("n", [0, 11, True, "3"])
+def test_option_count_is_validated(mock_backend, n):
+    status, _ = _call("POST", "/v1/captions", {"brand_profile": PROFILE, "intent": "Launch", "n": n})
+    assert status == 400
+
+
+def test_missing_fields_and_brand():
+    assert _call("POST", "/v1/captions", {"brand_profile": PROFILE})[0] == 400
+    assert _call("POST", "/v1/captions", {"intent": "Launch"})[0] == 400
+    assert _call("POST", "/v1/fanout", {"brand_profile": PROFILE, "intent": "Launch", "platforms": "LinkedIn"})[0] == 400
+
+
+def test_visual_style_must_be_an_object():
+    status, data = _call("POST", "/v1/render", {"overlay": "Hi", "visual_style": "red"})
+    assert status == 400
+    assert "visual_style" in json.loads(data)["error"]
+    status, _ = _call("POST", "/v1/render", {"overlay": "Hi", "brand_profile": {"visual_style": "red"}})
+    assert status == 400
+
+
+def test_captions_and_fanout(mock_backend):
+    status, data = _call("POST", "/v1/captions", {"brand_profile": PROFILE, "intent": "Launch", "n": 2})
+    assert status == 200
+    assert len(json.loads(data)) == 2
+
+    status, data = _call("POST", "/v1/fanout", {"brand_profile": PROFILE, "intent": "Launch",
+                                                "platforms": ["LinkedIn", "Instagram"], "n": 2})
+    assert status == 200
+    posts = json.loads(data)
+    assert sorted(posts) == ["Instagram", "LinkedIn"]
+    assert [p["overlay"] for p in posts["LinkedIn"]] == [p["overlay"] for p in posts["Instagram"]]
+
+    status, data = _call("POST", "/v1/captions", {"brand_profile": PROFILE, "intent": "Launch", "n": 3,
+                                                  "stream": True})
+    assert status == 200
+    assert len(data.splitlines()) == 3
+    assert api_server.service.inflight == 0
+
+
+def test_timed_out_work_keeps_its_slot(monkeypatch):
+    monkeypatch.setattr(api_server, "REQUEST_TIMEOUT", 0.05)
+    done = threading.Event()
+    monkeypatch.setattr(api_server, "improve_post", lambda caption, feedback: done.wait(5) and caption)
+
+    async def run():
+        status, _ = await _request("POST", "/v1/improve", {"caption": "a", "feedback": "b"})
+        assert status == 504
+        # The thread is still busy, so the request still counts
+        assert api_server.service.inflight == 1
+        done.set()
+        for _ in range(100):
+            if not api_server.service.inflight:
+                break
+            await asyncio.sleep(0.01)
+        assert api_server.service.inflight == 0
+
+    asyncio.run(run())
+
+
+def test_stream_timeout_stops_the_producer(monkeypatch):
+    monkeypatch.setattr(api_server, "REQUEST_TIMEOUT", 0.1)
+    closed = threading.Event()
+
+    def endless(*args):
+        try:
+            while True:
+                time.sleep(0.01)
+                yield {"caption": "again"}
+        finally:
+            closed.set()
+
+    monkeypatch.setattr(api_server, "stream_captions", endless)
+    status, data = _call("POST", "/v1/captions", {"brand_profile": PROFILE, "intent": "Launch", "stream": True})
+    assert status == 200
+    assert json.loads(data.splitlines()[-1]) == {"error": "timeout"}
+    assert closed.is_set()
+    assert api_server.service.inflight == 0
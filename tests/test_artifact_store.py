@@ -0,0 +1,59 @@
+from artifact_store import ArtifactStore, artifact_key
+
+
+def blob(i, size=10):
+    return bytes([i]) * size
+
+
+def test_keys_are_stable_and_distinct():
+    assert artifact_key("render", 1, {"a": 1}) == artifact_key("render", 1, {"a": 1})
+    assert artifact_key("render", 1) != artifact_key("render", 2)
+
+
+def test_session_budget_spills_to_disk_and_reads_back(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), session_bytes=16, memory_bytes=1000, disk_bytes=1000)
+    store.put("a", blob(1), session="s1")
+    store.put("b", blob(2), session="s1")
+    stats = store.stats()
+    assert stats["memory_bytes"] == 10 and stats["disk_items"] == 1
+    # A spilled artifact comes back from disk and pushes out the other one
+    assert store.get("a", session="s1") == blob(1)
+    assert store.get("b", session="s1") == blob(2)
+    assert store.stats()["memory_bytes"] == 10
+
+
+def test_sessions_have_separate_budgets(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), session_bytes=16, memory_bytes=1000, disk_bytes=1000)
+    store.put("a", blob(1), session="s1")
+    store.put("b", blob(2), session="s2")
+    assert store.stats() == {"memory_items": 2, "memory_bytes": 20, "sessions": 2, "disk_items": 0, "disk_bytes": 0}
+
+
+def test_disk_cap_evicts_least_recently_used(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), session_bytes=1000, memory_bytes=10, disk_bytes=25)
+    for i in range(4):
+        store.put(f"k{i}", blob(i))
+    assert store.get("k0") is None
+    assert not store.has("k0")
+    assert store.get("k1") == blob(1)
+    assert store.stats()["disk_bytes"] <= 25
+
+
+def test_release_spills_a_session(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), session_bytes=1000, memory_bytes=1000, disk_bytes=1000)
+    store.put("a", blob(1), session="s1")
+    store.put("b", blob(2), session="s2")
+    store.release("s1")
+    stats = store.stats()
+    assert stats["memory_items"] == 1 and stats["disk_items"] == 1
+    assert store.get("a", session="s1") == blob(1)
+
+
+def test_spilled_artifacts_survive_a_new_store(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), session_bytes=1000, memory_bytes=10, disk_bytes=1000)
+    store.put("a", blob(1))
+    store.put("b", blob(2))
+    again = ArtifactStore(cache_dir=str(tmp_path))
+    assert again.has("a")
+    assert again.get("a") == blob(1)
+    assert again.get("b") is None
@@ -0,0 +1,52 @@
+import pytest
+
+from brand_store import BrandStore, brand_id_for
+
+POSTS = ["Ship faster with our analytics API!", "Read the docs and deploy your dashboard today."]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BrandStore(str(tmp_path / "brands.sqlite3"))
+
+
+def test_brand_ids_keep_similar_names_apart():
+    assert brand_id_for("Acme Labs") != brand_id_for("acme-labs")
+    assert brand_id_for("Acme Labs") == brand_id_for("  Acme Labs ")
+    assert brand_id_for("Acme Labs").startswith("acme-labs-")
+
+
+def test_id_for_reuses_the_stored_brand(store):
+    store.add_posts("acme-labs", POSTS, name="Acme Labs")
+    assert store.id_for("Acme Labs") == "acme-labs"
+    assert store.id_for("acme-labs") == brand_id_for("acme-labs")
+
+
+def test_add_posts_skips_posts_already_counted(store):
+    first = store.add_posts("acme", POSTS, name="Acme")
+    again = store.add_posts("acme", POSTS + ["  " + POSTS[0]])
+    assert first["posts"] == again["posts"] == 2
+    assert store.get("acme")["name"] == "Acme"
+
+
+def test_add_corpus_merges_into_the_stored_state(store):
+    store.add_posts("acme", POSTS[:1])
+    profile = store.add_corpus("acme", POSTS[1:], workers=1)
+    assert profile["posts"] == 2
+    assert "dashboard" in store.accumulator("acme").keyword_counts
+
+
+def test_add_corpus_analyzes_without_holding_the_store(store):
+    def posts():
+        # Reading the store while the archive streams must not block
+        assert store.get("acme") is None
+        yield from POSTS
+
+    assert store.add_corpus("acme", posts(), workers=1)["posts"] == 2
+
+
+def test_delete(store):
+    store.add_posts("acme", POSTS)
+    store.delete("acme")
+    assert store.get("acme") is None
+    assert store.add_posts("acme", POSTS)["posts"] == 2
@@ -0,0 +1,50 @@
+from brand_voice import BrandVoiceAccumulator, DEFAULT_MAX_VOCAB, analyze_corpus
+
+POSTS = [
+    "Launching our new analytics dashboard today!",
+    "Read the docs for the analytics API and deploy it.",
+    "We help teams ship faster with simple tooling.",
+    "Dashboard tips: filter, export and share reports.",
+]
+
+
+def test_merge_matches_single_pass():
+    whole = BrandVoiceAccumulator().update(POSTS)
+    merged = BrandVoiceAccumulator().update(POSTS[:2]).merge(BrandVoiceAccumulator().update(POSTS[2:]))
+    assert merged.keyword_counts == whole.keyword_counts
+    assert merged.tone_scores == whole.tone_scores
+    assert merged.to_profile() == whole.to_profile()
+
+
+def test_analyze_corpus_in_chunks_matches_single_pass():
+    acc = analyze_corpus(POSTS, chunk_size=1, workers=1)
+    assert acc.to_profile() == BrandVoiceAccumulator().update(POSTS).to_profile()
+
+
+def test_prune_trims_to_cap_once_table_doubles():
+    acc = BrandVoiceAccumulator(max_vocab=2)
+    acc.update(["alpha alpha alpha", "bravo bravo", "charlie", "delta"])
+    # Four keywords fit in the 2 * max_vocab slack
+    assert len(acc.keyword_counts) == 4
+    acc.add("echo")
+    assert dict(acc.keyword_counts) == {"alpha": 3, "bravo": 2}
+
+
+def test_merge_prunes():
+    left = BrandVoiceAccumulator(max_vocab=1).update(["alpha alpha bravo"])
+    right = BrandVoiceAccumulator().update(["charlie delta"])
+    assert dict(left.merge(right).keyword_counts) == {"alpha": 2}
+
+
+def test_state_round_trip_keeps_cap():
+    acc = BrandVoiceAccumulator(max_vocab=2).update(["alpha alpha alpha", "bravo bravo", "charlie"])
+    state = acc.to_state()
+    assert len(state["keyword_counts"]) == 2
+    restored = BrandVoiceAccumulator.from_state(state)
+    assert restored.max_vocab == 2
+    assert restored.to_profile() == acc.to_profile()
+
+
+def test_from_state_keeps_uncapped_and_defaults_missing_cap():
+    assert BrandVoiceAccumulator.from_state({"max_vocab": None}).max_vocab is None
+    assert BrandVoiceAccumulator.from_state({}).max_vocab == DEFAULT_MAX_VOCAB
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from critic import parse_batch_critique
+
+
+def test_maps_items_by_id():
+    text = json.dumps([{"id": 2, "score": 7, "feedback": "b"}, {"id": 1, "score": 9, "feedback": "a"}])
+    assert parse_batch_critique(text, 2) == {0: {"score": 9, "feedback": "a"}, 1: {"score": 7, "feedback": "b"}}
+
+
+def test_falls_back_to_position_without_ids():
+    text = '```json\n[{"score": 8, "feedback": "a"}, {"score": 6.5, "feedback": "b"}]\n```'
+    assert parse_batch_critique(text, 2) == {0: {"score": 8, "feedback": "a"}, 1: {"score": 6.5, "feedback": "b"}}
+
+
+def test_wrapped_object():
+    text = json.dumps({"critiques": [{"id": 1, "score": 5}]})
+    assert parse_batch_critique(text, 1) == {0: {"score": 5, "feedback": ""}}
+
+
+def test_duplicate_id_keeps_first():
+    text = json.dumps([{"id": 1, "score": 4, "feedback": "first"}, {"id": 1, "score": 9, "feedback": "second"}])
+    assert parse_batch_critique(text, 2) == {0: {"score": 4, "feedback": "first"}}
+
+
+def test_drops_out_of_range_and_malformed_items():
+    text = json.dumps([
+        {"id": 1, "score": 0},
+        {"id": 2, "score": 11},
+        {"id": 3, "score": "high"},
+        {"id": 9, "score": 5},
+        {"score": 5},
+        "not an object",
+        {"id": 4, "score": 10},
+    ])
+    assert parse_batch_critique(text, 4) == {3: {"score": 10, "feedback": ""}}
+
+
+def test_rejects_non_array():
+    with pytest.raises(ValueError):
+        parse_batch_critique('"nope"', 1)
+    with pytest.raises(ValueError):
+        parse_batch_critique("not json", 1)
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from dedup_index import DedupIndex
+
+CAPTION = "We just launched our brand new API for developers. Try it today and tell us what you build!"
+NEAR = "We just launched our brand new API for developers! Try it today and tell us what you build."
+OTHER = "Join the community meetup in Berlin next Friday for talks, pizza and live demos."
+
+
+def make_index(tmp_path):
+    return DedupIndex(path=str(tmp_path / "dedup.sqlite3"))
+
+
+def test_finds_near_duplicates_only(tmp_path):
+    index = make_index(tmp_path)
+    index.add("acme", CAPTION)
+    assert index.is_duplicate("acme", NEAR)
+    assert not index.is_duplicate("acme", OTHER)
+
+
+def test_brands_are_separate(tmp_path):
+    index = make_index(tmp_path)
+    index.add("acme", CAPTION)
+    assert not index.is_duplicate("globex", NEAR)
+
+
+def test_split_checks_batch_and_accepted(tmp_path):
+    index = make_index(tmp_path)
+    unique, duplicate = index.split("acme", [CAPTION, OTHER, NEAR])
+    assert (unique, duplicate) == ([0, 1], [2])
+    unique, duplicate = index.split("acme", [NEAR, OTHER], accepted=[CAPTION])
+    assert (unique, duplicate) == ([1], [0])
+    # split never stores anything
+    assert index.count("acme") == 0
+
+
+def test_persists_and_clears(tmp_path):
+    make_index(tmp_path).add_many("acme", [CAPTION, OTHER])
+    index = make_index(tmp_path)
+    assert index.count("acme") == 2
+    assert index.is_duplicate("acme", NEAR)
+    index.clear("acme")
+    assert index.count() == 0
+    assert not index.is_duplicate("acme", NEAR)
+
+
+def test_concurrent_writers_share_the_file(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    errors = []
+
+    def write(n):
+        index = DedupIndex(path=path)
+        try:
+            for i in range(10):
+                index.add_many("acme", [f"writer {n} caption {i} {OTHER}"])
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert DedupIndex(path=path).count("acme") == 40
@@ -0,0 +1,93 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import export
+import telemetry
+
+
+def _render(size=(800, 600)):
+    # Red bands where top_bottom_text puts its text, green where split_view does
+    img = Image.new("RGB", size, (0, 0, 255))
+    img.paste((255, 0, 0), (0, 0, size[0], 60))
+    img.paste((255, 0, 0), (0, size[1] - 60, size[0], size[1]))
+    img.paste((0, 255, 0), (size[0] - 60, 200, size[0], 400))
+    return img
+
+
+def _open(data):
+    return Image.open(io.BytesIO(data)).convert("RGB")
+
+
+def _close(pixel, color, tolerance=40):
+    return all(abs(a - b) <= tolerance for a, b in zip(pixel, color))
+
+
+@pytest.mark.parametrize("name", ["linkedin", "linkedin_png", "instagram_square", "instagram_portrait"])
+def test_platform_presets_keep_the_whole_render(name):
+    preset = export.get_preset(name)
+    out = _open(export.export_image(_render(), name))
+    assert out.size == tuple(preset["size"])
+    scale = min(out.width / 800, out.height / 600)
+    left = (out.width - round(800 * scale)) // 2
+    top = (out.height - round(600 * scale)) // 2
+    # Top and bottom text bands and the right-hand column all survive
+    assert _close(out.getpixel((out.width // 2, top + 5)), (255, 0, 0))
+    assert _close(out.getpixel((out.width // 2, out.height - top - 6)), (255, 0, 0))
+    assert _close(out.getpixel((out.width - left - 6, out.height // 2)), (0, 255, 0))
+
+
+def test_pad_uses_edge_color():
+    img = Image.new("RGB", (400, 300), (10, 200, 30))
+    out = export.resize(img, {"size": (600, 300), "fit": "pad", "pad_color": "edge"})
+    assert out.getpixel((5, 150)) == (10, 200, 30)
+
+
+def test_cover_and_contain():
+    img = _render()
+    assert export.resize(img, {"size": (300, 300), "fit": "cover"}).size == (300, 300)
+    assert export.resize(img, {"size": (400, 400), "fit": "contain"}).size == (400, 300)
+    # contain never scales up
+    assert export.resize(img, {"size": (1600, 1600), "fit": "contain"}) is img
+
+
+def _noise(size=(600, 600)):
+    import random
+    rng = random.Random(0)
+    return Image.frombytes("RGB", size, bytes(rng.getrandbits(8) for _ in range(size[0] * size[1] * 3)))
+
+
+def test_lossy_export_lowers_quality_to_fit():
+    img = _noise((300, 300))
+    full = export.encode(img, {"format": "JPEG", "quality": 95})
+    limit = len(full) // 2
+    data = export.encode(img, {"format": "JPEG", "quality": 95, "max_bytes": limit})
+    assert len(data) <= limit
+
+
+@pytest.fixture
+def tracing():
+    telemetry.reset()
+    telemetry.enable(True)
+    yield
+    telemetry.enable(False)
+    telemetry.reset()
+
+
+def test_over_limit_is_counted(tracing):
+    img = _noise((200, 200))
+    export.encode(img, {"format": "JPEG", "quality": 90, "max_bytes": 100})
+    export.encode(img, {"format": "PNG", "max_bytes": 100})
+    counts = telemetry.counters()
+    assert counts["export_over_limit{format=JPEG}"] == 1
+    assert counts["export_over_limit{format=PNG}"] == 1
+
+
+def test_export_all_names_every_preset():
+    out = export.export_all(_render(), ["png", "linkedin", export.PREVIEW])
+    assert set(out) == {"png", "linkedin", "preview"}
+    assert _open(out["png"]).size == (800, 600)
+    with pytest.raises(ValueError):
+        export.get_preset("nope")
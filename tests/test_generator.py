@@ -0,0 +1,44 @@
+import asyncio
+import sys
+
+import pytest
+
+import generator
+
+
+@pytest.fixture
+def mock_backend(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setattr(generator, "MOCK_LATENCY", 0)
+
+
+def test_dedup_disabled_never_loads_the_index(mock_backend, monkeypatch):
+    monkeypatch.setenv("DEDUP_DISABLED", "1")
+    # Importing dedup_index now would raise
+    monkeypatch.setitem(sys.modules, "dedup_index", None)
+    posts = generator.generate_captions({"tone": "Professional"}, "Launch day", None, n=3)
+    assert len(posts) == 3
+
+
+def test_generation_works_without_numpy(mock_backend, monkeypatch):
+    monkeypatch.delenv("DEDUP_DISABLED", raising=False)
+    monkeypatch.setitem(sys.modules, "dedup_index", None)
+    assert len(list(generator.stream_captions({"tone": "Technical"}, "Launch day", None, n=2))) == 2
+
+
+
+def test_sync_wrapper_refuses_a_running_loop(mock_backend, monkeypatch):
+    monkeypatch.setenv("DEDUP_DISABLED", "1")
+
+    async def main():
+        with pytest.raises(RuntimeError, match="agenerate_captions"):
+            generator.generate_captions({"tone": "Professional"}, "Launch day", None)
+        return await generator.agenerate_captions({"tone": "Professional"}, "Launch day", None, n=1)
+
+    assert len(asyncio.run(main())) == 1
+
+
+def test_async_fanout_matches_the_streamed_one(mock_backend, monkeypatch):
+    monkeypatch.setenv("DEDUP_DISABLED", "1")
+    args = ({"tone": "Energetic", "keywords": ["launch"]}, "Launch day", None, ["LinkedIn", "Instagram"], 2)
+    assert asyncio.run(generator.agenerate_fanout(*args)) == generator.generate_fanout(*args)
@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+import job_queue
+import llm_client
+from job_queue import JobQueue, handler
+
+
+@handler("test_echo")
+def run_echo(job, value):
+    job.progress(1, 1)
+    return value
+
+
+@handler("test_wait")
+def run_wait(job):
+    while True:
+        job.progress(0, 1)
+        job.check()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def queues():
+    started = []
+    yield started
+    for queue in started:
+        queue.stop(timeout=2)
+
+
+def _start(queues, *args, **kwargs):
+    queue = JobQueue(*args, **kwargs)
+    queue.start()
+    queues.append(queue)
+    return queue
+
+
+def _wait_for(queue, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.status(job_id)["status"] != status and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return queue.status(job_id)
+
+
+def test_runs_jobs(path, queues):
+    queue = _start(queues, path, workers=1)
+    job = queue.wait(queue.submit("test_echo", {"value": [1, 2]}), timeout=5)
+    assert job["status"] == "done" and job["result"] == [1, 2] and job["progress"] == 1
+
+
+def test_unknown_kind(path):
+    with pytest.raises(ValueError):
+        JobQueue(path, workers=0).submit("nope", {})
+
+
+def test_cancel_queued_job(path):
+    queue = JobQueue(path, workers=0)
+    job_id = queue.submit("test_echo", {"value": 1})
+    assert queue.cancel(job_id)
+    assert queue.status(job_id)["status"] == "cancelled"
+    assert not queue.cancel(job_id)
+
+
+def test_cancel_running_job(path, queues):
+    queue = _start(queues, path, workers=1)
+    job_id = queue.submit("test_wait", {})
+    _wait_for(queue, job_id, "running")
+    assert queue.cancel(job_id)
+    assert _wait_for(queue, job_id, "cancelled")["status"] == "cancelled"
+
+
+def test_recovers_jobs_of_dead_workers_and_purges(path):
+    queue = JobQueue(path, workers=0)
+    lost = queue.submit("test_echo", {"value": 1})
+    old = queue.submit("test_echo", {"value": 2})
+    queue.cancel(old)
+    db = queue._conn()
+    db.execute("UPDATE jobs SET status = 'running', heartbeat = ? WHERE id = ?",
+               (time.time() - job_queue.STALE_SECONDS - 1, lost))
+    db.execute("UPDATE jobs SET finished = ? WHERE id = ?", (time.time() - job_queue.KEEP_SECONDS - 1, old))
+    queue.recover()
+    queue.purge()
+    assert queue.status(lost)["status"] == "failed"
+    assert queue.status(lost)["error"] == "worker lost"
+    assert queue.status(old) is None
+
+
+def test_one_shared_pool_per_queue_file(path, queues):
+    first = _start(queues, path, workers=1, shared=True)
+    second = _start(queues, path, workers=1, shared=True)
+    assert first.running() and not second.running()
+    # A standalone pool always runs
+    assert _start(queues, path, workers=1).running()
+    first.stop()
+    second._maintenance()
+    assert second.running()
+
+
+def test_gemini_job_fails_on_a_worker_without_a_key(path, queues, monkeypatch):
+    monkeypatch.setattr(llm_client, "is_enabled", lambda: True)
+    queue = JobQueue(path, workers=1)
+    job_id = queue.submit("test_echo", {"value": 1})
+    monkeypatch.setattr(llm_client, "is_enabled", lambda: False)
+    queue.start()
+    queues.append(queue)
+    job = queue.wait(job_id, timeout=5)
+    assert job["status"] == "failed"
+    assert "GEMINI_API_KEY" in job["error"]
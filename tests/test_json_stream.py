@@ -0,0 +1,33 @@
+from json_stream import JSONArrayStreamParser, iter_json_objects, salvage_json_objects
+
+
+def test_objects_split_across_chunks():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"caption": "a') == []
+    assert parser.feed('"}, {"caption"') == [{"caption": "a"}]
+    assert parser.feed(': "b"}]') == [{"caption": "b"}]
+    assert parser.done
+
+
+def test_brackets_and_escapes_inside_strings():
+    text = '[{"caption": "x } ] { [", "note": "say \\"hi\\" {"}]'
+    assert salvage_json_objects(text) == [{"caption": "x } ] { [", "note": 'say "hi" {'}]
+
+
+def test_top_level_string_with_brace():
+    assert salvage_json_objects('["x {", {"caption": "c"}]') == [{"caption": "c"}]
+    assert salvage_json_objects('["a ] b", {"caption": "c"}]') == [{"caption": "c"}]
+
+
+def test_fence_and_truncated_output():
+    text = '```json\n[{"a": 1}, {"b": [1, {"c": 2}]}, {"d": "cut o'
+    assert salvage_json_objects(text) == [{"a": 1}, {"b": [1, {"c": 2}]}]
+
+
+def test_skips_non_objects_and_malformed_items():
+    assert salvage_json_objects('[1, "s", {"a": }, {"b": 2}]') == [{"b": 2}]
+
+
+def test_stops_after_closing_bracket():
+    chunks = ['[{"a": 1}]', ' trailing {"b": 2}']
+    assert list(iter_json_objects(chunks)) == [{"a": 1}]
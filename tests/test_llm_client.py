@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+import llm_client
+from fake_llm import FakeLLMBackend
+from prompts import Prompt
+
+
+def test_bucket_serves_burst_then_throttles():
+    bucket = llm_client.TokenBucket(rate=1.0, capacity=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0.01)
+
+
+def test_bucket_keeps_reserve_for_interactive_callers():
+    bucket = llm_client.TokenBucket(rate=0.01, capacity=5, batch_reserve=0.2)
+    assert all(bucket.acquire(llm_client.BATCH, timeout=0) for _ in range(4))
+    assert not bucket.acquire(llm_client.BATCH, timeout=0.01)
+    assert bucket.acquire(llm_client.INTERACTIVE, timeout=0)
+
+
+def test_bucket_refills_over_time():
+    bucket = llm_client.TokenBucket(rate=100.0, capacity=1)
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=1.0)
+
+
+def test_breaker_opens_after_threshold():
+    breaker = llm_client.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_trial_through_after_timeout():
+    breaker = llm_client.CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_retries_transient_errors_then_gives_up():
+    backend = FakeLLMBackend(latency=0, error_rate=1.0, error_codes=(503,))
+    client = llm_client.LLMClient(backend=backend, max_retries=2, base_delay=0, max_delay=0,
+                                  breaker=llm_client.CircuitBreaker(failure_threshold=100))
+    with pytest.raises(llm_client.LLMUnavailable):
+        client.generate("hi", "model")
+    assert backend.calls == 3
+    assert client.stats["retries"] == 2
+    # The retries belong to one call, which failed once
+    assert client.breaker.failures == 1
+
+
+def _half_open_client(**kwargs):
+    breaker = llm_client.CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    return llm_client.LLMClient(backend=FakeLLMBackend(latency=0), breaker=breaker, **kwargs)
+
+
+def test_throttled_call_does_not_hold_the_trial():
+    client = _half_open_client(rate_per_min=1, burst=1, acquire_timeout=0.01)
+    assert client.bucket.acquire(timeout=0)
+    with pytest.raises(llm_client.LLMUnavailable):
+        client.generate("hi", "model")
+    assert client.breaker.allow()
+
+
+def test_closed_stream_releases_the_trial():
+    client = _half_open_client()
+    stream = client.generate_stream("hi", "model")
+    next(stream)
+    assert not client.breaker.allow()
+    stream.close()
+    assert client.breaker.state == "half_open"
+    assert client.breaker.allow()
+
+
+def test_trial_success_closes_the_breaker():
+    client = _half_open_client()
+    assert client.generate("hi", "model") == "OK"
+    assert client.breaker.state == "closed"
+
+
+def test_track_usage_collects_calls_in_the_block():
+    client = llm_client.LLMClient(backend=FakeLLMBackend(latency=0))
+    client.generate("before", "model")
+    with llm_client.track_usage() as outer:
+        with llm_client.track_usage() as inner:
+            client.generate("hello there", "model")
+        client.generate("again", "model")
+    assert inner["calls"] == 1 and outer["calls"] == 2
+    assert client.usage["calls"] == 3
+    assert inner["input_tokens"] > 0
+
+
+def test_cached_tokens_come_from_the_backend():
+    backend = FakeLLMBackend(latency=0, responder=lambda model, prompt: "ok")
+    backend.prefix_cache = llm_client.PrefixCache(enabled=True)
+    client = llm_client.LLMClient(backend=backend)
+    prompt = Prompt("Stable brand prefix " * 20, "request")
+    client.generate(prompt, "model")
+    assert client.usage["cached_tokens"] == 0
+    client.generate(prompt, "model")
+    assert client.usage["cached_tokens"] > 0
+    assert client.usage["billed_input_tokens"] < client.usage["input_tokens"]
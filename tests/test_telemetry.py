@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+import telemetry
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    telemetry.reset()
+    yield
+    for owner in list(telemetry._owners):
+        telemetry.enable(False, owner=owner)
+    telemetry.enable(False)
+    telemetry.reset()
+
+
+def test_owner_keeps_tracing_on_until_it_leaves():
+    telemetry.enable(True, owner="a")
+    telemetry.enable(True, owner="b")
+    telemetry.enable(False, owner="a")
+    assert telemetry.enabled()
+    telemetry.enable(False, owner="b")
+    assert not telemetry.enabled()
+
+
+def test_owners_that_stop_renewing_expire(monkeypatch):
+    telemetry.enable(True, owner="gone")
+    monkeypatch.setattr(telemetry, "OWNER_TTL", -1)
+    telemetry.enable(False, owner="other")
+    assert not telemetry.enabled()
+
+
+def test_breakdown_filters_by_run():
+    telemetry.enable(True)
+    telemetry.set_run("mine")
+    with telemetry.span("stage.mine"):
+        pass
+
+    def other():
+        telemetry.set_run("theirs")
+        with telemetry.span("stage.theirs"):
+            pass
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+    assert [r["stage"] for r in telemetry.breakdown(run_id="mine")] == ["stage.mine"]
+    assert [r["stage"] for r in telemetry.breakdown(run_id="theirs")] == ["stage.theirs"]
@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+import layouts
+from template_registry import TemplateError, TemplateRegistry, validate
+
+VALID = [
+    {"id": "a", "name": "Alpha", "layout": "split_view", "default_image": "a.png", "structure": ["x"]},
+    {"id": "b", "name": "Beta", "layout": "top_bottom_text", "default_image": "b.png"},
+]
+
+
+def test_shipped_templates_are_valid():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    registry = TemplateRegistry(os.path.join(root, "templates.json"))
+    assert registry.names()
+    for template in registry.all():
+        assert template["layout"] in layouts.LAYOUTS
+
+
+@pytest.mark.parametrize("templates, message", [
+    ({"id": "a"}, "JSON array"),
+    (["a"], "not an object"),
+    ([dict(VALID[0], default_image="")], "missing default_image"),
+    ([VALID[0], dict(VALID[1], id="a")], "Duplicate template id"),
+    ([VALID[0], dict(VALID[1], name="Alpha")], "Duplicate template name"),
+    ([dict(VALID[0], layout="diagonal")], "unknown layout"),
+    ([dict(VALID[0], structure="x")], "structure must be a list"),
+])
+def test_validate_rejects(templates, message):
+    with pytest.raises(TemplateError, match=message):
+        validate(templates)
+
+
+def _write(path, templates):
+    path.write_text(json.dumps(templates))
+    # Make sure the registry sees a new mtime
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_lookups_and_reload(tmp_path):
+    path = tmp_path / "templates.json"
+    _write(path, VALID)
+    registry = TemplateRegistry(str(path))
+    assert registry.get("a")["name"] == "Alpha"
+    assert registry.by_name("Beta")["id"] == "b"
+    assert registry.get("missing") is None
+
+    _write(path, VALID[:1])
+    assert registry.names() == ["Alpha"]
+
+
+def test_bad_reload_keeps_last_good_version(tmp_path):
+    path = tmp_path / "templates.json"
+    _write(path, VALID)
+    registry = TemplateRegistry(str(path))
+    _write(path, [dict(VALID[0], layout="diagonal")])
+    assert registry.names() == ["Alpha", "Beta"]
+
+
+def test_bad_file_fails_on_first_load(tmp_path):
+    path = tmp_path / "templates.json"
+    path.write_text("{not json")
+    with pytest.raises(TemplateError):
+        TemplateRegistry(str(path))
+
+
+def test_geometry_scales_regions_and_falls_back():
+    [region] = layouts.geometry("split_view", 800, 600)
+    assert region.box == (400, 0, 800, 600)
+    assert layouts.geometry("unknown", 800, 600) == layouts.geometry(layouts.DEFAULT_LAYOUT, 800, 600)
+
+
+def test_split_text():
+    assert layouts.split_text("Top | Bottom", 2) == ["Top", "Bottom"]
+    assert layouts.split_text("one two three four", 2) == ["one two", "three four"]
+    assert layouts.split_text("only", 1) == ["only"]
@@ -0,0 +1,181 @@
+"""
+Lexicon-based tone classifier used by brand_voice.
+
+Weighted terms for each tone and language live in tone_lexicons.json:
+
+    "Technical": {"api": 1.5, "code*": 1.5, "open source": 1.2, "!": 1.0}
+
+A term is a word, a stem ending in "*" (matches any word it starts), a
+phrase of several words, or a single symbol or emoji. The lexicons are
+compiled once into hash tables keyed by token, so scoring is one pass over
+the text's tokens with a few dictionary lookups each, whatever the size of
+the lexicons. Every tone is scored in that pass; rank() turns the scores
+into tone probabilities. Set TONE_LEXICONS to use another file.
+"""
+import json
+import os
+import re
+import threading
+
+DEFAULT_PATH = os.environ.get("TONE_LEXICONS",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "tone_lexicons.json"))
+# Words, or any single symbol/emoji
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Distinct tokens whose matches are memoized per engine
+TOKEN_CACHE_SIZE = 100000
+
+
+class LexiconError(ValueError):
+    """
+    Raised when the lexicon file is malformed.
+    """
+
+
+class ToneEngine:
+    def __init__(self, config):
+        tones = config.get("tones")
+        if not isinstance(tones, dict) or not tones:
+            raise LexiconError("lexicon config needs a non-empty \"tones\" object")
+        self.tones = list(tones)
+        self.default_tone = config.get("default_tone", self.tones[0])
+        if self.default_tone not in tones:
+            raise LexiconError(f"default_tone {self.default_tone!r} is not a tone")
+        self.priors = [float(tones[t].get("prior", 0.0)) for t in self.tones]
+        self.visual_styles = {t: dict(tones[t].get("visual_style", {})) for t in self.tones}
+
+        # term id -> [(tone index, weight)]
+        self._weights = []
+        self._words = {}
+        self._stems = {}      # stem length -> {stem: term id}
+        self._phrases = {}    # tuple of tokens -> term id
+        self._max_phrase = 1
+        self._token_cache = {}
+        self._cache_lock = threading.Lock()
+        ids = {}
+        for language, lexicon in config.get("lexicons", {}).items():
+            for tone, terms in lexicon.items():
+                if tone not in tones:
+                    raise LexiconError(f"lexicon {language!r} uses unknown tone {tone!r}")
+                for term, weight in terms.items():
+                    term_id = ids.get(term)
+                    if term_id is None:
+                        term_id = ids[term] = self._add_term(term, f"{language}/{tone}")
+                    self._weights[term_id].append((self.tones.index(tone), float(weight)))
+        self._stem_lengths = sorted(self._stems)
+        self._phrase_starts = {phrase[0] for phrase in self._phrases}
+
+    def _add_term(self, term, where):
+        term_id = len(self._weights)
+        self._weights.append([])
+        key = term.lower()
+        if key.endswith("*"):
+            tokens = TOKEN_RE.findall(key[:-1])
+            if len(tokens) != 1 or not tokens[0][0].isalnum():
+                raise LexiconError(f"{where}: stem {term!r} must be a single word followed by *")
+            self._stems.setdefault(len(tokens[0]), {})[tokens[0]] = term_id
+            return term_id
+        tokens = TOKEN_RE.findall(key)
+        if not tokens:
+            raise LexiconError(f"{where}: empty term")
+        if len(tokens) == 1:
+            self._words[tokens[0]] = term_id
+        else:
+            self._phrases[tuple(tokens)] = term_id
+            self._max_phrase = max(self._max_phrase, len(tokens))
+        return term_id
+
+    @property
+    def size(self):
+        return len(self._weights)
+
+    def _lookup(self, token):
+        """
+        Term ids matched by one token: the word itself and its stems.
+        """
+        found = []
+        term_id = self._words.get(token)
+        if term_id is not None:
+            found.append(term_id)
+        for length in self._stem_lengths:
+            if length > len(token):
+                break
+            term_id = self._stems[length].get(token[:length])
+            if term_id is not None:
+                found.append(term_id)
+        return tuple(found)
+
+    def match(self, text):
+        """
+        Returns the set of term ids that occur in text.
+        """
+        tokens = TOKEN_RE.findall(text.lower())
+        cache = self._token_cache
+        found = set()
+        for i, token in enumerate(tokens):
+            ids = cache.get(token)
+            if ids is None:
+                ids = self._lookup(token)
+                with self._cache_lock:
+                    if len(cache) >= TOKEN_CACHE_SIZE:
+                        cache.clear()
+                    cache[token] = ids
+            if ids:
+                found.update(ids)
+            if token in self._phrase_starts:
+                for n in range(2, self._max_phrase + 1):
+                    term_id = self._phrases.get(tuple(tokens[i:i + n]))
+                    if term_id is not None:
+                        found.add(term_id)
+        return found
+
+    def scores(self, text):
+        """
+        Scores every tone for one text. Each term counts once per text.
+        """
+        totals = [0.0] * len(self.tones)
+        for term_id in self.match(text):
+            for tone, weight in self._weights[term_id]:
+                totals[tone] += weight
+        return dict(zip(self.tones, totals))
+
+    def rank(self, scores):
+        """
+        Turns summed tone scores into [(tone, probability)], most likely
+        first. Tone priors keep the default tone ahead on weak evidence.
+        """
+        values = [scores.get(t, 0.0) + prior for t, prior in zip(self.tones, self.priors)]
+        total = sum(values)
+        if total <= 0:
+            return [(t, 1.0 if t == self.default_tone else 0.0) for t in self.tones]
+        ranked = sorted(zip(self.tones, values), key=lambda item: -item[1])
+        return [(t, value / total) for t, value in ranked]
+
+    def classify(self, text):
+        return self.rank(self.scores(text))
+
+    def visual_style(self, tone):
+        return dict(self.visual_styles.get(tone) or self.visual_styles[self.default_tone])
+
+
+def load(path=DEFAULT_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return ToneEngine(json.load(f))
+    except (OSError, ValueError) as e:
+        if isinstance(e, LexiconError):
+            raise
+        raise LexiconError(f"Could not load {path}: {e}") from e
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(path=DEFAULT_PATH):
+    """
+    Returns the shared engine for path, compiled on first use.
+    """
+    with _engines_lock:
+        if path not in _engines:
+            _engines[path] = load(path)
+        return _engines[path]
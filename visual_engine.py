@@ -1,63 +1,222 @@
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
+from functools import lru_cache
+from PIL import Image, ImageColor, ImageDraw
+import numpy as np
+from asset_store import shared_background, get_font
+import layouts
+import telemetry
 
-def create_social_post(base_image_path, overlay_text, brand_style):
+# Bump when rendered output changes, so stored renders are not reused
+RENDER_VERSION = 1
+FONT_FACE = "arial.ttf"
+# Largest font size when a region does not set its own
+FONT_SIZE = 40
+MIN_FONT_SIZE = 14
+# Word widths are measured once at this size and scaled while searching
+REFERENCE_SIZE = 100
+LINE_SPACING = 10
+PADDING = 20
+ELLIPSIS = "..."
+# Opacity of the black scrim behind the text (0-255)
+SCRIM_ALPHA = 128
+
+def create_social_post(base_image_path, overlay_text, brand_style, layout=None):
     """
     Renders text onto the base image using brand styles.
+    Backgrounds and fonts come pre-decoded from the asset store.
+    """
+    return create_social_posts(base_image_path, [overlay_text], brand_style, layout)[0]
+
+def create_social_posts(base_image_path, overlays, brand_style, layout=None):
+    """
+    Renders many overlay variants against one background.
+    The background is decoded once and the layout's regions are computed once
+    per canvas size; the scrim and text are alpha-blended with NumPy inside
+    each text box only. layout is a templates.json layout name (default:
+    centered text).
+    """
+    with telemetry.span("visual.render", count=len(overlays)):
+        with telemetry.span("visual.background"):
+            # Falls back to a gray canvas if the image is missing
+            background = np.asarray(shared_background(base_image_path))
+        H, W = background.shape[:2]
+        regions = layouts.geometry(layout or layouts.DEFAULT_LAYOUT, W, H)
+
+        # Draw text with brand color or white
+        text_color = np.array(ImageColor.getrgb(brand_style.get('color', '#FFFFFF')), dtype=np.uint16)
+
+        images = []
+        for overlay_text in overlays:
+            pixels = background.copy()
+            _composite(pixels, overlay_text, regions, text_color)
+            images.append(Image.fromarray(pixels, "RGB"))
+        return images
+
+@lru_cache(maxsize=256)
+def _font_metrics(face, size):
+    # (font, line height, space advance) for one face and size
+    font = get_font(face, size)
+    ascent, descent = font.getmetrics()
+    return font, ascent + descent, font.getlength(" ")
+
+@lru_cache(maxsize=65536)
+def _advance(face, size, text):
+    # Advance width of a word (or single glyph) in pixels
+    return _font_metrics(face, size)[0].getlength(text)
+
+def _split_long(word, width_of, max_width):
+    # Breaks a word wider than the box between glyphs
+    pieces, piece = [], ""
+    for ch in word:
+        if piece and width_of(piece + ch) > max_width:
+            pieces.append(piece)
+            piece = ""
+        piece += ch
+    return pieces + [piece]
+
+def _wrap(text, width_of, space, max_width):
+    """
+    Greedy word wrap by pixel width. Returns [(line, width)].
     """
-    try:
-        img = Image.open(base_image_path).convert("RGB")
-    except FileNotFoundError:
-        # Fallback if image missing
-        img = Image.new('RGB', (800, 600), color='gray')
-
-    draw = ImageDraw.Draw(img)
-    W, H = img.size
-
-    # Load Font (fallback to default if custom not available)
-    try:
-        # Using a default font but scaling it up
-        font_size = 40
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except IOError:
-        font = ImageFont.load_default()
-
-    # Wrap text
-    lines = textwrap.wrap(overlay_text, width=20) # Adjust width based on font size
-
-    # Calculate text block size
-    text_height = 0
-    max_text_width = 0
-    for line in lines:
-        bbox = draw.textbbox((0, 0), line, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height += bbox[3] - bbox[1] + 10 # 10px line spacing
-        max_text_width = max(max_text_width, text_width)
-
-    # Center text
-    y_text = (H - text_height) / 2
-    
-    # Draw text with brand color or white
-    text_color = brand_style.get('color', '#FFFFFF')
-    
-    # Optional: Draw a semi-transparent box behind text for readability
-    padding = 20
-    box_x0 = (W - max_text_width) / 2 - padding
-    box_y0 = y_text - padding
-    box_x1 = (W + max_text_width) / 2 + padding
-    box_y1 = y_text + text_height + padding
-    
-    # Draw shadow/box
-    draw.rectangle([box_x0, box_y0, box_x1, box_y1], fill=(0, 0, 0, 128))
-
-    for line in lines:
-        bbox = draw.textbbox((0, 0), line, font=font)
-        line_width = bbox[2] - bbox[0]
-        line_height = bbox[3] - bbox[1]
-        
-        x_text = (W - line_width) / 2
-        
-        draw.text((x_text, y_text), line, font=font, fill=text_color)
-        y_text += line_height + 10
-
-    return img
+    lines, line, line_width = [], [], 0.0
+    for word in text.split():
+        pieces = [word] if width_of(word) <= max_width else _split_long(word, width_of, max_width)
+        for piece in pieces:
+            w = width_of(piece)
+            if line and line_width + space + w > max_width:
+                lines.append((" ".join(line), line_width))
+                line, line_width = [], 0.0
+            line_width = line_width + space + w if line else w
+            line.append(piece)
+    if line:
+        lines.append((" ".join(line), line_width))
+    return lines
+
+def _block_height(count, line_height):
+    return count * (line_height + LINE_SPACING) - LINE_SPACING if count else 0
+
+@lru_cache(maxsize=4096)
+def fit_text(text, max_width, max_height, max_size=FONT_SIZE, face=FONT_FACE):
+    """
+    Finds the largest font size (up to max_size) at which the text, wrapped
+    by measured pixel width, fits a max_width x max_height box.
+    Returns (size, line_height, ((line, width), ...)). Text that does not
+    fit even at MIN_FONT_SIZE is cut short with an ellipsis.
+    """
+    if not text.split():
+        return max_size, _font_metrics(face, max_size)[1], ()
+
+    # Search on word widths measured once at REFERENCE_SIZE and scaled
+    _, ref_height, ref_space = _font_metrics(face, REFERENCE_SIZE)
+
+    def fits_estimate(size):
+        scale = size / REFERENCE_SIZE
+        lines = _wrap(text, lambda w: _advance(face, REFERENCE_SIZE, w) * scale, ref_space * scale, max_width)
+        return _block_height(len(lines), ref_height * scale) <= max_height
+
+    lo, hi, size = MIN_FONT_SIZE, max(max_size, MIN_FONT_SIZE), MIN_FONT_SIZE
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if fits_estimate(mid):
+            size, lo = mid, mid + 1
+        else:
+            hi = mid - 1
+
+    # Confirm with real metrics; hinting can make a size a pixel too big
+    while True:
+        _, line_height, space = _font_metrics(face, size)
+        lines = _wrap(text, lambda w: _advance(face, size, w), space, max_width)
+        if _block_height(len(lines), line_height) <= max_height or size <= MIN_FONT_SIZE:
+            break
+        size -= 1
+
+    if _block_height(len(lines), line_height) > max_height:
+        keep = max(1, (max_height + LINE_SPACING) // (line_height + LINE_SPACING))
+        words = lines[keep - 1][0].split()
+        last = " ".join(words) + ELLIPSIS
+        while len(words) > 1 and _advance(face, size, last) > max_width:
+            words.pop()
+            last = " ".join(words) + ELLIPSIS
+        lines = lines[:keep - 1] + [(last, _advance(face, size, last))]
+    return size, line_height, tuple(lines)
+
+def layout_region(overlay_text, region, face=FONT_FACE):
+    """
+    Fits the overlay text to a layout region and places it.
+    Returns (lines, box, font) where lines are (text, x, y) relative to the
+    box and box is (x0, y0, x1, y1) on the canvas, scrim padding included.
+    """
+    rx0, ry0, rx1, ry1 = region.box
+    size, line_height, fitted = fit_text(
+        overlay_text, rx1 - rx0 - PADDING * 4, ry1 - ry0 - PADDING * 4, region.max_size, face)
+    text_height = _block_height(len(fitted), line_height)
+    max_text_width = max((w for _, w in fitted), default=0)
+
+    # Place the text block inside the region
+    if region.halign == "left":
+        bx = rx0 + PADDING * 2
+    else:
+        bx = (rx0 + rx1 - max_text_width) / 2
+    if region.valign == "top":
+        by = ry0 + PADDING * 2
+    elif region.valign == "bottom":
+        by = ry1 - PADDING * 2 - text_height
+    else:
+        by = (ry0 + ry1 - text_height) / 2
+
+    if region.panel:
+        x0, y0, x1, y1 = rx0, ry0, rx1, ry1
+    else:
+        x0 = int(bx - PADDING)
+        y0 = int(by - PADDING)
+        x1 = int(bx + max_text_width + PADDING)
+        y1 = int(by + text_height + PADDING)
+
+    placed = []
+    y_text = by - y0
+    for line, line_width in fitted:
+        if region.halign == "left":
+            x = bx - x0
+        else:
+            x = bx + (max_text_width - line_width) / 2 - x0
+        placed.append((line, x, y_text))
+        y_text += line_height + LINE_SPACING
+    return placed, (x0, y0, x1, y1), _font_metrics(face, size)[0]
+
+def _composite(pixels, overlay_text, regions, text_color):
+    """
+    Blends a semi-transparent black scrim and the anti-aliased text mask
+    for each layout region into pixels (H x W x 3, uint8) in place.
+    """
+    with telemetry.span("visual.layout"):
+        placements = [
+            layout_region(text, region)
+            for text, region in zip(layouts.split_text(overlay_text, len(regions)), regions)
+        ]
+
+    with telemetry.span("visual.composite"):
+        for lines, box, font in placements:
+            if lines:
+                _blend(pixels, lines, box, font, text_color)
+
+def _blend(pixels, lines, box, font, text_color):
+    H, W = pixels.shape[:2]
+    x0, y0, x1, y1 = box
+
+    # Render the text coverage for the box as an 8-bit mask
+    mask_img = Image.new("L", (x1 - x0, y1 - y0), 0)
+    mask_draw = ImageDraw.Draw(mask_img)
+    for line, x, y in lines:
+        mask_draw.text((x, y), line, font=font, fill=255)
+    mask = np.asarray(mask_img, dtype=np.uint16)
+
+    # Clip the box to the canvas
+    cx0, cy0, cx1, cy1 = max(x0, 0), max(y0, 0), min(x1, W), min(y1, H)
+    if cx0 >= cx1 or cy0 >= cy1:
+        return
+    mask = mask[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0, None]
+    region = pixels[cy0:cy1, cx0:cx1].astype(np.uint16)
+
+    # Scrim: out = bg * (1 - a), then text: out = out * (1 - m) + color * m
+    region = (region * (255 - SCRIM_ALPHA) + 127) // 255
+    region = (region * (255 - mask) + text_color * mask + 127) // 255
+    pixels[cy0:cy1, cx0:cx1] = region